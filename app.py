@@ -1,20 +1,46 @@
+import time
+
+_IMPORT_T0 = time.perf_counter()
+
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import math
 import json
+import logging
+import os
 import re
+import sqlite3
 import datetime
+import functools
 from pathlib import Path
 from typing import Optional
-import urllib.request
-import xml.etree.ElementTree as ET
-import uuid
 
-try:
-    import gspread
-    from google.oauth2.service_account import Credentials
-except ImportError:
-    pass
+from catalog import (
+    METAL_PLATE_RUB_EACH,
+    PROCESSOR_LOAD_PX_PER_PORT,
+    PROFILE_40X20_STICK_M,
+    catalog_error,
+    get_catalog,
+    magnet_unit_usd,
+)
+from http_client import BREAKER_OPEN, default_client as http_client, fetch as http_fetch
+from optimizer import find_cheapest_configuration
+from lead_index import LEAD_PAGE_SIZE, ORDER_NEW, ORDER_VALUE, LeadRow
+from lead_payload import MIN_EXCHANGE_RATE, form_values
+from lead_store import default_store as lead_store
+import perf_timing as perf
+import profiling
+from pareto import module_frontier
+from price_sources import (
+    LEMANA_BOLT_M6_6x16_DIN912_URL,
+    LEMANA_RIVET_M6_SORMAT_URL,
+    price_snapshot,
+    start_price_refresher,
+)
+from quote_cache import cached_quote, quote_cache_stats
+from quote_engine import QuoteGraph, QuoteInputs, compute_port_load
 
+# pdf_report дешёвый: fpdf2 импортируется внутри build_* при первой сборке PDF
 try:
     from pdf_report import (
         build_led_report_pdf,
@@ -28,10 +54,52 @@ except ImportError:
     suggested_pdf_filename = None
     suggested_kp_pdf_filename = None
 
+# Быстрый старт: цены из сети грузятся в фоне, первый рендер идёт на последних известных
+# значениях (MEDIALIVE_FAST_START=0 — ждать сеть, как раньше).
+FAST_START = os.environ.get("MEDIALIVE_FAST_START", "1") != "0"
+IMPORT_BUDGET_MS = float(os.environ.get("MEDIALIVE_IMPORT_BUDGET_MS", "300"))
+# Отладочная панель времени прогона: MEDIALIVE_DEBUG_TIMINGS=1 для всех или ?debug=timings
+DEBUG_TIMINGS = os.environ.get("MEDIALIVE_DEBUG_TIMINGS", "0") == "1"
+_IMPORT_MS = (time.perf_counter() - _IMPORT_T0) * 1000
+# Импорты кешируются в sys.modules, поэтому заметное время бывает только на холодном старте
+if _IMPORT_MS > IMPORT_BUDGET_MS:
+    logging.getLogger("medialive.startup").warning(
+        "Импорт модулей app.py: %.0f мс (бюджет %.0f мс)", _IMPORT_MS, IMPORT_BUDGET_MS
+    )
+
 # --- КОНФИГУРАЦИЯ СТРАНИЦЫ ---
 st.set_page_config(page_title="Medialive Led Calc", layout="wide", page_icon="🖥️")
 
 
+def _query_param(name: str) -> Optional[str]:
+    """Streamlit ≥1.30: st.query_params; иначе experimental_get_query_params."""
+    try:
+        return st.query_params.get(name)
+    except AttributeError:
+        return (st.experimental_get_query_params().get(name) or [None])[0]
+
+
+def _script_session_id() -> str:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return "unknown"
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "no-session"
+
+
+# Профиль прогона (MEDIALIVE_PROFILE): файл в profiles/ с id сессии Streamlit в имени
+profiling.begin_thread_run("streamlit", _script_session_id())
+_perf_run = perf.begin_run(DEBUG_TIMINGS or _query_param("debug") == "timings")
+perf.mark("Каталог, стили, помощники")
+
+# Справочники с индексами по имени — один снимок на весь прогон скрипта
+# (файлы catalog_data перечитываются только при изменении mtime)
+catalog = get_catalog()
+if catalog_error():
+    st.warning(f"Файлы каталога не перечитаны, работает предыдущая версия прайса: {catalog_error()}")
+
+
 def _ui_bordered_container():
     """Streamlit ≥1.33: container(border=True); иначе обычный container."""
     try:
@@ -40,6 +108,26 @@ def _ui_bordered_container():
         return st.container()
 
 
+# Streamlit ≥1.37: st.fragment (≥1.33 — experimental_fragment); взаимодействие с виджетами
+# внутри фрагмента перезапускает только его, а не весь app.py. На старых версиях — обычная функция.
+_st_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
+
+def _ui_fragment(fn):
+    return _st_fragment(fn) if _st_fragment is not None else fn
+
+
+def _rerun_fragment():
+    """
+    Перерисовать только текущий фрагмент. Без фрагментов, на старом Streamlit (нет scope)
+    или если клик пришёл в полном прогоне скрипта — перезапуск всего скрипта.
+    """
+    try:
+        st.rerun(scope="fragment")
+    except (TypeError, StreamlitAPIException):
+        st.rerun()
+
+
 # --- СОВРЕМЕННЫЙ CSS ДИЗАЙН ---
 st.markdown("""
 <style>
@@ -190,82 +278,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# --- ФУНКЦИЯ ПАРСИНГА КУРСА ЦБ РФ (+1%) ---
-@st.cache_data(ttl=3600, show_spinner=False)
-def get_cbr_usd_rate():
-    try:
-        url = "http://www.cbr.ru/scripts/XML_daily.asp"
-        req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        with urllib.request.urlopen(req, timeout=5) as response:
-            xml_data = response.read()
-        root = ET.fromstring(xml_data)
-        for valute in root.findall('Valute'):
-            if valute.attrib.get('ID') == 'R01235': # ID доллара США
-                value_str = valute.find('Value').text.replace(',', '.')
-                return float(value_str) * 1.01 # Возвращаем курс + 1%
-        return 95.0
-    except Exception:
-        return 95.0 # Резервный курс при ошибке сети
-
-
-# Профиль 40×20×1,5: в продаже только хлыст 6 м; в смете — ₽/п.м × (число хлыстов × 6).
-PROFILE_40X20_STICK_M = 6.0
-PROFILE_40X20_RUB_M_FALLBACK = 189.0
-
-# Саморез 4,2×16 с прессшайбой (к профилю); в магазине обычно упаковка — ориентир ₽/шт.
-SCREW_4X16_PRESS_RUB_EACH_FALLBACK = 1.5
-
-# Заклёпка резьбовая Sormat M6 + винт M6×16 DIN 912 оцинк. (каркас монолита, 1+1 на узел).
-RIVET_M6_SORMAT_RUB_EACH_FALLBACK = 12.0
-BOLT_M6_6x16_DIN912_RUB_EACH_FALLBACK = 8.5
-LEMANA_RIVET_M6_SORMAT_URL = "https://lemanapro.ru/product/zaklepka-sormat-m6-mm-87937034/"
-LEMANA_BOLT_M6_6x16_DIN912_URL = (
-    "https://lemanapro.ru/product/vint-din-912-6x16-mm-ocinkovannyy-24-sht-89397382/"
-)
-
-# Металлические пластины под БП (1 шт. на БП с ЗИП); фикс. 150 ₽/шт, только в смете «Каркас».
-METAL_PLATE_RUB_EACH = 150.0
-
-PETROVICH_UA = (
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-)
-PETROVICH_PRICE_PATTERNS = (
-    r'"price"\s*:\s*(\d{2,5})\s*[,}]',
-    r'data-price="(\d{3,5})"',
-    r'itemprop="price"\s+content="(\d+)"',
-)
-
-
-def _petrovich_first_listed_price_raw(urls: tuple) -> Optional[int]:
-    """Первая похожая на цену цифра в HTML выдачи/каталога Петровича."""
-    for url in urls:
-        try:
-            req = urllib.request.Request(url, headers={"User-Agent": PETROVICH_UA})
-            with urllib.request.urlopen(req, timeout=12) as resp:
-                html = resp.read().decode("utf-8", errors="ignore")
-            for pat in PETROVICH_PRICE_PATTERNS:
-                m = re.search(pat, html)
-                if m:
-                    raw = int(m.group(1))
-                    if 10 <= raw <= 50000:
-                        return raw
-        except Exception:
-            continue
-    return None
-
-
-def _html_first_price_int(html: str) -> Optional[int]:
-    """Первая целая цена в HTML (карточка товара)."""
-    for pat in PETROVICH_PRICE_PATTERNS:
-        m = re.search(pat, html)
-        if m:
-            raw = int(m.group(1))
-            if 10 <= raw <= 50000:
-                return raw
-    return None
-
-
 def publish_json_for_figma_api(payload: dict) -> tuple[Optional[str], Optional[str]]:
     """
     Публикует JSON в paste.rs и возвращает публичный API URL.
@@ -273,18 +285,17 @@ def publish_json_for_figma_api(payload: dict) -> tuple[Optional[str], Optional[s
     """
     try:
         publish_payload = payload if isinstance(payload, list) else [payload]
-        req = urllib.request.Request(
+        url = http_fetch(
             "https://paste.rs",
-            data=json.dumps(publish_payload, ensure_ascii=False).encode("utf-8"),
             method="POST",
+            data=json.dumps(publish_payload, ensure_ascii=False).encode("utf-8"),
             headers={
                 "Content-Type": "application/json; charset=utf-8",
                 "Accept": "text/plain",
                 "User-Agent": "MediaLive-LED-Calc/1.0",
             },
-        )
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            url = resp.read().decode("utf-8", errors="ignore").strip()
+            timeout=15,
+        ).decode("utf-8", errors="ignore").strip()
         if not url.startswith("http"):
             return None, "Сервис не вернул валидный URL"
         return url, None
@@ -292,276 +303,9 @@ def publish_json_for_figma_api(payload: dict) -> tuple[Optional[str], Optional[s
         return None, str(e)
 
 
-@st.cache_data(ttl=86400, show_spinner=False)
-def get_profile_40x20_rub_per_m_petrovich():
-    """
-    Пытается взять цену с petrovich.ru (поиск профтрубы 40×20), кэш 24 ч.
-    Если вёрстка/сеть изменились — смотрите поле в сайдбаре и правьте URL/regex или вводите цену вручную.
-    Возвращает (₽ за п.м., короткая подпись источника).
-    """
-    src_fail = "резерв (парсер/сеть)"
-    urls = (
-        "https://www.petrovich.ru/search/?search=truba+profilnaya+40+20+1.5",
-        "https://www.petrovich.ru/search/?search=%D1%82%D1%80%D1%83%D0%B1%D0%B0+%D0%BF%D1%80%D0%BE%D1%84%D0%B8%D0%BB%D1%8C%D0%BD%D0%B0%D1%8F+40+20+1.5",
-    )
-    raw = _petrovich_first_listed_price_raw(urls)
-    if raw is not None:
-        if raw >= 400:
-            return (round(raw / PROFILE_40X20_STICK_M, 2), "petrovich.ru (из цены хлыста ÷6)")
-        return (float(raw), "petrovich.ru")
-    return (float(PROFILE_40X20_RUB_M_FALLBACK), src_fail)
-
-
-@st.cache_data(ttl=86400, show_spinner=False)
-def get_screw_4x16_press_rub_each_petrovich():
-    """
-    Цена самореза 4,2×16 с прессшайбой (сверло), кэш 24 ч.
-    В выдаче Петровича чаще цена за упаковку — делим на типичное число шт. в уп.
-    """
-    src_fail = "резерв (парсер/сеть)"
-    urls = (
-        "https://www.petrovich.ru/search/?search=samorez+4.2x16+press+shayba",
-        "https://www.petrovich.ru/search/?search=samorez+4.2+16+sv+press",
-        "https://www.petrovich.ru/search/?search=%D1%81%D0%B0%D0%BC%D0%BE%D1%80%D0%B5%D0%B7+4%D1%8516+%D0%BF%D1%80%D0%B5%D1%81%D1%81%D1%88%D0%B0%D0%B9%D0%B1%D0%B0",
-    )
-    raw = _petrovich_first_listed_price_raw(urls)
-    if raw is None:
-        return (float(SCREW_4X16_PRESS_RUB_EACH_FALLBACK), src_fail)
-    if raw >= 800:
-        return (round(raw / 1000.0, 4), "petrovich.ru (цена ÷1000 шт/уп)")
-    if raw >= 400:
-        return (round(raw / 500.0, 4), "petrovich.ru (цена ÷500 шт/уп)")
-    if raw >= 150:
-        return (round(raw / 200.0, 4), "petrovich.ru (цена ÷200 шт/уп)")
-    if raw >= 70:
-        return (round(raw / 100.0, 4), "petrovich.ru (цена ÷100 шт/уп)")
-    if raw >= 25:
-        return (round(raw / 50.0, 4), "petrovich.ru (цена ÷50 шт/уп)")
-    if raw >= 12:
-        return (round(raw / 20.0, 4), "petrovich.ru (цена ÷20 шт/уп)")
-    return (float(raw), "petrovich.ru (как за 1 шт)")
-
-
-@st.cache_data(ttl=86400, show_spinner=False)
-def get_rivet_m6_sormat_rub_each_lemana():
-    """
-    Заклёпка резьбовая Sormat M6, кэш 24 ч.
-    Карточка: lemanapro.ru (число шт. в уп. из текста страницы или 1 шт.).
-    """
-    src_fail = "резерв (Lemana/сеть)"
-    url = LEMANA_RIVET_M6_SORMAT_URL
-    pack = 1
-    m_url = re.search(r"-(\d+)-sht", url, re.I)
-    if m_url:
-        pack = max(1, int(m_url.group(1)))
-    try:
-        req = urllib.request.Request(url, headers={"User-Agent": PETROVICH_UA})
-        with urllib.request.urlopen(req, timeout=12) as resp:
-            html = resp.read().decode("utf-8", errors="ignore")
-        m_pack = re.search(r"(\d+)\s*шт", html[:120000], re.I)
-        if m_pack:
-            pack = max(1, int(m_pack.group(1)))
-        raw = _html_first_price_int(html)
-        if raw is None:
-            m = re.search(r'"finalPrice"\s*:\s*(\d{2,6})', html)
-            if m:
-                raw = int(m.group(1))
-        if raw is not None and 5 <= raw <= 50000 and pack > 0:
-            return (round(raw / float(pack), 4), f"lemanapro.ru (уп. {pack} шт, Sormat M6)")
-    except Exception:
-        pass
-    return (float(RIVET_M6_SORMAT_RUB_EACH_FALLBACK), src_fail)
-
-
-@st.cache_data(ttl=86400, show_spinner=False)
-def get_bolt_m6_6x16_din912_zinc_rub_each_lemana():
-    """
-    Винт M6×16 DIN 912 оцинк., кэш 24 ч.
-    Карточка: lemanapro.ru (упаковка в URL, напр. 24 шт).
-    """
-    src_fail = "резерв (Lemana/сеть)"
-    url = LEMANA_BOLT_M6_6x16_DIN912_URL
-    pack = 24
-    m_url = re.search(r"-(\d+)-sht", url, re.I)
-    if m_url:
-        pack = max(1, int(m_url.group(1)))
-    try:
-        req = urllib.request.Request(url, headers={"User-Agent": PETROVICH_UA})
-        with urllib.request.urlopen(req, timeout=12) as resp:
-            html = resp.read().decode("utf-8", errors="ignore")
-        m_pack = re.search(r"(\d+)\s*шт", html[:120000], re.I)
-        if m_pack:
-            pack = max(1, int(m_pack.group(1)))
-        raw = _html_first_price_int(html)
-        if raw is None:
-            m = re.search(r'"finalPrice"\s*:\s*(\d{2,6})', html)
-            if m:
-                raw = int(m.group(1))
-        if raw is not None and 15 <= raw <= 50000 and pack > 0:
-            return (round(raw / float(pack), 4), f"lemanapro.ru (уп. {pack} шт, DIN 912 6×16)")
-    except Exception:
-        pass
-    return (float(BOLT_M6_6x16_DIN912_RUB_EACH_FALLBACK), src_fail)
-
-
-# --- БАЗА ДАННЫХ МОДУЛЕЙ (USD: прайс LEDCapital «Комплектующие» 23.03.2026) ---
-MODULES_DB = [
-    # INDOOR
-    {'name': 'Qiangli Q1.25 Indoor 3840Hz', 'env': 'Indoor', 'pitch': 1.25, 'tech': 'SMD', 'brightness': 600, 'max_power': 30.0, 'price_usd': 44.99},
-    {'name': 'Qiangli Q1.25 Indoor 6000Hz', 'env': 'Indoor', 'pitch': 1.25, 'tech': 'SMD', 'brightness': 600, 'max_power': 30.0, 'price_usd': 46.15},
-    {'name': 'Qiangli Q1.25 GOB Indoor 6000Hz', 'env': 'Indoor', 'pitch': 1.25, 'tech': 'GOB', 'brightness': 650, 'max_power': 30.0, 'price_usd': 51.10},
-    {'name': 'Qiangli R1.5 Indoor 6000Hz (Гибкий)', 'env': 'Indoor', 'pitch': 1.5, 'tech': 'Flexible', 'brightness': 500, 'max_power': 23.0, 'price_usd': 33.44},
-    {'name': 'Qiangli Q1.53 Indoor 3840Hz', 'env': 'Indoor', 'pitch': 1.53, 'tech': 'SMD', 'brightness': 600, 'max_power': 30.0, 'price_usd': 29.42},
-    {'name': 'VISTECH P1.53 COB Indoor 3840Hz', 'env': 'Indoor', 'pitch': 1.53, 'tech': 'COB', 'brightness': 600, 'max_power': 30.0, 'price_usd': 42.38},
-    {'name': 'Qiangli Q1.53 Indoor 6000Hz', 'env': 'Indoor', 'pitch': 1.53, 'tech': 'SMD', 'brightness': 600, 'max_power': 30.0, 'price_usd': 30.42},
-    {'name': 'Qiangli Q1.53 GOB Indoor 6000Hz', 'env': 'Indoor', 'pitch': 1.53, 'tech': 'GOB', 'brightness': 650, 'max_power': 30.0, 'price_usd': 35.15},
-    {'name': 'Qiangli Q1.66 Indoor 3840Hz', 'env': 'Indoor', 'pitch': 1.66, 'tech': 'SMD', 'brightness': 600, 'max_power': 30.0, 'price_usd': 27.54},
-    {'name': 'Qiangli Q1.86 Indoor 3840Hz', 'env': 'Indoor', 'pitch': 1.86, 'tech': 'SMD', 'brightness': 500, 'max_power': 23.0, 'price_usd': 18.64},
-    {'name': 'Qiangli R1.86 Indoor 3840Hz (Гибкий)', 'env': 'Indoor', 'pitch': 1.86, 'tech': 'Flexible', 'brightness': 500, 'max_power': 23.0, 'price_usd': 21.99},
-    {'name': 'VISTECH P1.86 COB Indoor 3840Hz', 'env': 'Indoor', 'pitch': 1.86, 'tech': 'COB', 'brightness': 600, 'max_power': 30.0, 'price_usd': 29.75},
-    {'name': 'Qiangli Q1.86 Indoor 6000Hz', 'env': 'Indoor', 'pitch': 1.86, 'tech': 'SMD', 'brightness': 600, 'max_power': 30.0, 'price_usd': 19.99},
-    {'name': 'Qiangli R1.86 Indoor 6000Hz (Гибкий)', 'env': 'Indoor', 'pitch': 1.86, 'tech': 'Flexible', 'brightness': 500, 'max_power': 23.0, 'price_usd': 22.88},
-    {'name': 'Qiangli Q2 Indoor 3840Hz', 'env': 'Indoor', 'pitch': 2.0, 'tech': 'SMD', 'brightness': 450, 'max_power': 23.0, 'price_usd': 16.63},
-    {'name': 'Qiangli R2 Indoor 3840Hz (Гибкий)', 'env': 'Indoor', 'pitch': 2.0, 'tech': 'Flexible', 'brightness': 500, 'max_power': 23.0, 'price_usd': 19.97},
-    {'name': 'Qiangli Q2 Indoor 6000Hz', 'env': 'Indoor', 'pitch': 2.0, 'tech': 'SMD', 'brightness': 600, 'max_power': 23.0, 'price_usd': 17.60},
-    {'name': 'Qiangli R2 Indoor 6000Hz (Гибкий)', 'env': 'Indoor', 'pitch': 2.0, 'tech': 'Flexible', 'brightness': 500, 'max_power': 23.0, 'price_usd': 20.77},
-    {'name': 'Qiangli Q2 GOB Indoor 6000Hz', 'env': 'Indoor', 'pitch': 2.0, 'tech': 'GOB', 'brightness': 600, 'max_power': 23.0, 'price_usd': 21.85},
-    {'name': 'Qiangli Q2.5 Indoor 1920Hz', 'env': 'Indoor', 'pitch': 2.5, 'tech': 'SMD', 'brightness': 450, 'max_power': 24.0, 'price_usd': 12.03},
-    {'name': 'Qiangli Q2.5 Indoor 3840Hz', 'env': 'Indoor', 'pitch': 2.5, 'tech': 'SMD', 'brightness': 450, 'max_power': 24.0, 'price_usd': 12.55},
-    {'name': 'Qiangli R2.5 Indoor 3840Hz (Гибкий)', 'env': 'Indoor', 'pitch': 2.5, 'tech': 'Flexible', 'brightness': 500, 'max_power': 24.0, 'price_usd': 14.88},
-    {'name': 'Qiangli Q2.5 Indoor 6000Hz', 'env': 'Indoor', 'pitch': 2.5, 'tech': 'SMD', 'brightness': 500, 'max_power': 24.0, 'price_usd': 13.43},
-    {'name': 'Qiangli R2.5 Indoor 6000Hz (Гибкий)', 'env': 'Indoor', 'pitch': 2.5, 'tech': 'Flexible', 'brightness': 600, 'max_power': 24.0, 'price_usd': 15.56},
-    {'name': 'Qiangli Q3.07 Indoor 1920Hz', 'env': 'Indoor', 'pitch': 3.07, 'tech': 'SMD', 'brightness': 500, 'max_power': 22.0, 'price_usd': 8.98},
-    {'name': 'Qiangli Q3.07 Indoor 3840Hz', 'env': 'Indoor', 'pitch': 3.07, 'tech': 'SMD', 'brightness': 600, 'max_power': 22.0, 'price_usd': 10.61},
-    {'name': 'Qiangli Q3.07 Indoor 6000Hz', 'env': 'Indoor', 'pitch': 3.07, 'tech': 'SMD', 'brightness': 600, 'max_power': 22.0, 'price_usd': 10.99},
-    {'name': 'Qiangli Q4 Indoor 1920Hz', 'env': 'Indoor', 'pitch': 4.0, 'tech': 'SMD', 'brightness': 450, 'max_power': 24.0, 'price_usd': 7.55},
-    {'name': 'Qiangli Q4 Indoor 3840Hz', 'env': 'Indoor', 'pitch': 4.0, 'tech': 'SMD', 'brightness': 600, 'max_power': 24.0, 'price_usd': 8.46},
-    {'name': 'Qiangli Q4 Indoor 6000Hz', 'env': 'Indoor', 'pitch': 4.0, 'tech': 'SMD', 'brightness': 600, 'max_power': 24.0, 'price_usd': 8.70},
-
-    # OUTDOOR
-    {'name': 'Qiangli Q2.5 Outdoor 3840Hz', 'env': 'Outdoor', 'pitch': 2.5, 'tech': 'SMD', 'brightness': 4500, 'max_power': 33.0, 'price_usd': 24.39},
-    {'name': 'Qiangli Q2.5 Outdoor 7680Hz', 'env': 'Outdoor', 'pitch': 2.5, 'tech': 'SMD', 'brightness': 4500, 'max_power': 33.0, 'price_usd': 24.80},
-    {'name': 'Qiangli Q3.07 Outdoor 2880Hz', 'env': 'Outdoor', 'pitch': 3.07, 'tech': 'SMD', 'brightness': 4200, 'max_power': 40.0, 'price_usd': 15.29},
-    {'name': 'Qiangli Q3.07 Outdoor 7680Hz', 'env': 'Outdoor', 'pitch': 3.07, 'tech': 'SMD', 'brightness': 4500, 'max_power': 40.0, 'price_usd': 16.15},
-    {'name': 'Qiangli Q4 Outdoor 2880Hz', 'env': 'Outdoor', 'pitch': 4.0, 'tech': 'SMD', 'brightness': 5000, 'max_power': 47.0, 'price_usd': 11.02},
-    {'name': 'Qiangli R4 Outdoor 3840Hz (Гибкий)', 'env': 'Outdoor', 'pitch': 4.0, 'tech': 'Flexible', 'brightness': 5000, 'max_power': 46.0, 'price_usd': 25.09},
-    {'name': 'Qiangli Q4 Outdoor 7680Hz', 'env': 'Outdoor', 'pitch': 4.0, 'tech': 'SMD', 'brightness': 5000, 'max_power': 47.0, 'price_usd': 11.49},
-    {'name': 'Qiangli Q5 Outdoor 2880Hz', 'env': 'Outdoor', 'pitch': 5.0, 'tech': 'SMD', 'brightness': 5000, 'max_power': 43.0, 'price_usd': 9.08},
-    {'name': 'Qiangli Q5 Outdoor 7680Hz', 'env': 'Outdoor', 'pitch': 5.0, 'tech': 'SMD', 'brightness': 5000, 'max_power': 43.0, 'price_usd': 9.55},
-    {'name': 'Qiangli Q6.66 Outdoor 2880Hz', 'env': 'Outdoor', 'pitch': 6.66, 'tech': 'SMD', 'brightness': 4500, 'max_power': 46.0, 'price_usd': 8.87},
-    {'name': 'Qiangli Q6.66 Outdoor 7680Hz', 'env': 'Outdoor', 'pitch': 6.66, 'tech': 'SMD', 'brightness': 5000, 'max_power': 46.0, 'price_usd': 9.30},
-    {'name': 'Qiangli Q8 Outdoor 2880Hz', 'env': 'Outdoor', 'pitch': 8.0, 'tech': 'SMD', 'brightness': 4500, 'max_power': 44.0, 'price_usd': 7.65},
-    {'name': 'Qiangli Q8 Outdoor 7680Hz', 'env': 'Outdoor', 'pitch': 8.0, 'tech': 'SMD', 'brightness': 4500, 'max_power': 44.0, 'price_usd': 8.05},
-]
-# Синхронные контроллеры (USD: LEDCapital 23.03.2026)
-SYNC_CONTROLLERS_DB = [
-    {"name": "Novastar MSD 300", "price_usd": 100.63},
-    {"name": "Novastar MSD 600", "price_usd": 207.03},
-    {"name": "Novastar MCTRL 300", "price_usd": 155.53},
-    {"name": "Novastar MCTRL 500", "price_usd": 336.72},
-    {"name": "Novastar MCTRL 600", "price_usd": 278.31},
-    {"name": "Novastar MCTRL 700", "price_usd": 290.46},
-    {"name": "Novastar MCTRL 660", "price_usd": 474.83},
-    {"name": "Novastar MCTRL 660 Pro", "price_usd": 810.40},
-    {"name": "Novastar MX30", "price_usd": 2228.28},
-    {"name": "Novastar MX40 Pro", "price_usd": 5657.79},
-    {"name": "Novastar MCTRL R5", "price_usd": 1926.10},
-    {"name": "Novastar MCTRL 4K", "price_usd": 3210.51},
-    {"name": "NovaPro UHD JR", "price_usd": 5142.86},
-    {"name": "NovaPro UHD", "price_usd": 3090.00},
-    {"name": "VX400", "price_usd": 889.92},
-    {"name": "VX600", "price_usd": 987.77},
-    {"name": "VX1000", "price_usd": 1357.54},
-    {"name": "VC2", "price_usd": 105.06},
-    {"name": "VC4", "price_usd": 179.22},
-    {"name": "VC6 Pro", "price_usd": 448.05},
-    {"name": "VC10", "price_usd": 889.92},
-    {"name": "VC10 Pro", "price_usd": 893.85},
-    {"name": "VC16", "price_usd": 1781.90},
-]
-
-# Асинхронные контроллеры (строки 20-27)
-ASYNC_CONTROLLERS_DB = [
-    {"name": "T30", "price_usd": 206.00},
-    {"name": "T50", "price_usd": 283.25},
-    {"name": "TB10 Plus", "price_usd": 58.61},
-    {"name": "TB20 Plus", "price_usd": 111.96},
-    {"name": "TB30", "price_usd": 236.39},
-    {"name": "TB40", "price_usd": 181.28},
-    {"name": "TB50", "price_usd": 348.14},
-    {"name": "TB60", "price_usd": 404.58},
-]
-# --- ДОБАВЛЯЕМ НОВЫЕ СПРАВОЧНИКИ КАРТ И ХАБОВ ---
-RECEIVING_CARDS_DB = [
-    {"name": "Novastar MRV 208", "price_usd": 13.29, "type": "MRV"},
-    {"name": "Novastar MRV 412", "price_usd": 15.40, "type": "MRV"},
-    {"name": "Novastar MRV 416", "price_usd": 16.09, "type": "MRV"},
-    {"name": "Novastar MRV 532", "price_usd": 21.00, "type": "MRV"},
-    {"name": "Novastar CA50E (COEX)", "price_usd": 138.65, "type": "COEX"},
-    {"name": "Novastar A5s Plus", "price_usd": 17.02, "type": "A"},
-    {"name": "Novastar A7s Plus", "price_usd": 19.12, "type": "A"},
-    {"name": "Novastar A8s", "price_usd": 33.89, "type": "A"},
-    {"name": "Novastar A10s Plus", "price_usd": 44.57, "type": "A"},
-    {"name": "Novastar A10s Pro", "price_usd": 71.31, "type": "A"},
-]
-# Блоки питания (USD: LEDCapital 23.03.2026; позиции Chuanglian/A-серия по прайсу)
-PSU_DB = [
-    {"name": "A-200-5 (Chuanglian)", "price_usd": 6.84, "max_w": 200},
-    {"name": "A-200-5N (Slim) (Chuanglian)", "price_usd": 12.80, "max_w": 200},
-    {"name": "A-300-5 (Slim) (Chuanglian)", "price_usd": 14.27, "max_w": 300},
-    {"name": "A-200JQ-5 slim (Chuanglian)", "price_usd": 13.87, "max_w": 200},
-    {"name": "A-300FAR-4.5PH (Chuanglian)", "price_usd": 21.79, "max_w": 300},
-    {"name": "A-400JQ-4.5PH (Chuanglian)", "price_usd": 14.86, "max_w": 400},
-    {"name": "Mean Well LRS-200-5", "price_usd": 15.58, "max_w": 200},
-    {"name": "Mean Well LRS-350-5", "price_usd": 21.05, "max_w": 350},
-    {"name": "G-Energy N200V5-A (Slim)", "price_usd": 13.57, "max_w": 200},
-    {"name": "CZCL A-200-5N (Slim)", "price_usd": 12.80, "max_w": 200},
-    {"name": "CZCL A-300-5 (Slim)", "price_usd": 14.50, "max_w": 300},
-]
-# Хабы (USD: LEDCapital 23.03.2026)
-HUBS_DB = [
-    {"name": "HUB 75E", "price_usd": 5.29},
-    {"name": "HUB 75E-AXS", "price_usd": 14.86},
-    {"name": "HUB 320-AXS", "price_usd": 14.86},
-]
-# Патч-корды (LEDCapital 23.03.2026; в Excel 1 м и 1,5 м)
-PATCH_CORDS_DB = [
-    {"name": "Патч-корд (LAN RJ45), 1 м", "length_m": 1.0, "price_usd": 0.90},
-    {"name": "Патч-корд (LAN RJ45), 1,5 м", "length_m": 1.5, "price_usd": 1.09},
-]
-# Кабель питания приёмной карты ↔ БП (LEDCapital 23.03.2026)
-CARD_POWER_CABLES_DB = [
-    {"name": "Кабель питания 2×1 (35 см)", "price_usd": 0.39},
-    {"name": "Кабель питания 2×1 (50 см)", "price_usd": 0.47},
-    {"name": "Кабель питания 5 м", "price_usd": 25.00},
-]
-# Силовые перемычки между БП (LEDCapital 23.03.2026). Монолит: выбор длины; кабинеты — позже в калькуляторе.
-POWER_JUMPERS_MONOLITH_DB = [
-    {"name": "Силовая перемычка 3×2,5 (15 см)", "length_cm": 15, "price_usd": 1.03},
-    {"name": "Силовая перемычка 3×25 (25 см)", "length_cm": 25, "price_usd": 1.26},
-    {"name": "Силовая перемычка 3×2,5 (35 см)", "length_cm": 35, "price_usd": 1.95},
-    {"name": "Силовая перемычка 3×25 (70 см)", "length_cm": 70, "price_usd": 2.51},
-    {"name": "Силовая перемычка 3×2,5 (75 см)", "length_cm": 75, "price_usd": 2.85},
-    {"name": "Силовая перемычка 3×25 (120 см)", "length_cm": 120, "price_usd": 3.64},
-]
-# Магниты монолитного монтажа (прайс LEDCapital: цена за пачку; в калькуляторе — за шт.)
-MAGNETS_DB = [
-    {"name": "Магнит 12×8×1,2 мм", "pack_price_usd": 69.33, "pack_qty": 1000},
-    {"name": "Магнит саморез 12×8×1,2 мм", "pack_price_usd": 59.42, "pack_qty": 1000},
-    {"name": "Магнит 13×11×1,2 мм", "pack_price_usd": 49.54, "pack_qty": 1000},
-    {"name": "Магнит 14×13×1,3 мм", "pack_price_usd": 69.33, "pack_qty": 1000},
-    {"name": "Магнит 14×17×1,3 мм", "pack_price_usd": 69.33, "pack_qty": 1000},
-]
-
-
-def magnet_unit_usd(m):
-    return m["pack_price_usd"] / m["pack_qty"]
-
-
 # --- Сохранение / загрузка сессии (JSON в каталоге led_calc_sessions) ---
 SESSION_SNAPSHOT_VERSION = 1
 SESSIONS_DIR = Path(__file__).resolve().parent / "led_calc_sessions"
-INCOMING_REQUESTS_DIR = Path(__file__).resolve().parent / "incoming_requests"
 SESSION_STATE_KEYS_TO_PERSIST: frozenset[str] = frozenset(
     {
         "width_input",
@@ -628,55 +372,28 @@ def _deep_jsonable(v):
     return str(v)
 
 
-def _pick_row_by_name(rows, name: Optional[str], fallback_index: int = 0):
-    if not rows:
-        return None
-    if name:
-        for r in rows:
-            if r.get("name") == name:
-                return r
-    idx = max(0, min(fallback_index, len(rows) - 1))
-    return rows[idx]
+# Ключ виджета → таблица каталога (процессор — по категории из sys_type_radio)
+_SESSION_ROW_TABLES = {
+    "main_card_select": "cards",
+    "main_magnet_select": "magnets",
+    "final_psu_selector": "psus",
+    "main_hub_select": "hubs",
+    "main_power_jumper_select": "power_jumpers",
+    "patch_cord_product_select": "patch_cords",
+    "card_power_cable_select": "card_power_cables",
+}
 
 
 def coerce_session_object_references() -> None:
     ss = st.session_state
-    if "main_proc_select" in ss and isinstance(ss["main_proc_select"], dict):
-        cat = ss.get("sys_type_radio", "Синхронная")
-        pdb = SYNC_CONTROLLERS_DB if cat == "Синхронная" else ASYNC_CONTROLLERS_DB
-        fixed = _pick_row_by_name(pdb, ss["main_proc_select"].get("name"))
-        if fixed is not None:
-            ss["main_proc_select"] = fixed
-    if "main_card_select" in ss and isinstance(ss["main_card_select"], dict):
-        fixed = _pick_row_by_name(RECEIVING_CARDS_DB, ss["main_card_select"].get("name"))
-        if fixed is not None:
-            ss["main_card_select"] = fixed
-    if "main_magnet_select" in ss and isinstance(ss["main_magnet_select"], dict):
-        fixed = _pick_row_by_name(MAGNETS_DB, ss["main_magnet_select"].get("name"))
-        if fixed is not None:
-            ss["main_magnet_select"] = fixed
-    if "final_psu_selector" in ss and isinstance(ss["final_psu_selector"], dict):
-        fixed = _pick_row_by_name(PSU_DB, ss["final_psu_selector"].get("name"))
-        if fixed is not None:
-            ss["final_psu_selector"] = fixed
-    if "main_hub_select" in ss and isinstance(ss["main_hub_select"], dict):
-        fixed = _pick_row_by_name(HUBS_DB, ss["main_hub_select"].get("name"))
-        if fixed is not None:
-            ss["main_hub_select"] = fixed
-    if "main_power_jumper_select" in ss and isinstance(ss["main_power_jumper_select"], dict):
-        fixed = _pick_row_by_name(
-            POWER_JUMPERS_MONOLITH_DB, ss["main_power_jumper_select"].get("name")
-        )
-        if fixed is not None:
-            ss["main_power_jumper_select"] = fixed
-    if "patch_cord_product_select" in ss and isinstance(ss["patch_cord_product_select"], dict):
-        fixed = _pick_row_by_name(PATCH_CORDS_DB, ss["patch_cord_product_select"].get("name"))
-        if fixed is not None:
-            ss["patch_cord_product_select"] = fixed
-    if "card_power_cable_select" in ss and isinstance(ss["card_power_cable_select"], dict):
-        fixed = _pick_row_by_name(CARD_POWER_CABLES_DB, ss["card_power_cable_select"].get("name"))
-        if fixed is not None:
-            ss["card_power_cable_select"] = fixed
+    catalog = get_catalog()
+    tables = dict(_SESSION_ROW_TABLES)
+    tables["main_proc_select"] = catalog.controller_table(ss.get("sys_type_radio", "Синхронная"))
+    for key, table in tables.items():
+        if key in ss and isinstance(ss[key], dict):
+            fixed = catalog.pick(table, ss[key].get("name"))
+            if fixed is not None:
+                ss[key] = fixed
 
 
 def collect_session_snapshot() -> dict:
@@ -732,61 +449,19 @@ def delete_session_file(stem: str) -> tuple[bool, Optional[str]]:
         return False, str(e)
 
 
-def _sidebar_sessions_panel():
-    try:
-        return st.sidebar.container(border=True)
-    except TypeError:
-        return st.sidebar.container()
-
-
-def _incoming_requests_panel():
-    try:
-        return st.sidebar.container(border=True)
-    except TypeError:
-        return st.sidebar.container()
-
-
-def _safe_request_filename(value: str) -> str:
-    base = re.sub(r"[^\w\-.()\s\u0400-\u04FF]", "_", (value or "").strip(), flags=re.UNICODE)
-    base = re.sub(r"\s+", "_", base).strip("_")
-    return (base[:80] or "request")
-
-
-def _store_incoming_request(payload: dict) -> tuple[bool, str]:
-    INCOMING_REQUESTS_DIR.mkdir(parents=True, exist_ok=True)
-    req_id = str(payload.get("request_id") or payload.get("id") or payload.get("lead_id") or "")
-    project = str(payload.get("project_name") or payload.get("project") or payload.get("client") or "")
-    ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{ts}_{_safe_request_filename(project)}_{_safe_request_filename(req_id)}_{uuid.uuid4().hex[:6]}.json"
-    path = INCOMING_REQUESTS_DIR / filename
+def _incoming_page(query: str, page: int, order: str = ORDER_NEW) -> tuple[list[LeadRow], bool]:
+    """Страница заявок одним запросом к таблице заявок; есть ли следующая."""
     try:
-        path.write_text(
-            json.dumps(
-                {
-                    "received_at": datetime.datetime.now().isoformat(timespec="seconds"),
-                    "payload": payload,
-                },
-                ensure_ascii=False,
-                indent=2,
-            ),
-            encoding="utf-8",
-        )
-        return True, str(path)
-    except OSError as e:
-        return False, str(e)
-
-
-def _list_incoming_requests() -> list[Path]:
-    INCOMING_REQUESTS_DIR.mkdir(parents=True, exist_ok=True)
-    files = list(INCOMING_REQUESTS_DIR.glob("*.json"))
-    return sorted(files, key=lambda p: p.stat().st_mtime, reverse=True)
+        return lead_store.page(query, page, LEAD_PAGE_SIZE, order)
+    except (OSError, sqlite3.Error):
+        return [], False
 
 
-def _load_incoming_request(path: Path) -> tuple[Optional[dict], Optional[str]]:
-    if not path.is_file():
-        return None, "Файл не найден"
+def _load_incoming_request(row: Optional[LeadRow]) -> tuple[Optional[dict], Optional[str]]:
+    if row is None:
+        return None, "Заявка не найдена"
     try:
-        data = json.loads(path.read_text(encoding="utf-8"))
+        data = lead_store.read_row(row)
     except (OSError, json.JSONDecodeError) as e:
         return None, str(e)
     payload = data.get("payload", data)
@@ -795,237 +470,41 @@ def _load_incoming_request(path: Path) -> tuple[Optional[dict], Optional[str]]:
     return payload, None
 
 
-def _extract_state_from_payload(payload: dict) -> dict:
-    """Возвращает плоский словарь state из разных форматов входящего JSON."""
-    if isinstance(payload.get("data"), dict):
-        payload = payload["data"]
-    if isinstance(payload.get("state"), dict):
-        return payload["state"]
-    if isinstance(payload.get("calc_state"), dict):
-        return payload["calc_state"]
-    return payload
-
-
-def _to_int(v, default: int) -> int:
-    try:
-        return int(float(v))
-    except Exception:
-        return default
+def _incoming_set_page(page: Optional[int]) -> None:
+    """Колбэк листания и поиска: None — новый поиск, с первой страницы."""
+    st.session_state.calc_incoming_page = max(0, page or 0)
+    st.session_state.pop("calc_incoming_pick", None)
 
 
-def _to_float(v, default: float) -> float:
-    try:
-        return float(v)
-    except Exception:
-        return default
+def _incoming_row_label(row: LeadRow) -> str:
+    when = (row.received_at or "").replace("T", " ")[:16]
+    label = f"{when} · {row.project or row.client or row.id} · {row.size_label}"
+    if row.sale_rub is not None:
+        label += f" · {row.sale_rub:,.0f} ₽".replace(",", " ")
+    return label
 
 
-def _round_to_step(v, step: int, minimum: int, default: int) -> int:
-    value = max(minimum, _to_int(v, default))
-    lower = max(minimum, (value // step) * step)
-    upper = max(minimum, ((value + step - 1) // step) * step)
-    return lower if abs(value - lower) <= abs(upper - value) else upper
+def _incoming_quote_caption(summary: Optional[dict]) -> Optional[str]:
+    """Ключевые цифры расчёта, сделанного при приёме заявки (значения каталога по умолчанию)."""
+    if not summary:
+        return None
+    if "error" in summary:
+        return f"Расчёт при приёме: {summary['error']}"
+    return (
+        f"Расчёт при приёме: {summary['total_modules_order']} мод. · "
+        f"{summary['num_cards_reserve']} карт · {summary['num_psu_reserve']} БП · "
+        f"{summary['peak_power_screen_kw']:.1f} кВт · закупка {summary['total_buy_rub']:,.0f} ₽ · "
+        f"продажа {summary['sale_total_rub']:,.0f} ₽"
+    ).replace(",", " ")
 
 
 def apply_incoming_request_to_state(payload: dict) -> list[str]:
-    payload = _extract_state_from_payload(payload)
-    ss = st.session_state
-    applied: list[str] = []
-
-    # Если прилетел полноценный state калькулятора — применяем напрямую.
-    for key in SESSION_STATE_KEYS_TO_PERSIST:
-        if key in payload:
-            ss[key] = payload[key]
-            applied.append(key)
-    if "width_input" in ss:
-        ss["width_input"] = _round_to_step(ss["width_input"], 320, 320, 3840)
-    if "height_mm" in ss:
-        ss["height_mm"] = _round_to_step(ss["height_mm"], 160, 160, 2240)
-
-    project_name = payload.get("project_name") or payload.get("project")
-    if project_name:
-        ss["calc_project_name"] = str(project_name)
-        applied.append("project_name")
-
-    client = payload.get("client") or payload.get("client_name")
-    if client:
-        ss["calc_client_name"] = str(client)
-        applied.append("client")
-
-    width = payload.get("width_mm")
-    if width is None:
-        width = payload.get("width")
-    if width is not None:
-        ss["width_input"] = _round_to_step(width, 320, 320, 3840)
-        applied.append("width_mm")
-    height = payload.get("height_mm")
-    if height is None:
-        height = payload.get("height")
-    if height is not None:
-        ss["height_mm"] = _round_to_step(height, 160, 160, 2240)
-        applied.append("height_mm")
-
-    env = payload.get("env") or payload.get("environment")
-    if env in ("Indoor", "Outdoor"):
-        ss["calc_env_key"] = env
-        applied.append("env")
-
-    mount = payload.get("mount_type")
-    if mount in ("Монолитный (Магниты/Профиль)", "В кабинетах"):
-        ss["calc_mount_type"] = mount
-        applied.append("mount_type")
-
-    logistics = payload.get("logistics_rub")
-    if logistics is not None:
-        ss["calc_logistics_rub"] = max(0.0, _to_float(logistics, 0.0))
-        applied.append("logistics_rub")
-    installation = payload.get("installation_rub")
-    if installation is not None:
-        ss["calc_installation_rub"] = max(0.0, _to_float(installation, 0.0))
-        applied.append("installation_rub")
-
-    margin = payload.get("margin_percent")
-    if margin is not None:
-        ss["calc_margin_pct"] = max(0, _to_int(margin, 30))
-        applied.append("margin_percent")
-
-    currency = payload.get("display_currency")
-    if currency in ("RUB", "USD"):
-        ss["calc_display_currency"] = currency
-        applied.append("display_currency")
-
-    vat_enabled = payload.get("vat_enabled")
-    vat_mode = payload.get("vat_mode")
-    if isinstance(vat_enabled, bool):
-        ss["calc_vat_mode"] = "С НДС 22%" if vat_enabled else "Без НДС"
-        applied.append("vat_enabled")
-    elif vat_mode in ("Без НДС", "С НДС 22%"):
-        ss["calc_vat_mode"] = vat_mode
-        applied.append("vat_mode")
-
-    exchange = payload.get("exchange_rate")
-    if exchange is not None:
-        ss["calc_exchange_rate"] = max(1.0, _to_float(exchange, float(ss.get("calc_exchange_rate", 95.0))))
-        applied.append("exchange_rate")
-
-    module_name = payload.get("module_name")
-    if module_name:
-        ss["calc_module_name"] = str(module_name)
-        applied.append("module_name")
-
+    values, applied = form_values(payload, SESSION_STATE_KEYS_TO_PERSIST)
+    for key, value in values.items():
+        st.session_state[key] = value
     return applied
 
 
-# --- СПРАВОЧНИКИ ---
-# Число Gigabit Ethernet выходов под нагрузку на приёмные карты (основной контур).
-# Ключи совпадают с полю name в SYNC_CONTROLLERS_DB / ASYNC_CONTROLLERS_DB.
-# Источники: novastar.tech и публичные спецификации; уточняйте под вашу ревизию железа.
-PROCESSOR_PORTS = {
-    # Синхронные (SYNC_CONTROLLERS_DB)
-    "Novastar MSD 300": 2,
-    "Novastar MSD 600": 4,
-    "Novastar MCTRL 300": 2,
-    "Novastar MCTRL 500": 4,
-    "Novastar MCTRL 600": 4,
-    "Novastar MCTRL 700": 6,
-    "Novastar MCTRL 660": 4,
-    "Novastar MCTRL 660 Pro": 6,
-    "Novastar MX30": 10,
-    "Novastar MX40 Pro": 20,
-    "Novastar MCTRL R5": 8,
-    "Novastar MCTRL 4K": 16,
-    "NovaPro UHD JR": 16,
-    "NovaPro UHD": 20,
-    "VX400": 4,
-    "VX600": 6,
-    "VX1000": 10,
-    "VC2": 2,
-    "VC4": 4,
-    "VC6 Pro": 6,
-    "VC6 PRO": 6,
-    "VC10": 10,
-    "VC10 Pro": 10,
-    "VC10 PRO": 10,
-    "VC16": 16,
-    # Асинхронные (ASYNC_CONTROLLERS_DB)
-    "T30": 2,
-    "T50": 2,
-    "TB10 Plus": 1,
-    "TB20 Plus": 1,
-    "TB30": 1,
-    "TB40": 2,
-    "TB50": 2,
-    "TB60": 4,
-    # Синонимы / прочие обозначения (не из прайса, для совместимости и расширений)
-    "VX600 Pro": 6,
-    "VX1000 Pro": 10,
-    "VX2000 Pro": 20,
-    "VX16S": 16,
-    "VC6": 6,
-    "VC24": 24,
-    "MCTRL300": 2,
-    "MCTRL600": 4,
-    "MCTRL700": 6,
-    "MCTRL4K": 16,
-}
-
-# Правило расчёта нагрузки GigE → приёмные карты (как в расчёте required_ports).
-PROCESSOR_LOAD_PX_PER_PORT = 650_000
-
-# Краткая подпись «поддерживаемое разрешение» для инфоплашки (офиц. спецификации уточняйте под ревизию).
-PROCESSOR_RESOLUTION_NOTE = {
-    "Novastar MSD 300": "1920×1200@60; кастом до 3840 px по стороне",
-    "Novastar MSD 600": "1920×1200@60; кастом до 3840 px по стороне",
-    "Novastar MCTRL 300": "1920×1200@60; кастом до 3840 px по стороне",
-    "Novastar MCTRL 500": "1920×1200@60; кастом до 3840 px по стороне",
-    "Novastar MCTRL 600": "1920×1200@60; кастом до 3840 px по стороне",
-    "Novastar MCTRL 700": "1920×1200@60; кастом до 3840 px по стороне",
-    "Novastar MCTRL 660": "до 4096×2160@60 (уточняйте по ревизии)",
-    "Novastar MCTRL 660 Pro": "до 4096×2160@60 (уточняйте по ревизии)",
-    "Novastar MX30": "до 7680×4320@30 (8K-класс; уточняйте по ревизии)",
-    "Novastar MX40 Pro": "составной холст до 16K×8K class (уточняйте по ревизии)",
-    "Novastar MCTRL R5": "до 4096×2160@60 (5G; уточняйте по ревизии)",
-    "Novastar MCTRL 4K": "до 4096×2160@60 (4×10G / 16×GigE; уточняйте)",
-    "NovaPro UHD JR": "до 8K class / UHD (уточняйте по ревизии)",
-    "NovaPro UHD": "до 8K class / UHD (уточняйте по ревизии)",
-    "VX400": "видеопроцессор: до 4K / по спецификации серии VX",
-    "VX600": "видеопроцессор: до 4K / по спецификации серии VX",
-    "VX1000": "видеопроцессор: до 4K+ / по спецификации серии VX",
-    "VC2": "до 1920×1200@60; кастом до 3840 px по стороне",
-    "VC4": "до 1920×1200@60; кастом до 3840 px по стороне",
-    "VC6 Pro": "до 1920×1200@60; кастом до 3840 px по стороне",
-    "VC10": "до 1920×1200@60; кастом до 3840 px по стороне",
-    "VC10 Pro": "до 1920×1200@60; кастом до 3840 px по стороне",
-    "VC16": "до 1920×1200@60; кастом до 3840 px по стороне",
-    "T30": "асинхронный контроллер — по паспорту модели",
-    "T50": "асинхронный контроллер — по паспорту модели",
-    "TB10 Plus": "асинхронный контроллер — по паспорту модели",
-    "TB20 Plus": "асинхронный контроллер — по паспорту модели",
-    "TB30": "асинхронный контроллер — по паспорту модели",
-    "TB40": "асинхронный контроллер — по паспорту модели",
-    "TB50": "асинхронный контроллер — по паспорту модели",
-    "TB60": "асинхронный контроллер — по паспорту модели",
-}
-
-
-def get_processor_output_ports(processor_name: str) -> tuple[int, bool]:
-    """Возвращает (число портов, найдено ли имя в справочнике)."""
-    if processor_name in PROCESSOR_PORTS:
-        return PROCESSOR_PORTS[processor_name], True
-    return 1, False
-
-CARD_MAX_PIXELS = {
-    "Novastar MRV 208": (256, 256),
-    "Novastar MRV 412": (512, 512),
-    "Novastar MRV 416": (512, 512),
-    "Novastar MRV 532": (256, 384),
-    "Novastar CA50E (COEX)": (512, 768),
-    "Novastar A5s Plus": (512, 384),
-    "Novastar A7s Plus": (512, 512),
-    "Novastar A8s": (512, 256),
-    "Novastar A10s Plus": (512, 512),
-    "Novastar A10s Pro": (512, 512)
-}
 popular_16_9 = {
     "2560 × 1440 мм (8×9 шт) | Идеально 16:9": (2560, 1440),
     "2880 × 1600 мм (9×10 шт) | ~16:9": (2880, 1600),
@@ -1039,6 +518,7 @@ popular_16_9 = {
 }
 
 # --- ИНИЦИАЛИЗАЦИЯ STATE ---
+perf.mark("Состояние сессии")
 _pop16_keys = list(popular_16_9.keys())
 if "width_input" not in st.session_state:
     st.session_state.width_input = 3840
@@ -1089,6 +569,7 @@ if st.session_state.calc_quick_size_label != st.session_state._prev_quick_size_l
     st.rerun()
 
 # --- БОКОВАЯ ПАНЕЛЬ: ПРОЕКТ И ФИНАНСЫ ---
+perf.mark("Сайдбар: проект, сессии, заявки")
 st.sidebar.markdown("---")
 st.sidebar.header("📝 Данные проекта")
 if "calc_project_name" not in st.session_state:
@@ -1098,187 +579,292 @@ if "calc_client_name" not in st.session_state:
     st.session_state.calc_client_name = ""
 client_name = st.sidebar.text_input("Клиент / Заказчик", placeholder="Введите имя клиента", key="calc_client_name")
 
-st.sidebar.markdown("---")
-st.sidebar.header("💾 Сессия")
-SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
-_saved_session_names = sorted(p.stem for p in SESSIONS_DIR.glob("*.json"))
-# Сброс: удалить ключ виджета до его создания (присваивание в тот же key запрещено API Streamlit)
-if st.session_state.pop("_reset_calc_session_new_name", False):
-    st.session_state.pop("calc_session_new_name", None)
-st.sidebar.text_input(
-    "Имя для сохранения",
-    value="",
-    placeholder="например зал_А_вариант_1",
-    key="calc_session_new_name",
-    help="Файл появится в папке led_calc_sessions рядом с app.py",
-)
-if st.sidebar.button("Сохранить", use_container_width=True, key="calc_session_btn_save"):
-    _name = (st.session_state.calc_session_new_name or "").strip() or "session"
-    _ok, _msg = persist_session_to_file(_name)
-    if _ok:
-        st.session_state["_reset_calc_session_new_name"] = True
-        st.sidebar.success("Сохранено")
-        st.rerun()
-    else:
-        st.sidebar.error(f"Ошибка: {_msg}")
-
-_load_clicked = False
-_del_clicked = False
-with _sidebar_sessions_panel():
-    st.markdown(
-        '<p style="margin:0 0 10px 0;color:#94a3b8;font-size:0.8rem;text-transform:uppercase;letter-spacing:0.06em;">'
-        "Сохранённые сессии</p>",
-        unsafe_allow_html=True,
+@_ui_fragment
+def _sessions_sidebar_fragment():
+    st.markdown("---")
+    st.header("💾 Сессия")
+    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    _saved_session_names = sorted(p.stem for p in SESSIONS_DIR.glob("*.json"))
+    # Сброс: удалить ключ виджета до его создания (присваивание в тот же key запрещено API Streamlit)
+    if st.session_state.pop("_reset_calc_session_new_name", False):
+        st.session_state.pop("calc_session_new_name", None)
+    st.text_input(
+        "Имя для сохранения",
+        value="",
+        placeholder="например зал_А_вариант_1",
+        key="calc_session_new_name",
+        help="Файл появится в папке led_calc_sessions рядом с app.py",
     )
-    if _saved_session_names:
-        if (
-            "calc_session_pick" not in st.session_state
-            or st.session_state.calc_session_pick not in _saved_session_names
-        ):
-            st.session_state.calc_session_pick = _saved_session_names[0]
-        st.radio(
-            "Выберите файл",
-            _saved_session_names,
-            key="calc_session_pick",
-            label_visibility="collapsed",
+    _saved_msg = st.session_state.pop("_calc_session_saved_msg", None)
+    if _saved_msg:
+        st.success(_saved_msg)
+    if st.button("Сохранить", use_container_width=True, key="calc_session_btn_save"):
+        _name = (st.session_state.calc_session_new_name or "").strip() or "session"
+        _ok, _msg = persist_session_to_file(_name)
+        if _ok:
+            st.session_state["_reset_calc_session_new_name"] = True
+            st.session_state["_calc_session_saved_msg"] = "Сохранено"
+            _rerun_fragment()
+        else:
+            st.error(f"Ошибка: {_msg}")
+
+    _load_clicked = False
+    _del_clicked = False
+    with _ui_bordered_container():
+        st.markdown(
+            '<p style="margin:0 0 10px 0;color:#94a3b8;font-size:0.8rem;text-transform:uppercase;letter-spacing:0.06em;">'
+            "Сохранённые сессии</p>",
+            unsafe_allow_html=True,
         )
-        _b_load_col, _b_del_col = st.columns(2)
-        with _b_load_col:
-            _load_clicked = st.button(
-                "Загрузить",
-                use_container_width=True,
-                key="calc_session_btn_load",
-            )
-        with _b_del_col:
-            _del_clicked = st.button(
-                "Удалить",
-                use_container_width=True,
-                key="calc_session_btn_delete",
+        if _saved_session_names:
+            if (
+                "calc_session_pick" not in st.session_state
+                or st.session_state.calc_session_pick not in _saved_session_names
+            ):
+                st.session_state.calc_session_pick = _saved_session_names[0]
+            st.radio(
+                "Выберите файл",
+                _saved_session_names,
+                key="calc_session_pick",
+                label_visibility="collapsed",
             )
-    else:
-        st.caption("Пока нет файлов — введите имя выше и нажмите «Сохранить».")
-
-if _del_clicked and _saved_session_names:
-    _stem = st.session_state.get("calc_session_pick")
-    if _stem:
-        _ok_del, _err_del = delete_session_file(_stem)
-        if not _ok_del:
-            st.sidebar.error(_err_del or "Не удалось удалить")
+            _b_load_col, _b_del_col = st.columns(2)
+            with _b_load_col:
+                _load_clicked = st.button(
+                    "Загрузить",
+                    use_container_width=True,
+                    key="calc_session_btn_load",
+                )
+            with _b_del_col:
+                _del_clicked = st.button(
+                    "Удалить",
+                    use_container_width=True,
+                    key="calc_session_btn_delete",
+                )
         else:
-            st.session_state.pop("calc_session_pick", None)
-            st.sidebar.success("Удалено")
-            st.rerun()
+            st.caption("Пока нет файлов — введите имя выше и нажмите «Сохранить».")
+
+    if _del_clicked and _saved_session_names:
+        _stem = st.session_state.get("calc_session_pick")
+        if _stem:
+            _ok_del, _err_del = delete_session_file(_stem)
+            if not _ok_del:
+                st.error(_err_del or "Не удалось удалить")
+            else:
+                st.session_state.pop("calc_session_pick", None)
+                st.session_state["_calc_session_saved_msg"] = "Удалено"
+                _rerun_fragment()
+
+    if _load_clicked and _saved_session_names:
+        _stem = st.session_state.get("calc_session_pick")
+        if _stem:
+            _data, _err = load_session_payload_from_file(_stem)
+            if _err:
+                st.error(_err)
+            else:
+                # Загрузка меняет весь расчёт — перезапуск всего скрипта
+                st.session_state["_session_payload_to_apply"] = _data
+                st.rerun()
 
-if _load_clicked and _saved_session_names:
-    _stem = st.session_state.get("calc_session_pick")
-    if _stem:
-        _data, _err = load_session_payload_from_file(_stem)
-        if _err:
-            st.sidebar.error(_err)
-        else:
-            st.session_state["_session_payload_to_apply"] = _data
-            st.rerun()
 
-st.sidebar.markdown("---")
-st.sidebar.header("📥 Входящие заявки")
-_incoming_success_msg = st.session_state.pop("_incoming_apply_success_msg", None)
-if _incoming_success_msg:
-    st.sidebar.success(_incoming_success_msg)
-_incoming_apply_clicked = False
-_incoming_delete_clicked = False
-_incoming_files = _list_incoming_requests()
-with _incoming_requests_panel():
-    st.markdown(
-        '<p style="margin:0 0 10px 0;color:#94a3b8;font-size:0.8rem;text-transform:uppercase;letter-spacing:0.06em;">'
-        "JSON из Make/Webhook</p>",
-        unsafe_allow_html=True,
-    )
-    if _incoming_files:
-        _incoming_labels = [p.name for p in _incoming_files]
-        if (
-            "calc_incoming_pick" not in st.session_state
-            or st.session_state.calc_incoming_pick not in _incoming_labels
-        ):
-            st.session_state.calc_incoming_pick = _incoming_labels[0]
-        st.radio(
-            "Выберите заявку",
-            _incoming_labels,
-            key="calc_incoming_pick",
+@_ui_fragment
+def _incoming_sidebar_fragment():
+    st.markdown("---")
+    st.header("📥 Входящие заявки")
+    _incoming_success_msg = st.session_state.pop("_incoming_apply_success_msg", None)
+    if _incoming_success_msg:
+        st.success(_incoming_success_msg)
+    _incoming_apply_clicked = False
+    _incoming_delete_clicked = False
+    with _ui_bordered_container():
+        st.markdown(
+            '<p style="margin:0 0 10px 0;color:#94a3b8;font-size:0.8rem;text-transform:uppercase;letter-spacing:0.06em;">'
+            "JSON из Make/Webhook</p>",
+            unsafe_allow_html=True,
+        )
+        st.text_input(
+            "Поиск заявок",
+            key="calc_incoming_query",
+            placeholder="Проект, клиент или id",
             label_visibility="collapsed",
+            on_change=_incoming_set_page,
+            args=(None,),
         )
-
-        _picked_file = INCOMING_REQUESTS_DIR / st.session_state.calc_incoming_pick
-        _incoming_payload, _incoming_err = _load_incoming_request(_picked_file)
-        if _incoming_err:
-            st.caption(f"Ошибка чтения: {_incoming_err}")
-        elif _incoming_payload is not None:
-            _req_id = (
-                _incoming_payload.get("request_id")
-                or _incoming_payload.get("id")
-                or _incoming_payload.get("lead_id")
-                or "—"
-            )
-            _project = (
-                _incoming_payload.get("project_name")
-                or _incoming_payload.get("project")
-                or _incoming_payload.get("client")
-                or "—"
-            )
-            st.caption(f"ID: {_req_id} · Проект: {_project}")
-            _preview_json = json.dumps(_incoming_payload, ensure_ascii=False, indent=2)
-            st.code(_preview_json[:1200], language="json")
-
-        _in_col_apply, _in_col_del = st.columns(2)
-        with _in_col_apply:
-            _incoming_apply_clicked = st.button(
-                "В расчёт",
-                key="calc_incoming_btn_apply",
-                use_container_width=True,
+        _incoming_order = st.radio(
+            "Порядок заявок",
+            [ORDER_NEW, ORDER_VALUE],
+            format_func=lambda o: "Новые" if o == ORDER_NEW else "По сумме",
+            key="calc_incoming_order",
+            horizontal=True,
+            label_visibility="collapsed",
+            on_change=_incoming_set_page,
+            args=(None,),
+        )
+        _incoming_page_no = st.session_state.get("calc_incoming_page", 0)
+        _incoming_rows, _incoming_has_next = _incoming_page(
+            st.session_state.get("calc_incoming_query", ""), _incoming_page_no, _incoming_order
+        )
+        if not _incoming_rows and _incoming_page_no > 0:
+            # Страница опустела (удалили последние заявки на ней) — на первую
+            st.session_state.calc_incoming_page = _incoming_page_no = 0
+            _incoming_rows, _incoming_has_next = _incoming_page(
+                st.session_state.get("calc_incoming_query", ""), 0, _incoming_order
             )
-        with _in_col_del:
-            _incoming_delete_clicked = st.button(
-                "Удалить",
-                key="calc_incoming_btn_delete",
-                use_container_width=True,
+        _incoming_by_seq = {r.seq: r for r in _incoming_rows}
+        _incoming_picked: Optional[LeadRow] = None
+        if _incoming_rows:
+            if st.session_state.get("calc_incoming_pick") not in _incoming_by_seq:
+                st.session_state.calc_incoming_pick = _incoming_rows[0].seq
+            st.radio(
+                "Выберите заявку",
+                list(_incoming_by_seq),
+                format_func=lambda seq: _incoming_row_label(_incoming_by_seq[seq]),
+                key="calc_incoming_pick",
+                label_visibility="collapsed",
             )
-    else:
-        st.caption("Нет входящих заявок — отправьте JSON на webhook.")
+            if _incoming_page_no > 0 or _incoming_has_next:
+                _pg_prev, _pg_label, _pg_next = st.columns([1, 1, 1])
+                with _pg_prev:
+                    st.button(
+                        "◀",
+                        key="calc_incoming_prev",
+                        disabled=_incoming_page_no == 0,
+                        on_click=_incoming_set_page,
+                        args=(_incoming_page_no - 1,),
+                        use_container_width=True,
+                    )
+                with _pg_label:
+                    st.caption(f"стр. {_incoming_page_no + 1}")
+                with _pg_next:
+                    st.button(
+                        "▶",
+                        key="calc_incoming_next",
+                        disabled=not _incoming_has_next,
+                        on_click=_incoming_set_page,
+                        args=(_incoming_page_no + 1,),
+                        use_container_width=True,
+                    )
 
-if _incoming_delete_clicked and _incoming_files:
-    _to_del = INCOMING_REQUESTS_DIR / st.session_state.get("calc_incoming_pick", "")
-    if _to_del.is_file():
+            _incoming_picked = _incoming_by_seq[st.session_state.calc_incoming_pick]
+            _incoming_payload, _incoming_err = _load_incoming_request(_incoming_picked)
+            if _incoming_err:
+                st.caption(f"Ошибка чтения: {_incoming_err}")
+            elif _incoming_payload is not None:
+                _req_id = (
+                    _incoming_payload.get("request_id")
+                    or _incoming_payload.get("id")
+                    or _incoming_payload.get("lead_id")
+                    or "—"
+                )
+                _project = (
+                    _incoming_payload.get("project_name")
+                    or _incoming_payload.get("project")
+                    or _incoming_payload.get("client")
+                    or "—"
+                )
+                st.caption(f"ID: {_req_id} · Проект: {_project}")
+                _quote_caption = _incoming_quote_caption(_incoming_picked.quote_summary)
+                if _quote_caption:
+                    st.caption(_quote_caption)
+                _preview_json = json.dumps(_incoming_payload, ensure_ascii=False, indent=2)
+                st.code(_preview_json[:1200], language="json")
+
+            _in_col_apply, _in_col_del = st.columns(2)
+            with _in_col_apply:
+                _incoming_apply_clicked = st.button(
+                    "В расчёт",
+                    key="calc_incoming_btn_apply",
+                    use_container_width=True,
+                )
+            with _in_col_del:
+                _incoming_delete_clicked = st.button(
+                    "Удалить",
+                    key="calc_incoming_btn_delete",
+                    use_container_width=True,
+                )
+        elif st.session_state.get("calc_incoming_query"):
+            st.caption("Ничего не найдено.")
+        else:
+            st.caption("Нет входящих заявок — отправьте JSON на webhook.")
+
+    if _incoming_delete_clicked and _incoming_picked is not None:
         try:
-            _to_del.unlink()
+            lead_store.delete(_incoming_picked.seq)
             st.session_state.pop("calc_incoming_pick", None)
-            st.sidebar.success("Заявка удалена")
-            st.rerun()
+            st.session_state["_incoming_apply_success_msg"] = "Заявка удалена"
+            _rerun_fragment()
         except OSError as e:
-            st.sidebar.error(str(e))
-
-if _incoming_apply_clicked and _incoming_files:
-    _picked = INCOMING_REQUESTS_DIR / st.session_state.get("calc_incoming_pick", "")
-    _incoming_payload, _incoming_err = _load_incoming_request(_picked)
-    if _incoming_err:
-        st.sidebar.error(_incoming_err)
-    elif _incoming_payload is not None:
-        st.session_state["_incoming_payload_to_apply"] = _incoming_payload
-        st.rerun()
+            st.error(str(e))
+
+    if _incoming_apply_clicked and _incoming_picked is not None:
+        _incoming_payload, _incoming_err = _load_incoming_request(_incoming_picked)
+        if _incoming_err:
+            st.error(_incoming_err)
+        elif _incoming_payload is not None:
+            # Заявка меняет весь расчёт — перезапуск всего скрипта
+            st.session_state["_incoming_payload_to_apply"] = _incoming_payload
+            st.rerun()
+
+
+with st.sidebar:
+    _sessions_sidebar_fragment()
+    _incoming_sidebar_fragment()
 
 st.sidebar.markdown("---")
 st.sidebar.header("💵 Финансы")
 
-# Получаем актуальный курс
-current_cbr_rate = get_cbr_usd_rate()
-_profile_auto_rub_m, profile_price_source_note = get_profile_40x20_rub_per_m_petrovich()
-_screw_auto_rub_each, screw_4x16_price_source_note = get_screw_4x16_press_rub_each_petrovich()
-_rivet_m6_auto_rub, rivet_m6_price_source_note = get_rivet_m6_sormat_rub_each_lemana()
-_bolt_m6_auto_rub, bolt_m6_6x16_price_source_note = get_bolt_m6_6x16_din912_zinc_rub_each_lemana()
+# Актуальный курс и цены крепежа: без ожидания сети в режиме FAST_START;
+# фоновый планировщик обновляет кэш цен заранее, до истечения TTL
+perf.mark("Сайдбар: цены и финансы")
+start_price_refresher()
+with perf.timed("price_snapshot"):
+    _prices, _prices_pending = price_snapshot(wait=not FAST_START)
+current_cbr_rate, _ = _prices["cbr_usd_rate"]
+_profile_auto_rub_m, profile_price_source_note = _prices["profile_40x20_rub_m"]
+_screw_auto_rub_each, screw_4x16_price_source_note = _prices["screw_4x16_rub_each"]
+_rivet_m6_auto_rub, rivet_m6_price_source_note = _prices["rivet_m6_rub_each"]
+_bolt_m6_auto_rub, bolt_m6_6x16_price_source_note = _prices["bolt_m6_rub_each"]
+
+# Поле, которое пользователь не трогал, догоняет свежую цену; ручной ввод не перетирается
+_PRICE_WIDGET_KEYS = {
+    "calc_exchange_rate": float(current_cbr_rate),
+    "profile_40x20_rub_m_sidebar": float(_profile_auto_rub_m),
+    "screw_4x16_rub_each_sidebar": float(_screw_auto_rub_each),
+    "rivet_m6_rub_each_sidebar": float(_rivet_m6_auto_rub),
+    "bolt_m6_6x16_rub_each_sidebar": float(_bolt_m6_auto_rub),
+}
+_price_auto = st.session_state.setdefault("_price_widget_auto", {})
+for _k, _auto in _PRICE_WIDGET_KEYS.items():
+    if _k not in st.session_state or st.session_state[_k] == _price_auto.get(_k):
+        st.session_state[_k] = _auto
+    _price_auto[_k] = _auto
+
 
-if "calc_exchange_rate" not in st.session_state:
-    st.session_state.calc_exchange_rate = float(current_cbr_rate)
+def _prices_pending_watcher():
+    """Пока цены грузятся в фоне, раз в секунду проверяет готовность и перезапускает страницу."""
+    if not price_snapshot()[1]:
+        st.rerun()
+
+
+if _prices_pending:
+    st.sidebar.caption("⏳ Цены из сети обновляются в фоне — пока показаны последние известные.")
+    if _st_fragment is not None:
+        try:
+            _st_fragment(run_every=1.0)(_prices_pending_watcher)()
+        except TypeError:
+            pass  # fragment без run_every — свежие цены подхватятся при следующем действии
+_down_hosts = [
+    f"{host} (повтор через {max(1, math.ceil(status.retry_in_s / 60))} мин)"
+    for host, status in sorted(http_client.breaker_status().items())
+    if status.state == BREAKER_OPEN
+]
+if _down_hosts:
+    st.sidebar.caption(
+        "⚡ Нет связи: " + ", ".join(_down_hosts) + " — используются последние известные цены."
+    )
 exchange_rate = st.sidebar.number_input(
     "Курс USD (₽) для закупки (ЦБ + 1%)",
-    min_value=50.0,
+    min_value=MIN_EXCHANGE_RATE,
     step=0.1,
     key="calc_exchange_rate",
     help="Курс автоматически парсится с сайта ЦБ РФ + добавляется 1%, согласно правилам прайс-листа.",
@@ -1287,7 +873,6 @@ exchange_rate = st.sidebar.number_input(
 profile_40x20_rub_m = st.sidebar.number_input(
     "Профиль 40×20×1,5 монолит (₽/п.м)",
     min_value=0.0,
-    value=float(_profile_auto_rub_m),
     step=1.0,
     key="profile_40x20_rub_m_sidebar",
     help=(
@@ -1300,7 +885,6 @@ st.sidebar.caption(f"Профиль: {profile_price_source_note} · кэш 24 ч
 screw_4x16_press_rub_each = st.sidebar.number_input(
     "Саморез 4,2×16 прессшайба, сверло (₽/шт)",
     min_value=0.0,
-    value=float(_screw_auto_rub_each),
     step=0.05,
     format="%.3f",
     key="screw_4x16_rub_each_sidebar",
@@ -1314,7 +898,6 @@ st.sidebar.caption(f"Саморезы: {screw_4x16_price_source_note} · кэш
 rivet_m6_threaded_rub_each = st.sidebar.number_input(
     "Заклёпка резьбовая M6 Sormat (₽/шт)",
     min_value=0.0,
-    value=float(_rivet_m6_auto_rub),
     step=0.5,
     format="%.3f",
     key="rivet_m6_rub_each_sidebar",
@@ -1326,7 +909,6 @@ rivet_m6_threaded_rub_each = st.sidebar.number_input(
 bolt_m6_6x16_din912_rub_each = st.sidebar.number_input(
     "Винт M6×16 DIN 912, оцинк. (₽/шт)",
     min_value=0.0,
-    value=float(_bolt_m6_auto_rub),
     step=0.05,
     format="%.3f",
     key="bolt_m6_6x16_rub_each_sidebar",
@@ -1389,6 +971,7 @@ st.markdown("Точный расчет комплектующих на базе
 # ==========================================
 # БЛОК 1: РАЗМЕРЫ И ПРОПОРЦИИ
 # ==========================================
+perf.mark("Блок 1: размеры")
 st.markdown('<div class="section-header">📏 1. Размеры экрана</div>', unsafe_allow_html=True)
 
 with _ui_bordered_container():
@@ -1429,6 +1012,7 @@ with _ui_bordered_container():
 # ==========================================
 # БЛОК 2: ХАРАКТЕРИСТИКИ И МОНТАЖ
 # ==========================================
+perf.mark("Блок 2: модуль и монтаж")
 st.markdown('<div class="section-header">⚙️ 2. Матрица и Конструкция</div>', unsafe_allow_html=True)
 
 with _ui_bordered_container():
@@ -1448,16 +1032,13 @@ with _ui_bordered_container():
                 "Среда использования", ["Indoor", "Outdoor"], horizontal=True, key="calc_env_key"
             )
         with c_tech:
-            tech_options = sorted(
-                set(m["tech"] for m in MODULES_DB if m["env"] == env_key),
-                key=lambda t: (0 if t == "SMD" else 1, t),
-            )
+            tech_options = list(catalog.techs_by_env.get(env_key, ()))
             if "calc_tech_key" not in st.session_state or st.session_state.calc_tech_key not in tech_options:
                 st.session_state.calc_tech_key = tech_options[0] if tech_options else "SMD"
             tech_key = st.selectbox("Технология", tech_options, key="calc_tech_key")
 
         # Фильтруем базу данных по среде И технологии
-        available_modules = [m for m in MODULES_DB if m["env"] == env_key and m["tech"] == tech_key]
+        available_modules = catalog.modules_by_env_tech.get((env_key, tech_key), ())
         module_names = [m["name"] for m in available_modules]
         _default_module_name = "Qiangli Q2.5 Indoor 3840Hz"
         _mod_ix = (
@@ -1472,7 +1053,7 @@ with _ui_bordered_container():
         )
         
         # Получаем характеристики выбранного модуля
-        selected_module = next(m for m in available_modules if m["name"] == selected_module_name)
+        selected_module = catalog.module(selected_module_name)
         
         pixel_pitch = selected_module["pitch"]
         tech = selected_module["tech"]
@@ -1552,7 +1133,7 @@ with _ui_bordered_container():
         else:
             selected_magnet = st.selectbox(
                 "Магниты (из прайса):",
-                MAGNETS_DB,
+                catalog.magnets,
                 format_func=lambda m: (
                     f"{m['name']} — ${magnet_unit_usd(m):.4f}/шт "
                     f"(пачка {m['pack_qty']} шт → ${m['pack_price_usd']:.2f})"
@@ -1589,6 +1170,7 @@ with _ui_bordered_container():
 # ==========================================
 # БЛОК 3: УПРАВЛЕНИЕ И КОНТРОЛЛЕРЫ
 # ==========================================
+perf.mark("Блок 3: контроллеры")
 st.markdown('<div class="section-header">📺 3. Управление и Контроллеры</div>', unsafe_allow_html=True)
 
 col_ctrl1, col_ctrl2 = st.columns(2)
@@ -1605,11 +1187,8 @@ with col_ctrl1:
     )
     
     # Фильтруем базу процессоров
-    current_db = SYNC_CONTROLLERS_DB if ctrl_category == "Синхронная" else ASYNC_CONTROLLERS_DB
-    _proc_default_ix = next(
-        (i for i, p in enumerate(current_db) if p["name"] == "VC4"),
-        0,
-    )
+    current_db = catalog.controllers_for(ctrl_category)
+    _proc_default_ix = catalog.index_of(catalog.controller_table(ctrl_category), "VC4")
     selected_proc = st.selectbox(
         "Модель контроллера/процессора:",
         current_db,
@@ -1620,16 +1199,15 @@ with col_ctrl1:
     
     processor_name = selected_proc["name"]
     proc_price_usd = selected_proc["price_usd"]
-    available_ports, ports_catalog_hit = get_processor_output_ports(processor_name)
+    _proc_spec = catalog.controllers[processor_name]
+    available_ports, ports_catalog_hit = _proc_spec.ports, _proc_spec.ports_known
     _proc_cap_px = available_ports * PROCESSOR_LOAD_PX_PER_PORT
     _proc_mln = _proc_cap_px / 1_000_000
     _proc_cap_mln_str = (
         f"{_proc_mln:.2f}".replace(".", ",").rstrip("0").rstrip(",") + " млн"
     )
     _proc_cap_px_spaced = f"{_proc_cap_px:,}".replace(",", "\u202f")
-    _proc_res_note = PROCESSOR_RESOLUTION_NOTE.get(
-        processor_name, "Уточняйте по паспорту выбранной модели."
-    )
+    _proc_res_note = _proc_spec.resolution_note or "Уточняйте по паспорту выбранной модели."
     _ports_warn = (
         " ⚠ не в справочнике портов — для расчёта принят 1" if not ports_catalog_hit else ""
     )
@@ -1657,13 +1235,10 @@ with col_ctrl1:
 with col_ctrl2:
     st.markdown("---")
     # 1. Выбор приемной карты
-    _card_416_ix = next(
-        (i for i, c in enumerate(RECEIVING_CARDS_DB) if c["name"] == "Novastar MRV 416"),
-        0,
-    )
+    _card_416_ix = catalog.index_of("cards", "Novastar MRV 416")
     selected_card = st.selectbox(
         "Приёмная карта (Novastar):",
-        RECEIVING_CARDS_DB,
+        catalog.cards,
         index=_card_416_ix,
         format_func=lambda x: f"{x['name']} — ${x['price_usd']:.2f}",
         key="main_card_select",
@@ -1706,45 +1281,31 @@ with col_ctrl2:
     """, unsafe_allow_html=True)
 
     # 4. Логика хаба
-    hub_price_usd = 0.0
+    selected_hub = None
     if receiving_card["type"] == "A":
         selected_hub = st.selectbox(
             "Выберите HUB для серии A:", 
-            HUBS_DB,
+            catalog.hubs,
             format_func=lambda x: f"{x['name']} — ${x['price_usd']:.2f}",
             key="main_hub_select"
         )
-        hub_price_usd = selected_hub["price_usd"]
     else:
         st.info("HUB75 встроен в карту (MRV)")
 
 if not ports_catalog_hit:
     st.warning(
         f"Модель **{processor_name}** не найдена в справочнике портов — для расчёта принято **1** выход. "
-        "Добавьте строку в `PROCESSOR_PORTS` в `app.py`."
+        "Добавьте строку в `catalog_data/processors.json`."
     )
 
-# РАСЧЕТЫ ДОЛЖНЫ ИДТИ ПОСЛЕ БЛОКА IF С ТЕМ ЖЕ ОТСТУПОМ, ЧТО И ВЕСЬ БЛОК
-real_width = math.ceil(width_mm / 320) * 320
-
 # РАСЧЕТ И СТАТУС ПОРТОВ (единственная инфо-панель для контроллера)
-real_width = math.ceil(width_mm / 320) * 320
-real_height = math.ceil(height_mm / 160) * 160
-total_px = (real_width / pixel_pitch) * (real_height / pixel_pitch)
-
-required_ports_base = math.ceil(total_px / PROCESSOR_LOAD_PX_PER_PORT)
-required_ports = required_ports_base * 2 if hot_backup else required_ports_base
-load_per_port = (
-    (total_px / (available_ports * PROCESSOR_LOAD_PX_PER_PORT)) * 100
-    if available_ports > 0
-    else 100.0
-)
+port_load = compute_port_load(width_mm, height_mm, pixel_pitch, processor_name, hot_backup)
+ports_ok = port_load.ports_ok
 
-ports_ok = required_ports <= available_ports
 status_text = "✅ Портов достаточно" if ports_ok else "❌ ВНИМАНИЕ: Недостаточно портов!"
 status_color = "#48bb78" if ports_ok else "#f56565"
 _hot_note = (
-    f' &nbsp;|&nbsp; Backup: база <strong>{required_ports_base}</strong> → нужно <strong>{required_ports}</strong>'
+    f' &nbsp;|&nbsp; Backup: база <strong>{port_load.required_ports_base}</strong> → нужно <strong>{port_load.required_ports}</strong>'
     if hot_backup
     else ""
 )
@@ -1753,20 +1314,21 @@ st.markdown(f"""
 <div style="padding: 12px 20px; border-radius: 8px; border-left: 4px solid {status_color}; background: #1a202c; margin-top: 10px;">
     <span style="color: #a0aec0; font-size: 14px;">Статус портов процессора <strong>{processor_name}</strong>:</span><br>
     Доступно: <strong>{available_ports}</strong> &nbsp;|&nbsp;
-    Требуется: <strong>{required_ports}</strong>{_hot_note} &nbsp;|&nbsp;
-    Нагрузка на порт: <strong>{load_per_port:.1f}%</strong> &nbsp;&nbsp;➔&nbsp;&nbsp;
+    Требуется: <strong>{port_load.required_ports}</strong>{_hot_note} &nbsp;|&nbsp;
+    Нагрузка на порт: <strong>{port_load.load_per_port:.1f}%</strong> &nbsp;&nbsp;➔&nbsp;&nbsp;
     <span style="color: {status_color}; font-weight: bold;">{status_text}</span>
 </div>
 """, unsafe_allow_html=True)
 if not ports_ok:
     st.error(
-        f"Недостаточно GigE-выходов: нужно **{required_ports}** (физически **{available_ports}** у "
+        f"Недостаточно GigE-выходов: нужно **{port_load.required_ports}** (физически **{available_ports}** у "
         f"{processor_name}). Увеличьте модель процессора или снимите Backup."
     )
 
 # ==========================================
 # БЛОК 4: ПИТАНИЕ И РЕЗЕРВ (ЗИП) - ФИНАЛЬНЫЙ ЧИСТЫЙ ВАРИАНТ
 # ==========================================
+perf.mark("Блок 4: питание и ЗИП")
 st.markdown('<div class="section-header">⚡ 4. Питание сети и ЗИП</div>', unsafe_allow_html=True)
 
 col4_pwr, col4_zip = st.columns(2)
@@ -1775,7 +1337,7 @@ with col4_pwr:
         st.markdown('<p class="section4-subtitle">Блок питания</p>', unsafe_allow_html=True)
         selected_psu = st.selectbox(
             "Модель БП (из прайса):",
-            PSU_DB,
+            catalog.psus,
             format_func=lambda x: f"{x['name']} — ${x['price_usd']:.2f}",
             index=0,
             key="final_psu_selector",
@@ -1846,12 +1408,12 @@ with col4_j:
         st.markdown("**Перемычки БП**")
         if "Монолитный" in mount_type:
             _pj_default_ix = next(
-                (i for i, p in enumerate(POWER_JUMPERS_MONOLITH_DB) if p["length_cm"] == 70),
+                (i for i, p in enumerate(catalog.power_jumpers) if p["length_cm"] == 70),
                 3,
             )
             selected_power_jumper = st.selectbox(
                 "Длина:",
-                POWER_JUMPERS_MONOLITH_DB,
+                catalog.power_jumpers,
                 index=_pj_default_ix,
                 format_func=lambda p: f"{p['name']} — ${p['price_usd']:.2f}/шт",
                 key="main_power_jumper_select",
@@ -1865,7 +1427,7 @@ with col4_p:
         _patch_default_ix = 0 if "Монолитный" in mount_type else 1
         selected_patch_cord = st.selectbox(
             "Модель:",
-            PATCH_CORDS_DB,
+            catalog.patch_cords,
             index=_patch_default_ix,
             format_func=lambda p: f"{p['name']} — ${p['price_usd']:.2f}/шт",
             key="patch_cord_product_select",
@@ -1876,7 +1438,7 @@ with col4_c:
         st.markdown("**Кабели питания карт → БП**")
         selected_card_power_cable = st.selectbox(
             "Модель:",
-            CARD_POWER_CABLES_DB,
+            catalog.card_power_cables,
             index=0,
             format_func=lambda c: f"{c['name']} — ${c['price_usd']:.2f}/шт",
             key="card_power_cable_select",
@@ -1884,297 +1446,144 @@ with col4_c:
         )
 
 # ==========================================
+# ПОЛНЫЕ ИНЖЕНЕРНЫЕ ВЫЧИСЛЕНИЯ (quote_engine: граф узлов, пересчёт только изменившихся)
 # ==========================================
-# ПОЛНЫЕ ИНЖЕНЕРНЫЕ ВЫЧИСЛЕНИЯ (ИСПРАВЛЕНО)
-# ==========================================
-modules_w = math.ceil(width_mm / 320)
-modules_h = math.ceil(height_mm / 160)
-total_modules = modules_w * modules_h
-area_m2 = (real_width / 1000) * (real_height / 1000)
-
-total_price_rub = area_m2 * price_per_m2
-
-if reserve_modules_choice == "Свой":
-    reserve_modules = int(reserve_modules_custom)
-else:
-    reserve_percent = int(reserve_modules_choice.replace("%", ""))
-    reserve_modules = math.ceil(total_modules * reserve_percent / 100)
-total_modules_order = total_modules + reserve_modules
-
-# --- 1. МОЩНОСТЬ (ВАЖНО!) ---
-peak_power_screen_kw = total_modules * max_power_module / 1000
-avg_power_screen_kw = peak_power_screen_kw * 0.35
-
-# --- 2. КАРТЫ (РАСЧЕТ ПО ТВОЕМУ СПИСКУ) ---
-
-# А) Считаем строго по количеству модулей, которые ты выбрал в списке (6, 8, 10...)
-num_cards_by_mod = math.ceil(total_modules / modules_per_card)
-
-# Б) Для контроля: физический предел карты по разрешению (Novastar)
-card_res_tuple = CARD_MAX_PIXELS.get(receiving_card['name'], (512, 384))
-max_pixels_card = card_res_tuple[0] * card_res_tuple[1]
-num_cards_by_pix = math.ceil(total_px / max_pixels_card)
-
-# В) ИТОГО "ЧИСТОЕ" КОЛИЧЕСТВО
-# Если ты вручную задал мало модулей (например 6), то num_cards_by_mod будет большим, 
-# и программа возьмет именно его.
-num_cards = max(num_cards_by_mod, num_cards_by_pix)
-
-# Г) ИТОГО С УЧЕТОМ ЗИП (если нажата кнопка запаса)
-num_cards_reserve = num_cards + 1 if reserve_psu_cards else num_cards
-
-num_patch_cords_zip_spare = 1 if reserve_enabled else 0
-patch_cords = num_cards_reserve + num_patch_cords_zip_spare
-buy_patch_cords_total = patch_cords * selected_patch_cord["price_usd"]
-
-num_power_cables = num_cards_reserve
-reserve_power_cables = math.ceil(num_power_cables * 0.1)
-num_card_power_cables_order = num_power_cables + reserve_power_cables
-buy_card_power_cables_total = num_card_power_cables_order * selected_card_power_cable["price_usd"]
-
-# --- 3. БП ---
-num_psu = math.ceil(total_modules / modules_per_psu)
-num_psu_reserve = num_psu + 1 if reserve_psu_cards else num_psu
-
-num_plates = num_psu_reserve
-vinths = num_plates * 4
-reserve_vinths = math.ceil(vinths * 0.1)
-num_screws_4x16_order = vinths + reserve_vinths
-
-if "Монолитный" in mount_type and selected_power_jumper is not None:
-    num_power_jumpers_for_chain = max(0, num_psu_reserve - 1)
-    num_power_jumpers_zip_spare = 1 if reserve_enabled else 0
-    num_power_jumpers = num_power_jumpers_for_chain + num_power_jumpers_zip_spare
-else:
-    num_power_jumpers_for_chain = 0
-    num_power_jumpers_zip_spare = 0
-    num_power_jumpers = 0
-buy_power_jumpers_total = (
-    num_power_jumpers * selected_power_jumper["price_usd"] if selected_power_jumper else 0.0
+perf.mark("Расчёт (quote_engine)")
+quote_inputs = QuoteInputs(
+    width_mm=int(width_mm),
+    height_mm=int(height_mm),
+    module_name=selected_module_name,
+    mount_type=mount_type,
+    cabinet_width=int(cabinet_width),
+    cabinet_height=int(cabinet_height),
+    cabinet_weight=float(cabinet_weight_per),
+    magnet_name=selected_magnet["name"] if selected_magnet else None,
+    magnets_per_module=int(magnets_per_module),
+    controller_category=ctrl_category,
+    processor_name=processor_name,
+    hot_backup=bool(hot_backup),
+    card_name=card_name,
+    modules_per_card=int(modules_per_card),
+    hub_name=selected_hub["name"] if selected_hub else None,
+    psu_name=sel_psu["name"],
+    modules_per_psu=int(modules_per_psu),
+    power_phase=power_phase,
+    reserve_enabled=bool(reserve_enabled),
+    reserve_modules_choice=reserve_modules_choice,
+    reserve_modules_custom=int(reserve_modules_custom),
+    reserve_psu_cards=bool(reserve_psu_cards),
+    power_jumper_name=selected_power_jumper["name"] if selected_power_jumper else None,
+    patch_cord_name=selected_patch_cord["name"],
+    card_power_cable_name=selected_card_power_cable["name"],
+    exchange_rate=float(exchange_rate),
+    profile_40x20_rub_m=float(profile_40x20_rub_m),
+    screw_4x16_rub_each=float(screw_4x16_press_rub_each),
+    rivet_m6_rub_each=float(rivet_m6_threaded_rub_each),
+    bolt_m6_rub_each=float(bolt_m6_6x16_din912_rub_each),
+    margin_percent=margin_percent,
+    vat_mode=vat_mode,
+    logistics_rub=float(client_logistics_rub),
+    installation_rub=float(client_installation_rub),
+    price_per_m2=price_per_m2,
 )
+if "_quote_graph" not in st.session_state:
+    st.session_state._quote_graph = QuoteGraph()
+# Одинаковые входы (повторный rerun, загрузка сессии) берутся из общего кэша расчётов;
+# на промахе считает инкрементальный граф этой сессии
+def _quote_on_miss(inputs: QuoteInputs):
+    perf.cache_miss("cached_quote")
+    return st.session_state._quote_graph.compute(inputs)
 
-# --- 4. ХАБЫ ---
-num_hubs = num_cards_reserve if receiving_card["type"] == "A" else 0
 
-# --- 4b. МАГНИТЫ (только монолит; норма задаётся в блоке монтажа) ---
-num_magnets = (
-    total_modules * magnets_per_module
-    if ("Монолитный" in mount_type and selected_magnet is not None and magnets_per_module > 0)
-    else 0
-)
-magnet_unit_price_usd = magnet_unit_usd(selected_magnet) if selected_magnet else 0.0
-buy_magnets_total = num_magnets * magnet_unit_price_usd
-magnet_packs_order = (
-    math.ceil(num_magnets / selected_magnet["pack_qty"]) if selected_magnet and num_magnets else 0
-)
+with perf.timed("cached_quote", cache=True):
+    quote = cached_quote(quote_inputs, _quote_on_miss)
 
-# --- 4c. Профиль 40×20 (только монолит): суммарная длина отрезов; в продаже только хлыст 6 м
-vert_profiles = modules_w + 1
-vert_length = real_height - 40
-horiz_profiles = 2 if real_height <= 3000 else 3
-horiz_length = real_width - 60
-total_profile_length = (vert_profiles * vert_length + horiz_profiles * horiz_length) / 1000
+perf.mark("Подбор комплектации и Парето")
 
-fasteners_m6 = horiz_profiles * vert_profiles
-reserve_fasteners = math.ceil(fasteners_m6 * 0.03)
-num_m6_rivet_bolt_each = fasteners_m6 + reserve_fasteners
-
-if "Монолитный" in mount_type:
-    profile_cut_m = total_profile_length
-    profile_sticks_6m = math.ceil(profile_cut_m / PROFILE_40X20_STICK_M) if profile_cut_m > 0 else 0
-    profile_purchased_m = profile_sticks_6m * PROFILE_40X20_STICK_M
-    profile_waste_m = max(0.0, profile_purchased_m - profile_cut_m)
-    buy_profile_rub = profile_purchased_m * profile_40x20_rub_m
-    buy_profile_usd = buy_profile_rub / exchange_rate if exchange_rate else 0.0
-else:
-    buy_profile_rub = 0.0
-    buy_profile_usd = 0.0
-    profile_sticks_6m = 0
-    profile_purchased_m = 0.0
-    profile_waste_m = 0.0
-    profile_cut_m = 0.0
-
-if "Монолитный" in mount_type:
-    buy_screws_4x16_rub = num_screws_4x16_order * screw_4x16_press_rub_each
-    buy_screws_4x16_usd = buy_screws_4x16_rub / exchange_rate if exchange_rate else 0.0
-    buy_rivet_m6_rub = num_m6_rivet_bolt_each * rivet_m6_threaded_rub_each
-    buy_bolt_m6_6x16_rub = num_m6_rivet_bolt_each * bolt_m6_6x16_din912_rub_each
-    buy_m6_frame_rub = buy_rivet_m6_rub + buy_bolt_m6_6x16_rub
-    buy_m6_frame_usd = buy_m6_frame_rub / exchange_rate if exchange_rate else 0.0
-else:
-    buy_screws_4x16_rub = 0.0
-    buy_screws_4x16_usd = 0.0
-    buy_rivet_m6_rub = 0.0
-    buy_bolt_m6_6x16_rub = 0.0
-    buy_m6_frame_rub = 0.0
-    buy_m6_frame_usd = 0.0
-
-if "Монолитный" in mount_type:
-    buy_metal_plates_rub = num_plates * METAL_PLATE_RUB_EACH
-    buy_metal_plates_usd = buy_metal_plates_rub / exchange_rate if exchange_rate else 0.0
-else:
-    buy_metal_plates_rub = 0.0
-    buy_metal_plates_usd = 0.0
-
-# --- 5. ФИНАНСЫ (USD) ---
-
-# 1. Сначала определяем цену модуля для расчетов (берем ту, что введена выше)
-module_price_usd = price_usd  # Теперь NameError исчезнет
-
-# 2. Считаем закупку по категориям
-buy_mods_total = total_modules_order * module_price_usd
-buy_cards_total = num_cards_reserve * receiving_card["price_usd"]
-buy_hubs_total = num_hubs * hub_price_usd
-buy_psu_total = num_psu_reserve * sel_psu["price_usd"]
-buy_processor_total = proc_price_usd
-
-# 3. Итоговая сумма закупки (включая модули и процессор)
-total_buy_usd = (
-    buy_mods_total + 
-    buy_cards_total + 
-    buy_psu_total + 
-    buy_hubs_total + 
-    buy_processor_total +
-    buy_magnets_total +
-    buy_patch_cords_total +
-    buy_card_power_cables_total +
-    buy_power_jumpers_total +
-    buy_profile_usd +
-    buy_screws_4x16_usd +
-    buy_m6_frame_usd +
-    buy_metal_plates_usd
-)
-
-# 4. Пересчет модулей для отчета (как у тебя в коде)
-total_modules_cost_usd = total_modules * module_price_usd
-total_modules_cost_rub = total_modules_cost_usd * exchange_rate
-
-# 5. Общая закупка в рублях
-total_buy_rub = total_buy_usd * exchange_rate
-
-# Закупка: электроника/коммутация vs каркас и крепёж (профиль, M6, саморезы, пластины, магниты)
-buy_frame_usd = (
-    buy_profile_usd
-    + buy_screws_4x16_usd
-    + buy_m6_frame_usd
-    + buy_metal_plates_usd
-    + buy_magnets_total
-)
-buy_components_usd = total_buy_usd - buy_frame_usd
-buy_frame_rub = buy_frame_usd * exchange_rate
-buy_components_rub = buy_components_usd * exchange_rate
-
-# Наценка: отдельно на комплектующие и отдельно на каркас/крепёж.
-sale_components_usd = buy_components_usd * margin
-sale_components_rub = sale_components_usd * exchange_rate
-sale_frame_usd = buy_frame_usd * margin
-sale_frame_rub = sale_frame_usd * exchange_rate
-sale_hardware_usd = sale_components_usd + sale_frame_usd
-sale_hardware_rub = sale_components_rub + sale_frame_rub
-
-# Прибыль считаем только по железу (без логистики и монтажа).
-profit_hardware_usd = sale_hardware_usd - total_buy_usd
-profit_hardware_rub = profit_hardware_usd * exchange_rate
-
-logistics_rub = float(client_logistics_rub)
-installation_rub = float(client_installation_rub)
-extras_rub = logistics_rub + installation_rub
-extras_usd = extras_rub / exchange_rate if exchange_rate else 0.0
-
-commercial_subtotal_usd = sale_hardware_usd + extras_usd
-commercial_subtotal_rub = sale_hardware_rub + extras_rub
-
-vat_rate = 0.22 if vat_mode == "С НДС 22%" else 0.0
-vat_amount_usd = commercial_subtotal_usd * vat_rate
-vat_amount_rub = commercial_subtotal_rub * vat_rate
-
-sale_total_usd = commercial_subtotal_usd + vat_amount_usd
-sale_total_rub = commercial_subtotal_rub + vat_amount_rub
-profit_usd = profit_hardware_usd
-profit_rub = profit_hardware_rub
-expense_total_usd = total_buy_usd + extras_usd
-expense_total_rub = total_buy_rub + extras_rub
-
-# --- 6. ЭЛЕКТРИКА (ТЕПЕРЬ РАБОТАЕТ) ---
-electrical_power_kw = peak_power_screen_kw * 1.20
-if "Одна фаза" in power_phase:
-    current = (electrical_power_kw * 1000) / 220
-    cores = 3
-else:
-    current = (electrical_power_kw * 1000) / (380 * math.sqrt(3))
-    cores = 5
-
-if current <= 15: sq = "1.5"
-elif current <= 21: sq = "2.5"
-elif current <= 27: sq = "4"
-elif current <= 34: sq = "6"
-elif current <= 50: sq = "10"
-elif current <= 70: sq = "16"
-elif current <= 85: sq = "25"
-else: sq = "35"
-cable_section = f"{cores}×{sq} мм²"
-
-target_breaker = current * 1.25
-standard_breakers = [10, 16, 20, 25, 32, 40, 50, 63, 80, 100, 125, 160, 200, 250]
-breaker = next((b for b in standard_breakers if b >= target_breaker), math.ceil(target_breaker))
-
-# Механика (длины профиля и fasteners_m6 — см. блок 4c выше)
-
-# Коммутация
-num_cables = max(0, num_psu_reserve - 1)
-nvi = num_cables * 6
-reserve_nvi = math.ceil(nvi * 0.1)
-
-# Вес
-module_weight = 0.37 if "Indoor" in env_key else 0.5
-weight_modules = total_modules_order * module_weight
-
-total_cabinet_weight = 0
-cabinets_w, cabinets_h, total_cabinets = 0, 0, 0
-if "кабинетах" in mount_type:
-    cabinets_w = math.ceil(real_width / cabinet_width)
-    cabinets_h = math.ceil(real_height / cabinet_height)
-    total_cabinets = cabinets_w * cabinets_h
-    total_cabinet_weight = total_cabinets * cabinet_weight_per
-
-weight_carcas = total_profile_length * 2 if "Монолитный" in mount_type else 0
-weight_extra = (weight_modules + weight_carcas + total_cabinet_weight) * 0.05
-total_weight = weight_modules + weight_carcas + total_cabinet_weight + weight_extra
+with st.expander("🧮 Подбор самой дешёвой комплектации", expanded=False):
+    st.caption(
+        "Перебор процессоров, приёмных карт, HUB, БП и кратностей модулей для текущего размера и модуля: "
+        "минимум закупки при достаточном числе портов (с учётом Backup) и мощности БП."
+    )
+    _opt_msg = st.session_state.pop("_optimizer_apply_msg", None)
+    if _opt_msg:
+        st.success(_opt_msg)
+    if st.button("Подобрать и применить", key="optimizer_btn_apply", use_container_width=True):
+        _opt = find_cheapest_configuration(quote_inputs)
+        if _opt is None:
+            st.error("Нет допустимой комплектации: не хватает портов процессоров или мощности БП.")
+        else:
+            _oi = _opt.inputs
+            _opt_state = {
+                "sys_type_radio": _oi.controller_category,
+                "main_proc_select": {"name": _oi.processor_name},
+                "main_card_select": {"name": _oi.card_name},
+                "mods_per_card_select": _oi.modules_per_card,
+                "final_psu_selector": {"name": _oi.psu_name},
+                "final_m_per_p": _oi.modules_per_psu,
+            }
+            if _oi.hub_name:
+                _opt_state["main_hub_select"] = {"name": _oi.hub_name}
+            st.session_state["_session_payload_to_apply"] = _opt_state
+            st.session_state["_optimizer_apply_msg"] = (
+                f"{_oi.processor_name} · {_oi.card_name} ×{_oi.modules_per_card} мод. · "
+                f"{_oi.psu_name} ×{_oi.modules_per_psu} мод. — закупка ${_opt.quote.total_buy_usd:,.2f} "
+                f"(было ${quote.total_buy_usd:,.2f})"
+            )
+            st.rerun()
 
-# Логистика
-num_boxes = math.ceil(total_modules_order / 40)
-box_weight = num_boxes * 22
-box_volume = num_boxes * 0.06
+with st.expander("📈 Парето-фронт модулей: закупка / мощность / яркость / разрешение", expanded=False):
+    st.caption(
+        f"Модули {env_key} для размера {quote.real_width} × {quote.real_height} мм с текущей комплектацией: "
+        "только варианты, которые никто не превосходит сразу по цене, пиковой мощности, яркости и числу пикселей."
+    )
+    _front_rows = module_frontier(
+        int(width_mm),
+        int(height_mm),
+        catalog.modules_by_env.get(env_key, ()),
+        quote_inputs,
+    )
+    _front_table = {
+        "Модуль": [r["module_name"] for r in _front_rows],
+        "Закупка, $": [r["total_buy_usd"] for r in _front_rows],
+        "Продажа, ₽": [r["sale_total_rub"] for r in _front_rows],
+        "Пик, кВт": [r["peak_power_kw"] for r in _front_rows],
+        "Яркость, нит": [r["brightness"] for r in _front_rows],
+        "Пиксели": [r["pixels"] for r in _front_rows],
+    }
+    st.dataframe(_front_table, use_container_width=True, hide_index=True)
+    st.scatter_chart(_front_table, x="Закупка, $", y="Пиксели", size="Яркость, нит")
 
 # ==========================================
 # БЛОК 5: ПОЛНЫЙ ДЕТАЛЬНЫЙ ОТЧЕТ
 # ==========================================
+perf.mark("Блок 5: инженерный отчёт")
 st.markdown('<div class="section-header">📊 Финальный отчёт и Спецификация</div>', unsafe_allow_html=True)
 
 _spec_qty_cells = [
-    ("Модули", f"{total_modules_order} шт."),
-    ("БП", f"{num_psu_reserve} шт."),
-    ("Карты", f"{num_cards_reserve} шт."),
-    ("Хабы", f"{num_hubs} шт."),
+    ("Модули", f"{quote.total_modules_order} шт."),
+    ("БП", f"{quote.num_psu_reserve} шт."),
+    ("Карты", f"{quote.num_cards_reserve} шт."),
+    ("Хабы", f"{quote.num_hubs} шт."),
 ]
-if num_magnets:
-    _spec_qty_cells.append(("Магниты", f"{num_magnets} шт."))
+if quote.num_magnets:
+    _spec_qty_cells.append(("Магниты", f"{quote.num_magnets} шт."))
 _spec_qty_cells.extend(
     [
-        ("Патч-корды", f"{patch_cords} шт."),
-        ("Каб. пит. карт", f"{num_card_power_cables_order} шт."),
+        ("Патч-корды", f"{quote.patch_cords} шт."),
+        ("Каб. пит. карт", f"{quote.num_card_power_cables_order} шт."),
     ]
 )
-if num_power_jumpers:
-    _spec_qty_cells.append(("Перемычки БП", f"{num_power_jumpers} шт."))
-if profile_purchased_m > 0:
-    _spec_qty_cells.append(("Профиль 40×20×1,5", f"{profile_purchased_m:.1f} м"))
-if buy_screws_4x16_usd > 0:
-    _spec_qty_cells.append(("Саморезы", f"{num_screws_4x16_order} шт."))
-if buy_m6_frame_usd > 0:
-    _spec_qty_cells.append(("M6 узлы", f"{num_m6_rivet_bolt_each} к-т"))
-if "Монолитный" in mount_type and buy_metal_plates_usd > 0:
-    _spec_qty_cells.append(("Пластины БП", f"{num_plates} шт."))
+if quote.num_power_jumpers:
+    _spec_qty_cells.append(("Перемычки БП", f"{quote.num_power_jumpers} шт."))
+if quote.profile_purchased_m > 0:
+    _spec_qty_cells.append(("Профиль 40×20×1,5", f"{quote.profile_purchased_m:.1f} м"))
+if quote.buy_screws_4x16_usd > 0:
+    _spec_qty_cells.append(("Саморезы", f"{quote.num_screws_4x16_order} шт."))
+if quote.buy_m6_frame_usd > 0:
+    _spec_qty_cells.append(("M6 узлы", f"{quote.num_m6_rivet_bolt_each} к-т"))
+if "Монолитный" in mount_type and quote.buy_metal_plates_usd > 0:
+    _spec_qty_cells.append(("Пластины БП", f"{quote.num_plates} шт."))
 _spec_qty_grid_html = "".join(
     f'<div><div class="spec-summary-cell-label">{lbl}</div><div class="spec-summary-cell-val">{val}</div></div>'
     for lbl, val in _spec_qty_cells
@@ -2185,25 +1594,25 @@ col_m1, col_m2, col_m3, col_m4 = st.columns(4)
 with col_m1:
     st.markdown(
         f'<div class="metric-card"><div class="metric-label">Разрешение</div>'
-        f'<div class="metric-value">{int(real_width / pixel_pitch)} × {int(real_height / pixel_pitch)} px</div></div>',
+        f'<div class="metric-value">{int(quote.real_width / pixel_pitch)} × {int(quote.real_height / pixel_pitch)} px</div></div>',
         unsafe_allow_html=True,
     )
 with col_m2:
     st.markdown(
         f'<div class="metric-card"><div class="metric-label">Площадь</div>'
-        f'<div class="metric-value">{area_m2:.2f} м²</div></div>',
+        f'<div class="metric-value">{quote.area_m2:.2f} м²</div></div>',
         unsafe_allow_html=True,
     )
 with col_m3:
     st.markdown(
         f'<div class="metric-card"><div class="metric-label">Размер экрана</div>'
-        f'<div class="metric-value">{int(real_width)} × {int(real_height)} мм</div></div>',
+        f'<div class="metric-value">{int(quote.real_width)} × {int(quote.real_height)} мм</div></div>',
         unsafe_allow_html=True,
     )
 with col_m4:
     st.markdown(
         f'<div class="metric-card"><div class="metric-label">Потребление</div>'
-        f'<div class="metric-value">средн. {avg_power_screen_kw:.1f} кВт · макс. {peak_power_screen_kw:.1f} кВт</div></div>',
+        f'<div class="metric-value">средн. {quote.avg_power_screen_kw:.1f} кВт · макс. {quote.peak_power_screen_kw:.1f} кВт</div></div>',
         unsafe_allow_html=True,
     )
 
@@ -2225,27 +1634,27 @@ def _format_money_lines(usd_value: float, rub_value: float) -> tuple[str, str]:
     return (f"${usd_value:,.2f}", f"({rub_value:,.0f} ₽)")
 
 
-_buy_comp_main, _buy_comp_sub = _format_money_lines(buy_components_usd, buy_components_rub)
-_buy_frame_main, _buy_frame_sub = _format_money_lines(buy_frame_usd, buy_frame_rub)
-_sale_main, _sale_sub = _format_money_lines(sale_total_usd, sale_total_rub)
-_extras_main, _extras_sub = _format_money_lines(extras_usd, extras_rub)
-_vat_main, _vat_sub = _format_money_lines(vat_amount_usd, vat_amount_rub)
+_buy_comp_main, _buy_comp_sub = _format_money_lines(quote.buy_components_usd, quote.buy_components_rub)
+_buy_frame_main, _buy_frame_sub = _format_money_lines(quote.buy_frame_usd, quote.buy_frame_rub)
+_sale_main, _sale_sub = _format_money_lines(quote.sale_total_usd, quote.sale_total_rub)
+_extras_main, _extras_sub = _format_money_lines(quote.extras_usd, quote.extras_rub)
+_vat_main, _vat_sub = _format_money_lines(quote.vat_amount_usd, quote.vat_amount_rub)
 _sale_components_main, _sale_components_sub = _format_money_lines(
-    sale_components_usd, sale_components_rub
+    quote.sale_components_usd, quote.sale_components_rub
 )
-_sale_frame_main, _sale_frame_sub = _format_money_lines(sale_frame_usd, sale_frame_rub)
-_sale_components_usd_paren = f"(${sale_components_usd:,.2f})"
-_buy_components_usd_paren = f"(${buy_components_usd:,.2f})"
-_sale_frame_usd_paren = f"(${sale_frame_usd:,.2f})"
-_buy_frame_usd_paren = f"(${buy_frame_usd:,.2f})"
+_sale_frame_main, _sale_frame_sub = _format_money_lines(quote.sale_frame_usd, quote.sale_frame_rub)
+_sale_components_usd_paren = f"(${quote.sale_components_usd:,.2f})"
+_buy_components_usd_paren = f"(${quote.buy_components_usd:,.2f})"
+_sale_frame_usd_paren = f"(${quote.sale_frame_usd:,.2f})"
+_buy_frame_usd_paren = f"(${quote.buy_frame_usd:,.2f})"
 _installation_main, _installation_sub = _format_money_lines(
-    installation_rub / exchange_rate if exchange_rate else 0.0, installation_rub
+    quote.installation_rub / exchange_rate if exchange_rate else 0.0, quote.installation_rub
 )
 _logistics_main, _logistics_sub = _format_money_lines(
-    logistics_rub / exchange_rate if exchange_rate else 0.0, logistics_rub
+    quote.logistics_rub / exchange_rate if exchange_rate else 0.0, quote.logistics_rub
 )
-_profit_main, _profit_sub = _format_money_lines(profit_hardware_usd, profit_hardware_rub)
-_sale_title = "ИТОГО (с НДС)" if vat_rate > 0 else "ИТОГО (без НДС)"
+_profit_main, _profit_sub = _format_money_lines(quote.profit_hardware_usd, quote.profit_hardware_rub)
+_sale_title = "ИТОГО (с НДС)" if quote.vat_rate > 0 else "ИТОГО (без НДС)"
 
 col_f1, col_f2, col_f3, col_f4, col_f5, col_f6 = st.columns(6)
 
@@ -2343,17 +1752,17 @@ with col_f6:
 
 st.caption(
     "Пояснение по коммерции:\n"
-    f"- НДС: {vat_mode}, сумма {_vat_main} ({vat_amount_rub:,.0f} ₽)\n"
-    f"- Логистика: {logistics_rub:,.0f} ₽ ({logistics_rub / exchange_rate:,.2f} $)\n"
-    f"- Монтаж: {installation_rub:,.0f} ₽ ({installation_rub / exchange_rate:,.2f} $)"
+    f"- НДС: {vat_mode}, сумма {_vat_main} ({quote.vat_amount_rub:,.0f} ₽)\n"
+    f"- Логистика: {quote.logistics_rub:,.0f} ₽ ({quote.logistics_rub / exchange_rate:,.2f} $)\n"
+    f"- Монтаж: {quote.installation_rub:,.0f} ₽ ({quote.installation_rub / exchange_rate:,.2f} $)"
 )
 
 st.markdown("---")
 
 with st.expander("Характеристики экрана", expanded=True):
     st.markdown(f"""
-    - **Разрешение**: {int(real_width / pixel_pitch)} × {int(real_height / pixel_pitch)} px
-    - **Площадь**: {area_m2:.2f} м²
+    - **Разрешение**: {int(quote.real_width / pixel_pitch)} × {int(quote.real_height / pixel_pitch)} px
+    - **Площадь**: {quote.area_m2:.2f} м²
     - **Технология**: {tech}
     - **Яркость**: {brightness} нит
     - **Датчик яркости и температуры**: {sensor}
@@ -2362,12 +1771,12 @@ with st.expander("Характеристики экрана", expanded=True):
 with st.expander("Модули", expanded=True):
     st.markdown(f"""
     - **Модель**: {selected_module_name}
-    - **По горизонтали**: {modules_w} шт.
-    - **По вертикали**: {modules_h} шт.
-    - **Основное количество**: {total_modules} шт.
-    - **Резерв (ЗИП)**: {reserve_modules} шт.
-    - **Итого для заказа**: **{total_modules_order} шт.**
-    - **Закупочная стоимость модулей**: ${total_modules_cost_usd:.2f} ({total_modules_cost_rub:,.0f} ₽)
+    - **По горизонтали**: {quote.modules_w} шт.
+    - **По вертикали**: {quote.modules_h} шт.
+    - **Основное количество**: {quote.total_modules} шт.
+    - **Резерв (ЗИП)**: {quote.reserve_modules} шт.
+    - **Итого для заказа**: **{quote.total_modules_order} шт.**
+    - **Закупочная стоимость модулей**: ${quote.total_modules_cost_usd:.2f} ({quote.total_modules_cost_rub:,.0f} ₽)
     """)
 
 if "кабинетах" in mount_type:
@@ -2375,48 +1784,48 @@ if "кабинетах" in mount_type:
         st.markdown(f"""
         - **Модель**: {cabinet_model}
         - **Размер одного**: {cabinet_width} × {cabinet_height} мм
-        - **Сетка**: {cabinets_w} (Ш) × {cabinets_h} (В)
-        - **Общее количество**: **{total_cabinets} шт.**
+        - **Сетка**: {quote.cabinets_w} (Ш) × {quote.cabinets_h} (В)
+        - **Общее количество**: **{quote.total_cabinets} шт.**
         - **Вес одного**: {cabinet_weight_per:.1f} кг
-        - **Общий вес кабинетов**: {total_cabinet_weight:.1f} кг
+        - **Общий вес кабинетов**: {quote.total_cabinet_weight:.1f} кг
         """)
 
 with st.expander("Принимающие карты", expanded=True):
     st.markdown(f"""
     - **Модель**: {receiving_card['name']}
-    - **Основное количество**: {num_cards} шт.
-    - **Итого с учетом ЗИП**: **{num_cards_reserve} шт.**
+    - **Основное количество**: {quote.num_cards} шт.
+    - **Итого с учетом ЗИП**: **{quote.num_cards_reserve} шт.**
     """)
 
 with st.expander("Блоки питания", expanded=True):
     st.markdown(f"""
     - **Модель БП**: {sel_psu['name']} ({sel_psu['max_w']}W)
     - **Схема коммутации**: {modules_per_psu} модулей на 1 БП
-    - **Пиковое потребление экрана**: {peak_power_screen_kw:.1f} кВт
-    - **Рабочее (среднее) потребление**: {avg_power_screen_kw:.1f} кВт
-    - **Основное количество БП**: {num_psu} шт.
-    - **Итого БП к заказу (с ЗИП)**: **{num_psu_reserve} шт.**
+    - **Пиковое потребление экрана**: {quote.peak_power_screen_kw:.1f} кВт
+    - **Рабочее (среднее) потребление**: {quote.avg_power_screen_kw:.1f} кВт
+    - **Основное количество БП**: {quote.num_psu} шт.
+    - **Итого БП к заказу (с ЗИП)**: **{quote.num_psu_reserve} шт.**
     """)
 
 with st.expander("Процессор / Контроллер", expanded=True):
     _rep_proc_ports = (
-        f"\n    - **Backup**: да (база **{required_ports_base}** → требуется **{required_ports}**)"
+        f"\n    - **Backup**: да (база **{quote.required_ports_base}** → требуется **{quote.required_ports}**)"
         if hot_backup
         else ""
     )
     st.markdown(f"""
    - **Модель**: {selected_proc['name']}
-    - **Доступно портов**: {available_ports}
-    - **Необходимое портов (с учётом режима)**: {required_ports}{_rep_proc_ports}
-    - **Средняя нагрузка на порт**: {load_per_port:.1f}%
+    - **Доступно портов**: {quote.available_ports}
+    - **Необходимое портов (с учётом режима)**: {quote.required_ports}{_rep_proc_ports}
+    - **Средняя нагрузка на порт**: {quote.load_per_port:.1f}%
     """)
 
 with st.expander("Вводная Сеть", expanded=True):
     st.markdown(f"""
     - **Тип сети**: {power_phase}
-    - **Ток**: {current:.1f} А (расчетный)
-    - **Рекомендуемый кабель ВВГ**: {cable_section}
-    - **Номинал автомата**: {breaker} А (тип C)
+    - **Ток**: {quote.current:.1f} А (расчетный)
+    - **Рекомендуемый кабель ВВГ**: {quote.cable_section}
+    - **Номинал автомата**: {quote.breaker} А (тип C)
     """)
 
 if "Монолитный" in mount_type:
@@ -2425,222 +1834,257 @@ if "Монолитный" in mount_type:
 **Магниты**
 - Модель: {selected_magnet['name']}
 - Норма: {magnets_per_module} шт. на модуль
-- Количество: {num_magnets} шт. ({total_modules} × {magnets_per_module})
-- Пачки: ~{magnet_packs_order} × {selected_magnet['pack_qty']} шт.
-- Стоимость: <span style="color:#48bb78"><strong>${buy_magnets_total:.2f} ({buy_magnets_total * exchange_rate:,.0f} ₽)</strong></span>, по ${magnet_unit_price_usd:.4f}/шт"""
+- Количество: {quote.num_magnets} шт. ({quote.total_modules} × {magnets_per_module})
+- Пачки: ~{quote.magnet_packs_order} × {selected_magnet['pack_qty']} шт.
+- Стоимость: <span style="color:#48bb78"><strong>${quote.buy_magnets_total:.2f} ({quote.buy_magnets_total * exchange_rate:,.0f} ₽)</strong></span>, по ${quote.magnet_unit_price_usd:.4f}/шт"""
     else:
         _report_magnet_block = """
 - **Магниты:** не заданы"""
     with st.expander("Каркас и крепёж (Монолитный)", expanded=True):
         _waste_pct = (
-            (100.0 * profile_waste_m / profile_purchased_m) if profile_purchased_m > 0 else 0.0
+            (100.0 * quote.profile_waste_m / quote.profile_purchased_m) if quote.profile_purchased_m > 0 else 0.0
         )
         st.markdown(f"""
 **Профиль 40×20×1,5**
-- Вертикальные: {vert_profiles} шт. × {vert_length} мм = {vert_profiles * vert_length / 1000:.2f} м
-- Горизонтальные: {horiz_profiles} шт. × {horiz_length} мм = {horiz_profiles * horiz_length / 1000:.2f} м
-- Раскрой: нужно {profile_cut_m:.2f} м
-- Закупка: {profile_sticks_6m} хлыстов × 6 м = {profile_purchased_m:.2f} м
-- Остаток: ~{profile_waste_m:.2f} м ({_waste_pct:.1f}%)
+- Вертикальные: {quote.vert_profiles} шт. × {quote.vert_length} мм = {quote.vert_profiles * quote.vert_length / 1000:.2f} м
+- Горизонтальные: {quote.horiz_profiles} шт. × {quote.horiz_length} мм = {quote.horiz_profiles * quote.horiz_length / 1000:.2f} м
+- Раскрой: нужно {quote.profile_cut_m:.2f} м
+- Закупка: {quote.profile_sticks_6m} хлыстов × 6 м = {quote.profile_purchased_m:.2f} м
+- Остаток: ~{quote.profile_waste_m:.2f} м ({_waste_pct:.1f}%)
 - Цена профиля: {profile_40x20_rub_m:.0f} ₽/м ({profile_price_source_note})
-- Итого профиль: <span style="color:#48bb78"><strong>${buy_profile_usd:.2f} ({buy_profile_rub:,.0f} ₽)</strong></span>
+- Итого профиль: <span style="color:#48bb78"><strong>${quote.buy_profile_usd:.2f} ({quote.buy_profile_rub:,.0f} ₽)</strong></span>
 
 **Крепеж**
-- Количество узлов M6: {fasteners_m6} + запас 3% ({reserve_fasteners}) = {num_m6_rivet_bolt_each} к-т
-- Заклёпка Sormat M6: {rivet_m6_threaded_rub_each:.3f} ₽/шт → <span style="color:#48bb78"><strong>{buy_rivet_m6_rub:,.0f} ₽</strong></span>
-- Винт M6×16 DIN 912: {bolt_m6_6x16_din912_rub_each:.3f} ₽/шт → <span style="color:#48bb78"><strong>{buy_bolt_m6_6x16_rub:,.0f} ₽</strong></span>
-- Итого M6: <span style="color:#48bb78"><strong>${buy_m6_frame_usd:.2f} ({buy_m6_frame_rub:,.0f} ₽)</strong></span>
+- Количество узлов M6: {quote.fasteners_m6} + запас 3% ({quote.reserve_fasteners}) = {quote.num_m6_rivet_bolt_each} к-т
+- Заклёпка Sormat M6: {rivet_m6_threaded_rub_each:.3f} ₽/шт → <span style="color:#48bb78"><strong>{quote.buy_rivet_m6_rub:,.0f} ₽</strong></span>
+- Винт M6×16 DIN 912: {bolt_m6_6x16_din912_rub_each:.3f} ₽/шт → <span style="color:#48bb78"><strong>{quote.buy_bolt_m6_6x16_rub:,.0f} ₽</strong></span>
+- Итого M6: <span style="color:#48bb78"><strong>${quote.buy_m6_frame_usd:.2f} ({quote.buy_m6_frame_rub:,.0f} ₽)</strong></span>
 
 {_report_magnet_block}
 
-- Пластины под БП: {num_plates} шт. × {METAL_PLATE_RUB_EACH:.0f} ₽ = <span style="color:#48bb78"><strong>${buy_metal_plates_usd:.2f} ({buy_metal_plates_rub:,.0f} ₽)</strong></span>
-- Саморезы 4,2×16: {vinths} + запас 10% ({reserve_vinths}) = {num_screws_4x16_order} шт.
+- Пластины под БП: {quote.num_plates} шт. × {METAL_PLATE_RUB_EACH:.0f} ₽ = <span style="color:#48bb78"><strong>${quote.buy_metal_plates_usd:.2f} ({quote.buy_metal_plates_rub:,.0f} ₽)</strong></span>
+- Саморезы 4,2×16: {quote.vinths} + запас 10% ({quote.reserve_vinths}) = {quote.num_screws_4x16_order} шт.
 - Цена самореза: {screw_4x16_press_rub_each:.3f} ₽/шт ({screw_4x16_price_source_note})
-- Итого саморезы: <span style="color:#48bb78"><strong>${buy_screws_4x16_usd:.2f} ({buy_screws_4x16_rub:,.0f} ₽)</strong></span>
+- Итого саморезы: <span style="color:#48bb78"><strong>${quote.buy_screws_4x16_usd:.2f} ({quote.buy_screws_4x16_rub:,.0f} ₽)</strong></span>
         """, unsafe_allow_html=True)
 
 with st.expander("Коммутация", expanded=True):
     _patch_zip_note = (
         "; при ЗИП **+1** патч-корд в комплект"
-        if num_patch_cords_zip_spare
+        if quote.num_patch_cords_zip_spare
         else ""
     )
     if "Монолитный" in mount_type:
         _pj_name = selected_power_jumper["name"] if selected_power_jumper else "—"
         _pj_zip_note = (
             ", в т.ч. **+1** силовая перемычка (ЗИП)"
-            if num_power_jumpers_zip_spare
+            if quote.num_power_jumpers_zip_spare
             else ""
         )
         st.markdown(f"""
 **Силовая (монолит)**
-- Силовые перемычки БП: {num_power_jumpers} шт. ({_pj_name})
-- Из них по цепочке БП: {num_power_jumpers_for_chain} шт. на {num_psu_reserve} БП{_pj_zip_note}
-- Стоимость перемычек: <span style="color:#48bb78"><strong>${buy_power_jumpers_total:.2f} ({buy_power_jumpers_total * exchange_rate:,.0f} ₽)</strong></span>
+- Силовые перемычки БП: {quote.num_power_jumpers} шт. ({_pj_name})
+- Из них по цепочке БП: {quote.num_power_jumpers_for_chain} шт. на {quote.num_psu_reserve} БП{_pj_zip_note}
+- Стоимость перемычек: <span style="color:#48bb78"><strong>${quote.buy_power_jumpers_total:.2f} ({quote.buy_power_jumpers_total * exchange_rate:,.0f} ₽)</strong></span>
 
 **Слаботочка и питание карт**
-- Патч-корды RJ45: {patch_cords} шт. ({selected_patch_cord['name']})
-- Логика количества: {num_cards_reserve} по картам{_patch_zip_note}
-- Стоимость патч-кордов: <span style="color:#48bb78"><strong>${buy_patch_cords_total:.2f} ({buy_patch_cords_total * exchange_rate:,.0f} ₽)</strong></span>
+- Патч-корды RJ45: {quote.patch_cords} шт. ({selected_patch_cord['name']})
+- Логика количества: {quote.num_cards_reserve} по картам{_patch_zip_note}
+- Стоимость патч-кордов: <span style="color:#48bb78"><strong>${quote.buy_patch_cords_total:.2f} ({quote.buy_patch_cords_total * exchange_rate:,.0f} ₽)</strong></span>
 
-- Кабели питания карт → БП: {num_card_power_cables_order} шт. ({selected_card_power_cable['name']})
-- Логика количества: {num_power_cables} по картам + {reserve_power_cables} запас 10%
-- Стоимость кабелей питания карт: <span style="color:#48bb78"><strong>${buy_card_power_cables_total:.2f} ({buy_card_power_cables_total * exchange_rate:,.0f} ₽)</strong></span>
+- Кабели питания карт → БП: {quote.num_card_power_cables_order} шт. ({selected_card_power_cable['name']})
+- Логика количества: {quote.num_power_cables} по картам + {quote.reserve_power_cables} запас 10%
+- Стоимость кабелей питания карт: <span style="color:#48bb78"><strong>${quote.buy_card_power_cables_total:.2f} ({quote.buy_card_power_cables_total * exchange_rate:,.0f} ₽)</strong></span>
         """, unsafe_allow_html=True)
     else:
         st.markdown(f"""
 **Силовая (кабинеты)**
-- Силовые кабели 220 В (шлейфы): {num_cables} шт., суммарно ~{num_cables * 0.8:.1f} м
-- Наконечники НВИ: {nvi} шт. + {reserve_nvi} шт. запас (10%)
+- Силовые кабели 220 В (шлейфы): {quote.num_cables} шт., суммарно ~{quote.num_cables * 0.8:.1f} м
+- Наконечники НВИ: {quote.nvi} шт. + {quote.reserve_nvi} шт. запас (10%)
 
 **Слаботочка и питание карт**
-- Патч-корды RJ45: {patch_cords} шт. ({selected_patch_cord['name']})
-- Логика количества: {num_cards_reserve} по картам{_patch_zip_note}
-- Стоимость патч-кордов: <span style="color:#48bb78"><strong>${buy_patch_cords_total:.2f} ({buy_patch_cords_total * exchange_rate:,.0f} ₽)</strong></span>
+- Патч-корды RJ45: {quote.patch_cords} шт. ({selected_patch_cord['name']})
+- Логика количества: {quote.num_cards_reserve} по картам{_patch_zip_note}
+- Стоимость патч-кордов: <span style="color:#48bb78"><strong>${quote.buy_patch_cords_total:.2f} ({quote.buy_patch_cords_total * exchange_rate:,.0f} ₽)</strong></span>
 
-- Кабели питания карт → БП: {num_card_power_cables_order} шт. ({selected_card_power_cable['name']})
-- Логика количества: {num_power_cables} по картам + {reserve_power_cables} запас 10%
-- Стоимость кабелей питания карт: <span style="color:#48bb78"><strong>${buy_card_power_cables_total:.2f} ({buy_card_power_cables_total * exchange_rate:,.0f} ₽)</strong></span>
+- Кабели питания карт → БП: {quote.num_card_power_cables_order} шт. ({selected_card_power_cable['name']})
+- Логика количества: {quote.num_power_cables} по картам + {quote.reserve_power_cables} запас 10%
+- Стоимость кабелей питания карт: <span style="color:#48bb78"><strong>${quote.buy_card_power_cables_total:.2f} ({quote.buy_card_power_cables_total * exchange_rate:,.0f} ₽)</strong></span>
         """, unsafe_allow_html=True)
 
 with st.expander("Весовые характеристики", expanded=True):
     st.markdown(f"""
-    - **Вес модулей**: {weight_modules:.1f} кг
-    - **Вес каркаса / кабинетов**: {weight_carcas + total_cabinet_weight:.1f} кг
-    - **Метизы и проводка (5%)**: {weight_extra:.1f} кг
-    - **Общий расчётный вес экрана**: **{total_weight:.1f} кг**
+    - **Вес модулей**: {quote.weight_modules:.1f} кг
+    - **Вес каркаса / кабинетов**: {quote.weight_carcas + quote.total_cabinet_weight:.1f} кг
+    - **Метизы и проводка (5%)**: {quote.weight_extra:.1f} кг
+    - **Общий расчётный вес экрана**: **{quote.total_weight:.1f} кг**
     """)
 
 with st.expander("Упаковка и логистика", expanded=True):
     st.markdown(f"""
-    - **Количество коробок**: {num_boxes} шт.
-    - **Общий вес коробок**: ~{box_weight} кг
-    - **Общий объём**: ~{box_volume:.2f} м³
+    - **Количество коробок**: {quote.num_boxes} шт.
+    - **Общий вес коробок**: ~{quote.box_weight} кг
+    - **Общий объём**: ~{quote.box_volume:.2f} м³
     """)
 
 # СХЕМА СБОРКИ
-if "Монолитный" in mount_type:
-    st.subheader("📐 Схема сборки")
-    html_grid = f"""
-    <div style="display: grid; grid-template-columns: repeat({modules_w}, 1fr); gap: 2px; background-color: #2d3748; padding: 4px; width: 100%; max-width: 900px; border-radius: 4px; margin: 0 auto;">
-    """
+perf.mark("Схема сборки")
+
+
+def _timed_cache_data(name: str, **cache_kwargs):
+    """st.cache_data с замером времени вызова и учётом попаданий для отладочной панели."""
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def compute(*args, **kwargs):
+            perf.cache_miss(name)
+            return fn(*args, **kwargs)
+
+        cached = st.cache_data(**cache_kwargs)(compute)
+
+        @functools.wraps(fn)
+        def call(*args, **kwargs):
+            with perf.timed(name, cache=True):
+                return cached(*args, **kwargs)
+
+        return call
+
+    return decorate
+
+
+@_timed_cache_data("_assembly_grid_html", max_entries=32, show_spinner=False)
+def _assembly_grid_html(modules_w: int, modules_h: int) -> str:
+    cells = []
     for row in range(modules_h):
         for col in range(modules_w):
             color = "#48bb78" if (row + col) % 2 == 0 else "#319795"
-            html_grid += f'<div style="background-color: {color}; aspect-ratio: 2/1; border-radius: 2px;"></div>'
-    html_grid += "</div>"
-    st.components.v1.html(html_grid, height=int(900 * (modules_h/modules_w)) + 20)
+            cells.append(f'<div style="background-color: {color}; aspect-ratio: 2/1; border-radius: 2px;"></div>')
+    return (
+        f"""
+    <div style="display: grid; grid-template-columns: repeat({modules_w}, 1fr); gap: 2px; background-color: #2d3748; padding: 4px; width: 100%; max-width: 900px; border-radius: 4px; margin: 0 auto;">
+    """
+        + "".join(cells)
+        + "</div>"
+    )
+
+
+if "Монолитный" in mount_type:
+    st.subheader("📐 Схема сборки")
+    html_grid = _assembly_grid_html(quote.modules_w, quote.modules_h)
+    st.components.v1.html(html_grid, height=int(900 * (quote.modules_h/quote.modules_w)) + 20)
 
 st.markdown("---")
 
 # ==========================================
 # БЛОК 6: ИНТЕГРАЦИЯ
 # ==========================================
+perf.mark("Блок 6: Figma JSON и контексты PDF")
 st.subheader("🔗 Экспорт и Интеграция")
 
 figma_data = {
     "project_name": project_name, "client": client_name, "date": datetime.datetime.now().strftime("%Y-%m-%d"),
-    "screen_dimensions_mm": f"{real_width}x{real_height}", "resolution_px": f"{int(real_width/pixel_pitch)}x{int(real_height/pixel_pitch)}",
-    "area_m2": round(area_m2, 2), "pixel_pitch": pixel_pitch, "total_modules": total_modules_order,
-    "receiving_cards": num_cards_reserve, "power_supplies": num_psu_reserve, "processor": selected_proc['name'],
-    "processor_ports_physical": available_ports,
-    "processor_ports_required": required_ports,
-    "processor_ports_required_base": required_ports_base,
+    "screen_dimensions_mm": f"{quote.real_width}x{quote.real_height}", "resolution_px": f"{int(quote.real_width/pixel_pitch)}x{int(quote.real_height/pixel_pitch)}",
+    "area_m2": round(quote.area_m2, 2), "pixel_pitch": pixel_pitch, "total_modules": quote.total_modules_order,
+    "receiving_cards": quote.num_cards_reserve, "power_supplies": quote.num_psu_reserve, "processor": selected_proc['name'],
+    "processor_ports_physical": quote.available_ports,
+    "processor_ports_required": quote.required_ports,
+    "processor_ports_required_base": quote.required_ports_base,
     "hot_backup_gige": bool(hot_backup),
-    "magnets_qty": num_magnets,
+    "magnets_qty": quote.num_magnets,
     "magnets_per_module": magnets_per_module,
-    "magnets_cost_usd": round(buy_magnets_total, 2),
-    "patch_cords_qty": patch_cords,
-    "patch_cords_zip_spare_qty": num_patch_cords_zip_spare,
+    "magnets_cost_usd": round(quote.buy_magnets_total, 2),
+    "patch_cords_qty": quote.patch_cords,
+    "patch_cords_zip_spare_qty": quote.num_patch_cords_zip_spare,
     "patch_cord_model": selected_patch_cord["name"],
-    "patch_cords_cost_usd": round(buy_patch_cords_total, 2),
-    "card_power_cables_qty": num_card_power_cables_order,
+    "patch_cords_cost_usd": round(quote.buy_patch_cords_total, 2),
+    "card_power_cables_qty": quote.num_card_power_cables_order,
     "card_power_cable_model": selected_card_power_cable["name"],
-    "card_power_cables_cost_usd": round(buy_card_power_cables_total, 2),
-    "power_jumpers_qty": num_power_jumpers,
-    "power_jumpers_for_psu_chain_qty": num_power_jumpers_for_chain,
-    "power_jumpers_zip_spare_qty": num_power_jumpers_zip_spare,
+    "card_power_cables_cost_usd": round(quote.buy_card_power_cables_total, 2),
+    "power_jumpers_qty": quote.num_power_jumpers,
+    "power_jumpers_for_psu_chain_qty": quote.num_power_jumpers_for_chain,
+    "power_jumpers_zip_spare_qty": quote.num_power_jumpers_zip_spare,
     "power_jumper_model": selected_power_jumper["name"] if selected_power_jumper else None,
-    "power_jumpers_cost_usd": round(buy_power_jumpers_total, 2),
+    "power_jumpers_cost_usd": round(quote.buy_power_jumpers_total, 2),
     "profile_40x20_stick_length_m": PROFILE_40X20_STICK_M,
-    "profile_40x20_sticks_6m": profile_sticks_6m,
-    "profile_purchased_m": round(profile_purchased_m, 3),
-    "profile_cut_m": round(profile_cut_m, 3),
-    "profile_waste_m": round(profile_waste_m, 3),
+    "profile_40x20_sticks_6m": quote.profile_sticks_6m,
+    "profile_purchased_m": round(quote.profile_purchased_m, 3),
+    "profile_cut_m": round(quote.profile_cut_m, 3),
+    "profile_waste_m": round(quote.profile_waste_m, 3),
     "profile_rub_per_m": round(profile_40x20_rub_m, 2),
     "profile_price_source": profile_price_source_note,
-    "profile_cost_rub": round(buy_profile_rub, 2),
-    "profile_cost_usd": round(buy_profile_usd, 2),
-    "screw_4x16_press_qty": num_screws_4x16_order,
+    "profile_cost_rub": round(quote.buy_profile_rub, 2),
+    "profile_cost_usd": round(quote.buy_profile_usd, 2),
+    "screw_4x16_press_qty": quote.num_screws_4x16_order,
     "screw_4x16_press_rub_each": round(screw_4x16_press_rub_each, 4),
     "screw_4x16_price_source": screw_4x16_price_source_note,
-    "screw_4x16_cost_rub": round(buy_screws_4x16_rub, 2),
-    "screw_4x16_cost_usd": round(buy_screws_4x16_usd, 2),
-    "m6_frame_joint_qty": num_m6_rivet_bolt_each,
+    "screw_4x16_cost_rub": round(quote.buy_screws_4x16_rub, 2),
+    "screw_4x16_cost_usd": round(quote.buy_screws_4x16_usd, 2),
+    "m6_frame_joint_qty": quote.num_m6_rivet_bolt_each,
     "rivet_m6_threaded_rub_each": round(rivet_m6_threaded_rub_each, 4),
     "rivet_m6_sormat_lemana_url": LEMANA_RIVET_M6_SORMAT_URL,
     "rivet_m6_price_source": rivet_m6_price_source_note,
-    "rivet_m6_cost_rub": round(buy_rivet_m6_rub, 2),
+    "rivet_m6_cost_rub": round(quote.buy_rivet_m6_rub, 2),
     "bolt_m6_6x16_din912_rub_each": round(bolt_m6_6x16_din912_rub_each, 4),
     "bolt_m6_6x16_price_source": bolt_m6_6x16_price_source_note,
     "bolt_m6_6x16_lemana_url": LEMANA_BOLT_M6_6x16_DIN912_URL,
-    "bolt_m6_6x16_cost_rub": round(buy_bolt_m6_6x16_rub, 2),
-    "m6_frame_total_rub": round(buy_m6_frame_rub, 2),
-    "m6_frame_total_usd": round(buy_m6_frame_usd, 2),
-    "metal_plates_qty": num_plates if "Монолитный" in mount_type else 0,
+    "bolt_m6_6x16_cost_rub": round(quote.buy_bolt_m6_6x16_rub, 2),
+    "m6_frame_total_rub": round(quote.buy_m6_frame_rub, 2),
+    "m6_frame_total_usd": round(quote.buy_m6_frame_usd, 2),
+    "metal_plates_qty": quote.num_plates if "Монолитный" in mount_type else 0,
     "metal_plate_rub_each": METAL_PLATE_RUB_EACH,
-    "metal_plates_cost_rub": round(buy_metal_plates_rub, 2),
-    "metal_plates_cost_usd": round(buy_metal_plates_usd, 2),
-    "peak_power_kw": round(peak_power_screen_kw, 2), "avg_power_kw": round(avg_power_screen_kw, 2),
-    "total_price_rub": total_price_rub,
-    "module_cost_usd": total_modules_cost_usd,
-    "module_cost_rub": total_modules_cost_rub,
-    "total_buy_usd": round(total_buy_usd, 2),
-    "total_buy_rub": round(total_buy_rub, 2),
-    "buy_components_usd": round(buy_components_usd, 2),
-    "buy_components_rub": round(buy_components_rub, 2),
-    "buy_frame_usd": round(buy_frame_usd, 2),
-    "buy_frame_rub": round(buy_frame_rub, 2),
+    "metal_plates_cost_rub": round(quote.buy_metal_plates_rub, 2),
+    "metal_plates_cost_usd": round(quote.buy_metal_plates_usd, 2),
+    "peak_power_kw": round(quote.peak_power_screen_kw, 2), "avg_power_kw": round(quote.avg_power_screen_kw, 2),
+    "total_price_rub": quote.total_price_rub,
+    "module_cost_usd": quote.total_modules_cost_usd,
+    "module_cost_rub": quote.total_modules_cost_rub,
+    "total_buy_usd": round(quote.total_buy_usd, 2),
+    "total_buy_rub": round(quote.total_buy_rub, 2),
+    "buy_components_usd": round(quote.buy_components_usd, 2),
+    "buy_components_rub": round(quote.buy_components_rub, 2),
+    "buy_frame_usd": round(quote.buy_frame_usd, 2),
+    "buy_frame_rub": round(quote.buy_frame_rub, 2),
     "display_currency": display_currency,
     "vat_mode": vat_mode,
-    "vat_percent": int(vat_rate * 100),
-    "sale_hardware_usd": round(sale_hardware_usd, 2),
-    "sale_hardware_rub": round(sale_hardware_rub, 2),
-    "profit_hardware_usd": round(profit_hardware_usd, 2),
-    "profit_hardware_rub": round(profit_hardware_rub, 2),
-    "expense_total_usd": round(expense_total_usd, 2),
-    "expense_total_rub": round(expense_total_rub, 2),
-    "logistics_rub": round(logistics_rub, 2),
-    "installation_rub": round(installation_rub, 2),
-    "extras_usd": round(extras_usd, 2),
-    "extras_rub": round(extras_rub, 2),
-    "commercial_subtotal_usd": round(commercial_subtotal_usd, 2),
-    "commercial_subtotal_rub": round(commercial_subtotal_rub, 2),
-    "vat_amount_usd": round(vat_amount_usd, 2),
-    "vat_amount_rub": round(vat_amount_rub, 2),
-    "sale_total_usd": round(sale_total_usd, 2),
-    "sale_total_rub": round(sale_total_rub, 2),
-    "profit_usd": round(profit_usd, 2),
-    "profit_rub": round(profit_rub, 2),
+    "vat_percent": int(quote.vat_rate * 100),
+    "sale_hardware_usd": round(quote.sale_hardware_usd, 2),
+    "sale_hardware_rub": round(quote.sale_hardware_rub, 2),
+    "profit_hardware_usd": round(quote.profit_hardware_usd, 2),
+    "profit_hardware_rub": round(quote.profit_hardware_rub, 2),
+    "expense_total_usd": round(quote.expense_total_usd, 2),
+    "expense_total_rub": round(quote.expense_total_rub, 2),
+    "logistics_rub": round(quote.logistics_rub, 2),
+    "installation_rub": round(quote.installation_rub, 2),
+    "extras_usd": round(quote.extras_usd, 2),
+    "extras_rub": round(quote.extras_rub, 2),
+    "commercial_subtotal_usd": round(quote.commercial_subtotal_usd, 2),
+    "commercial_subtotal_rub": round(quote.commercial_subtotal_rub, 2),
+    "vat_amount_usd": round(quote.vat_amount_usd, 2),
+    "vat_amount_rub": round(quote.vat_amount_rub, 2),
+    "sale_total_usd": round(quote.sale_total_usd, 2),
+    "sale_total_rub": round(quote.sale_total_rub, 2),
+    "profit_usd": round(quote.profit_usd, 2),
+    "profit_rub": round(quote.profit_rub, 2),
     "margin_percent": int((margin - 1) * 100),
 }
-figma_json = json.dumps(figma_data, indent=4, ensure_ascii=False)
+with perf.timed("Figma JSON"):
+    figma_json = json.dumps(figma_data, indent=4, ensure_ascii=False)
 
 _pdf_spec_rows = [
-    ("Модули", f"{total_modules_order} шт."),
-    ("Приёмные карты", f"{num_cards_reserve} шт."),
-    ("БП", f"{num_psu_reserve} шт."),
-    ("Патч-корды", f"{patch_cords} шт."),
-    ("Кабели питания карт", f"{num_card_power_cables_order} шт."),
+    ("Модули", f"{quote.total_modules_order} шт."),
+    ("Приёмные карты", f"{quote.num_cards_reserve} шт."),
+    ("БП", f"{quote.num_psu_reserve} шт."),
+    ("Патч-корды", f"{quote.patch_cords} шт."),
+    ("Кабели питания карт", f"{quote.num_card_power_cables_order} шт."),
 ]
-if num_magnets:
-    _pdf_spec_rows.append(("Магниты", f"{num_magnets} шт."))
-if num_power_jumpers:
-    _pdf_spec_rows.append(("Перемычки БП", f"{num_power_jumpers} шт."))
-if profile_purchased_m > 0:
-    _pdf_spec_rows.append(("Профиль 40×20×1,5", f"{profile_purchased_m:.1f} м"))
-if buy_m6_frame_usd > 0:
-    _pdf_spec_rows.append(("Узлы M6 (к-ты)", f"{num_m6_rivet_bolt_each}"))
+if quote.num_magnets:
+    _pdf_spec_rows.append(("Магниты", f"{quote.num_magnets} шт."))
+if quote.num_power_jumpers:
+    _pdf_spec_rows.append(("Перемычки БП", f"{quote.num_power_jumpers} шт."))
+if quote.profile_purchased_m > 0:
+    _pdf_spec_rows.append(("Профиль 40×20×1,5", f"{quote.profile_purchased_m:.1f} м"))
+if quote.buy_m6_frame_usd > 0:
+    _pdf_spec_rows.append(("Узлы M6 (к-ты)", f"{quote.num_m6_rivet_bolt_each}"))
 
 _pdf_ctx = {
     "project_name": project_name,
@@ -2649,135 +2093,236 @@ _pdf_ctx = {
     "module_name": selected_module_name,
     "mount_type": mount_type,
     "pixel_pitch": pixel_pitch,
-    "screen_mm": f"{int(real_width)} × {int(real_height)}",
-    "resolution": f"{int(real_width / pixel_pitch)} × {int(real_height / pixel_pitch)} px",
-    "area_m2": area_m2,
-    "total_modules": total_modules_order,
+    "screen_mm": f"{int(quote.real_width)} × {int(quote.real_height)}",
+    "resolution": f"{int(quote.real_width / pixel_pitch)} × {int(quote.real_height / pixel_pitch)} px",
+    "area_m2": quote.area_m2,
+    "total_modules": quote.total_modules_order,
     "processor": selected_proc["name"],
     "receiving_card": receiving_card["name"],
-    "num_cards": num_cards_reserve,
+    "num_cards": quote.num_cards_reserve,
     "psu_name": sel_psu["name"],
-    "num_psu": num_psu_reserve,
-    "peak_kw": peak_power_screen_kw,
-    "avg_kw": avg_power_screen_kw,
-    "total_buy_usd": total_buy_usd,
-    "total_buy_rub": total_buy_rub,
-    "sale_rub": sale_total_rub,
-    "sale_usd": sale_total_usd,
+    "num_psu": quote.num_psu_reserve,
+    "peak_kw": quote.peak_power_screen_kw,
+    "avg_kw": quote.avg_power_screen_kw,
+    "total_buy_usd": quote.total_buy_usd,
+    "total_buy_rub": quote.total_buy_rub,
+    "sale_rub": quote.sale_total_rub,
+    "sale_usd": quote.sale_total_usd,
     "vat_mode": vat_mode,
-    "vat_pct": int(vat_rate * 100),
-    "vat_amount_rub": vat_amount_rub,
-    "vat_amount_usd": vat_amount_usd,
-    "logistics_rub": logistics_rub,
-    "installation_rub": installation_rub,
+    "vat_pct": int(quote.vat_rate * 100),
+    "vat_amount_rub": quote.vat_amount_rub,
+    "vat_amount_usd": quote.vat_amount_usd,
+    "logistics_rub": quote.logistics_rub,
+    "installation_rub": quote.installation_rub,
     "margin_pct": int((margin - 1) * 100),
     "exchange_rate": exchange_rate,
     "spec_rows": _pdf_spec_rows,
 }
 
-col_exp1, col_exp2, col_exp3 = st.columns(3)
-with col_exp1:
-    st.markdown("**JSON для Figma Variables Studio**")
-    st.code(figma_json, language="json")
-    st.download_button(
-        label="⬇️ Скачать JSON для Figma",
-        data=json.dumps([figma_data], indent=2, ensure_ascii=False),
-        file_name=f"{_session_safe_slug(project_name)}_figma.json",
-        mime="application/json",
-        use_container_width=True,
-        key="download_figma_json",
-        help="Скачайте файл и импортируйте его в JSON to Figma через 'From local file'.",
-    )
-    if st.button("🌐 Получить API URL для Figma", use_container_width=True):
-        _api_url, _api_err = publish_json_for_figma_api(figma_data)
-        if _api_err:
-            st.error(f"Не удалось опубликовать API URL: {_api_err}")
-        else:
-            st.session_state["figma_api_url"] = _api_url
-            st.success("API URL готов")
-    _figma_api_url = st.session_state.get("figma_api_url")
-    if _figma_api_url:
-        st.caption("API URL для JSON to Figma:")
-        st.code(_figma_api_url, language="text")
-        st.markdown(f"[Проверить API URL]({_figma_api_url})")
-
-with col_exp2:
-    st.markdown("**Сохранение в базу Google Sheets**")
-    if st.button("💾 Отправить расчёт в облако", use_container_width=True):
-        if "google_sheets" in st.secrets:
-            st.success("✅ Сохранено в Google Sheets!")
-        else:
-            st.warning("Секреты `st.secrets['google_sheets']` не настроены.")
-            st.success("✅ [Mock] Данные сформированы для отправки в базу!")
-
-with col_exp3:
-    st.markdown("**PDF-отчёты**")
-    st.caption("Лаконичный отчёт + брендовый КП (MVP).")
-    if build_led_report_pdf is None:
-        st.info("Установите пакет **fpdf2**: `pip install fpdf2`")
-    else:
+# Контекст КП считается в основном прогоне; сами PDF — в фрагменте экспорта с кешем по контексту
+_kp_cost_rows = [
+    ("Экран (комплектующие)", "1 шт", float(quote.sale_components_rub), float(quote.sale_components_rub)),
+    ("Каркас и крепеж", "1 шт", float(quote.sale_frame_rub), float(quote.sale_frame_rub)),
+    ("Монтаж", "1 шт", float(quote.installation_rub), float(quote.installation_rub)),
+    ("Доставка", "1 шт", float(quote.logistics_rub), float(quote.logistics_rub)),
+]
+_kp_pdf_ctx = {
+    "offer_no": datetime.datetime.now().strftime("%m%d"),
+    "project_name": project_name,
+    "client_name": client_name or "",
+    "date_str": datetime.datetime.now().strftime("%d.%m.%Y"),
+    "screen_mm": f"{int(quote.real_width)} × {int(quote.real_height)} мм",
+    "module_name": selected_module_name,
+    "mount_type": mount_type,
+    "resolution": f"{int(quote.real_width / pixel_pitch)} × {int(quote.real_height / pixel_pitch)} px",
+    "area_m2": f"{quote.area_m2:.2f}",
+    "processor": selected_proc["name"],
+    "buy_components_rub": quote.buy_components_rub,
+    "buy_frame_rub": quote.buy_frame_rub,
+    "sale_components_rub": quote.sale_components_rub,
+    "sale_frame_rub": quote.sale_frame_rub,
+    "installation_rub": quote.installation_rub,
+    "logistics_rub": quote.logistics_rub,
+    "cost_rows": _kp_cost_rows,
+    "subtotal_rub": quote.commercial_subtotal_rub,
+    "vat_pct": int(quote.vat_rate * 100),
+    "vat_amount_rub": quote.vat_amount_rub,
+    "total_rub": quote.sale_total_rub,
+    "profit_hardware_rub": quote.profit_hardware_rub,
+    "note_terms": "100% предоплата по счёту.",
+    "note_lead_time": "21 рабочий день после поступления аванса.",
+    "note_warranty": "Гарантия 3 года.",
+}
+
+
+# PDF пересобираются только при изменении контекста, а не на каждом прогоне скрипта
+@_timed_cache_data("_report_pdf_bytes", max_entries=16, show_spinner=False)
+def _report_pdf_bytes(pdf_ctx: dict) -> bytes:
+    return build_led_report_pdf(pdf_ctx)
+
+
+@_timed_cache_data("_kp_pdf_bytes", max_entries=16, show_spinner=False)
+def _kp_pdf_bytes(kp_pdf_ctx: dict) -> bytes:
+    return build_led_kp_mvp_pdf(kp_pdf_ctx)
+
+
+# Streamlit с отложенной загрузкой: download_button принимает callable, и PDF (с импортом
+# fpdf2) собирается только по клику, а не на каждом прогоне
+_DEFERRED_DOWNLOADS = "callable" in (st.download_button.__doc__ or "")
+
+
+def _download_data(build, key: str):
+    """
+    Данные кнопки загрузки: callable (сборка по клику) или готовые байты.
+    Ошибка отложенной сборки видна только в логе сервера, поэтому после неё кнопка
+    собирает файл сразу — исключение доходит до st.error вызывающего кода.
+    """
+    failed: set = st.session_state.setdefault("_download_build_failed", set())
+    if not _DEFERRED_DOWNLOADS or key in failed:
+        data = build()
+        failed.discard(key)
+        return data
+
+    def _deferred():
         try:
-            _pdf_bytes = build_led_report_pdf(_pdf_ctx)
-            _pdf_name = (
-                suggested_pdf_filename(project_name)
-                if suggested_pdf_filename
-                else "led_report.pdf"
-            )
-            st.download_button(
-                label="📄 Скачать PDF",
-                data=_pdf_bytes,
-                file_name=_pdf_name,
-                mime="application/pdf",
-                use_container_width=True,
-                key="download_led_pdf_report",
-            )
-            if build_led_kp_mvp_pdf is not None:
-                _kp_cost_rows = [
-                    ("Экран (комплектующие)", "1 шт", float(sale_components_rub), float(sale_components_rub)),
-                    ("Каркас и крепеж", "1 шт", float(sale_frame_rub), float(sale_frame_rub)),
-                    ("Монтаж", "1 шт", float(installation_rub), float(installation_rub)),
-                    ("Доставка", "1 шт", float(logistics_rub), float(logistics_rub)),
-                ]
-                _kp_pdf_ctx = {
-                    "offer_no": datetime.datetime.now().strftime("%m%d"),
-                    "project_name": project_name,
-                    "client_name": client_name or "",
-                    "date_str": datetime.datetime.now().strftime("%d.%m.%Y"),
-                    "screen_mm": f"{int(real_width)} × {int(real_height)} мм",
-                    "module_name": selected_module_name,
-                    "mount_type": mount_type,
-                    "resolution": f"{int(real_width / pixel_pitch)} × {int(real_height / pixel_pitch)} px",
-                    "area_m2": f"{area_m2:.2f}",
-                    "processor": selected_proc["name"],
-                    "buy_components_rub": buy_components_rub,
-                    "buy_frame_rub": buy_frame_rub,
-                    "sale_components_rub": sale_components_rub,
-                    "sale_frame_rub": sale_frame_rub,
-                    "installation_rub": installation_rub,
-                    "logistics_rub": logistics_rub,
-                    "cost_rows": _kp_cost_rows,
-                    "subtotal_rub": commercial_subtotal_rub,
-                    "vat_pct": int(vat_rate * 100),
-                    "vat_amount_rub": vat_amount_rub,
-                    "total_rub": sale_total_rub,
-                    "profit_hardware_rub": profit_hardware_rub,
-                    "note_terms": "100% предоплата по счёту.",
-                    "note_lead_time": "21 рабочий день после поступления аванса.",
-                    "note_warranty": "Гарантия 3 года.",
-                }
-                _kp_pdf_bytes = build_led_kp_mvp_pdf(_kp_pdf_ctx)
-                _kp_pdf_name = (
-                    suggested_kp_pdf_filename(project_name)
-                    if suggested_kp_pdf_filename
-                    else "kp_mvp.pdf"
+            return build()
+        except Exception:
+            failed.add(key)  # set из session_state: следующий прогон соберёт файл сразу
+            raise
+
+    return _deferred
+
+
+@_ui_fragment
+def _export_fragment(figma_data: dict, figma_json: str, pdf_ctx: dict, kp_pdf_ctx: dict, project_name: str):
+    col_exp1, col_exp2, col_exp3 = st.columns(3)
+    with col_exp1:
+        st.markdown("**JSON для Figma Variables Studio**")
+        st.code(figma_json, language="json")
+        st.download_button(
+            label="⬇️ Скачать JSON для Figma",
+            data=json.dumps([figma_data], indent=2, ensure_ascii=False),
+            file_name=f"{_session_safe_slug(project_name)}_figma.json",
+            mime="application/json",
+            use_container_width=True,
+            key="download_figma_json",
+            help="Скачайте файл и импортируйте его в JSON to Figma через 'From local file'.",
+        )
+        if st.button("🌐 Получить API URL для Figma", use_container_width=True):
+            _api_url, _api_err = publish_json_for_figma_api(figma_data)
+            if _api_err:
+                st.error(f"Не удалось опубликовать API URL: {_api_err}")
+            else:
+                st.session_state["figma_api_url"] = _api_url
+                st.success("API URL готов")
+        _figma_api_url = st.session_state.get("figma_api_url")
+        if _figma_api_url:
+            st.caption("API URL для JSON to Figma:")
+            st.code(_figma_api_url, language="text")
+            st.markdown(f"[Проверить API URL]({_figma_api_url})")
+
+    with col_exp2:
+        st.markdown("**Сохранение в базу Google Sheets**")
+        if st.button("💾 Отправить расчёт в облако", use_container_width=True):
+            if "google_sheets" in st.secrets:
+                st.success("✅ Сохранено в Google Sheets!")
+            else:
+                st.warning("Секреты `st.secrets['google_sheets']` не настроены.")
+                st.success("✅ [Mock] Данные сформированы для отправки в базу!")
+
+    with col_exp3:
+        st.markdown("**PDF-отчёты**")
+        st.caption("Лаконичный отчёт + брендовый КП (MVP).")
+        if build_led_report_pdf is None:
+            st.info("Установите пакет **fpdf2**: `pip install fpdf2`")
+        else:
+            try:
+                _pdf_name = (
+                    suggested_pdf_filename(project_name)
+                    if suggested_pdf_filename
+                    else "led_report.pdf"
                 )
                 st.download_button(
-                    label="🧾 Скачать КП (MVP)",
-                    data=_kp_pdf_bytes,
-                    file_name=_kp_pdf_name,
+                    label="📄 Скачать PDF",
+                    data=_download_data(lambda: _report_pdf_bytes(pdf_ctx), "download_led_pdf_report"),
+                    file_name=_pdf_name,
                     mime="application/pdf",
                     use_container_width=True,
-                    key="download_led_kp_mvp_pdf",
+                    key="download_led_pdf_report",
+                )
+                if build_led_kp_mvp_pdf is not None:
+                    _kp_pdf_name = (
+                        suggested_kp_pdf_filename(project_name)
+                        if suggested_kp_pdf_filename
+                        else "kp_mvp.pdf"
+                    )
+                    st.download_button(
+                        label="🧾 Скачать КП (MVP)",
+                        data=_download_data(lambda: _kp_pdf_bytes(kp_pdf_ctx), "download_led_kp_mvp_pdf"),
+                        file_name=_kp_pdf_name,
+                        mime="application/pdf",
+                        use_container_width=True,
+                        key="download_led_kp_mvp_pdf",
+                    )
+            except Exception as _pdf_exc:
+                st.error(f"Не удалось сформировать PDF: {_pdf_exc}")
+
+
+perf.mark("Экспорт")
+_export_fragment(figma_data, figma_json, _pdf_ctx, _kp_pdf_ctx, project_name)
+
+
+def _perf_panel(spans: list) -> None:
+    """Водопад секций текущего прогона, p50/p95 по процессу и счётчики кэшей."""
+    total_ms = max((s.start_ms + s.duration_ms for s in spans), default=0.0) or 1.0
+    with st.expander(f"⏱ Время прогона: {total_ms:.0f} мс (debug)", expanded=False):
+        bars = []
+        for s in spans:
+            left = 100 * s.start_ms / total_ms
+            width = max(0.3, 100 * s.duration_ms / total_ms)
+            color = "#48bb78" if s.depth == 0 else ("#319795" if s.cache_hit is not False else "#ed8936")
+            label = ("↳ " if s.depth else "") + s.name
+            if s.cache_hit is not None:
+                label += " · кэш" if s.cache_hit else " · промах"
+            bars.append(
+                f'<div style="display:flex;align-items:center;gap:8px;font-size:0.78rem;">'
+                f'<div style="width:38%;white-space:nowrap;overflow:hidden;text-overflow:ellipsis;">{label}</div>'
+                f'<div style="flex:1;position:relative;height:12px;background:#2d3748;border-radius:2px;">'
+                f'<div style="position:absolute;left:{left:.2f}%;width:{width:.2f}%;height:100%;'
+                f'background:{color};border-radius:2px;"></div></div>'
+                f'<div style="width:70px;text-align:right;">{s.duration_ms:.1f} мс</div></div>'
+            )
+        st.markdown("".join(bars), unsafe_allow_html=True)
+
+        st.markdown("**Скользящие p50 / p95 по процессу**")
+        st.dataframe(
+            [
+                {"Секция": name, "p50, мс": round(p50, 1), "p95, мс": round(p95, 1), "Прогонов": n}
+                for name, (p50, p95, n) in sorted(
+                    perf.percentiles().items(), key=lambda kv: -kv[1][1]
                 )
-        except Exception as _pdf_exc:
-            st.error(f"Не удалось сформировать PDF: {_pdf_exc}")
+            ],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+        qc = quote_cache_stats()
+        graph = st.session_state.get("_quote_graph")
+        lines = [
+            f"Кэш расчётов: попаданий {qc.hits}, с диска {qc.disk_hits}, промахов {qc.misses}, "
+            f"вытеснено {qc.evictions}, записей {qc.size}"
+        ]
+        if graph is not None:
+            lines.append(
+                f"Граф узлов: попаданий {graph.hits}, пересчётов {graph.misses}; "
+                f"последний пересчёт: {', '.join(graph.recomputed) or '—'}"
+            )
+        for name, (hits, misses) in sorted(_perf_run.cache_counts.items()):
+            lines.append(f"{name}: попаданий {hits}, промахов {misses} (этот прогон)")
+        st.caption("  \n".join(lines))
+
+
+if _perf_run is not None:
+    _perf_panel(_perf_run.finish())
+
+profiling.end_thread_run()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Пакетный расчёт на NumPy: сетка размеров × модули каталога за один проход.
+Формулы повторяют quote_engine.compute_quote (для общих параметров из QuoteInputs).
+
+    python batch_quote.py --widths 1920:9600:320 --heights 960:5760:160 --env Indoor --pitch 2.5:4 > grid.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import sys
+from dataclasses import dataclass, fields
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from catalog import (
+    METAL_PLATE_RUB_EACH,
+    PROCESSOR_LOAD_PX_PER_PORT,
+    PROFILE_40X20_STICK_M,
+    get_catalog,
+    magnet_unit_usd,
+)
+from quote_engine import MODULE_H_MM, MODULE_W_MM, VAT_ON, QuoteInputs, resolve_components
+
+
+@dataclass(frozen=True)
+class BatchQuote:
+    """Результаты пакетного расчёта; все массивы формы (число размеров, число модулей)."""
+
+    widths_mm: np.ndarray
+    heights_mm: np.ndarray
+    module_names: tuple[str, ...]
+    real_width: np.ndarray
+    real_height: np.ndarray
+    pixels: np.ndarray
+    brightness: np.ndarray
+    total_modules: np.ndarray
+    total_modules_order: np.ndarray
+    num_cards_by_mod: np.ndarray
+    num_cards_by_pix: np.ndarray
+    num_cards_reserve: np.ndarray
+    num_psu_reserve: np.ndarray
+    required_ports: np.ndarray
+    ports_ok: np.ndarray
+    peak_power_kw: np.ndarray
+    profile_purchased_m: np.ndarray
+    total_buy_usd: np.ndarray
+    total_buy_rub: np.ndarray
+    sale_total_usd: np.ndarray
+    sale_total_rub: np.ndarray
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.total_modules.shape
+
+    def to_records(self) -> list[dict]:
+        """Плоский список строк (размер × модуль) — для таблиц и CSV."""
+        arrays = [f.name for f in fields(self) if f.name not in ("widths_mm", "heights_mm", "module_names")]
+        out = []
+        for i, j in np.ndindex(self.shape):
+            row = {
+                "width_mm": int(self.widths_mm[i]),
+                "height_mm": int(self.heights_mm[i]),
+                "module_name": self.module_names[j],
+            }
+            for name in arrays:
+                row[name] = getattr(self, name)[i, j].item()
+            out.append(row)
+        return out
+
+
+def size_grid(widths_mm: Iterable[int], heights_mm: Iterable[int]) -> tuple[np.ndarray, np.ndarray]:
+    """Декартово произведение ширин и высот → парные массивы размеров."""
+    w, h = np.meshgrid(np.asarray(list(widths_mm)), np.asarray(list(heights_mm)), indexing="ij")
+    return w.ravel(), h.ravel()
+
+
+def _ceil_int(a) -> np.ndarray:
+    return np.ceil(a).astype(np.int64)
+
+
+def quote_batch(
+    widths_mm: Sequence[int],
+    heights_mm: Sequence[int],
+    modules: Optional[Sequence[dict]] = None,
+    inputs: Optional[QuoteInputs] = None,
+) -> BatchQuote:
+    """
+    widths_mm/heights_mm — парные размеры (N шт.), modules — строки каталога модулей (M шт., по умолчанию все).
+    Остальные параметры (контроллер, карта, БП, ЗИП, цены, курс, наценка) берутся из inputs.
+    """
+    inputs = inputs or QuoteInputs()
+    cat = get_catalog()
+    modules = list(cat.modules if modules is None else modules)
+    rows = resolve_components(inputs)
+    card, psu, hub = rows["card"], rows["psu"], rows["hub"]
+    magnet, power_jumper = rows["magnet"], rows["power_jumper"]
+    monolith = "Монолитный" in inputs.mount_type
+    reserve_psu_cards = inputs.reserve_enabled and inputs.reserve_psu_cards
+    rate = inputs.exchange_rate
+
+    # Размеры — столбец (N, 1), модули — строка (1, M)
+    w = np.asarray(widths_mm, dtype=np.int64).reshape(-1, 1)
+    h = np.asarray(heights_mm, dtype=np.int64).reshape(-1, 1)
+    if w.shape != h.shape:
+        raise ValueError("widths_mm и heights_mm должны быть одной длины")
+    pitch = np.array([m["pitch"] for m in modules], dtype=np.float64).reshape(1, -1)
+    max_power = np.array([m["max_power"] for m in modules], dtype=np.float64).reshape(1, -1)
+    module_price = np.array([m["price_usd"] for m in modules], dtype=np.float64).reshape(1, -1)
+    brightness = np.array([m["brightness"] for m in modules], dtype=np.int64).reshape(1, -1)
+
+    modules_w = _ceil_int(w / MODULE_W_MM)
+    modules_h = _ceil_int(h / MODULE_H_MM)
+    real_width = modules_w * MODULE_W_MM
+    real_height = modules_h * MODULE_H_MM
+    total_px = (real_width / pitch) * (real_height / pitch)
+    pixels = np.trunc(real_width / pitch).astype(np.int64) * np.trunc(real_height / pitch).astype(np.int64)
+    total_modules = modules_w * modules_h
+
+    if inputs.reserve_modules_choice == "Свой":
+        reserve_modules = np.full_like(total_modules, int(inputs.reserve_modules_custom))
+    else:
+        pct = int(inputs.reserve_modules_choice.replace("%", ""))
+        reserve_modules = _ceil_int(total_modules * pct / 100)
+    total_modules_order = total_modules + reserve_modules
+    peak_power_kw = total_modules * max_power / 1000
+
+    # Порты процессора
+    available_ports, _ = cat.processor_ports(rows["proc"]["name"])
+    required_ports = _ceil_int(total_px / PROCESSOR_LOAD_PX_PER_PORT)
+    if inputs.hot_backup:
+        required_ports = required_ports * 2
+
+    # Карты: по кратности модулей и по пределу разрешения карты
+    num_cards_by_mod = _ceil_int(total_modules / inputs.modules_per_card)
+    card_res = cat.card_max_pixels(card["name"])
+    num_cards_by_pix = _ceil_int(total_px / (card_res[0] * card_res[1]))
+    num_cards_reserve = np.maximum(num_cards_by_mod, num_cards_by_pix) + (1 if reserve_psu_cards else 0)
+
+    spare = 1 if inputs.reserve_enabled else 0
+    patch_cords = num_cards_reserve + spare
+    num_card_power_cables_order = num_cards_reserve + _ceil_int(num_cards_reserve * 0.1)
+
+    num_psu_reserve = _ceil_int(total_modules / inputs.modules_per_psu) + (1 if reserve_psu_cards else 0)
+    vinths = num_psu_reserve * 4
+    num_screws_4x16_order = vinths + _ceil_int(vinths * 0.1)
+    if monolith and power_jumper is not None:
+        num_power_jumpers = np.maximum(0, num_psu_reserve - 1) + spare
+    else:
+        num_power_jumpers = np.zeros_like(num_psu_reserve)
+    num_hubs = num_cards_reserve if card["type"] == "A" else np.zeros_like(num_cards_reserve)
+    magnets_per_module = inputs.magnets_per_module if monolith else 0
+    if monolith and magnet is not None and magnets_per_module > 0:
+        num_magnets = total_modules * magnets_per_module
+    else:
+        num_magnets = np.zeros_like(total_modules)
+
+    # Профиль 40×20 и узлы M6 (только монолит)
+    vert_profiles = modules_w + 1
+    horiz_profiles = np.where(real_height <= 3000, 2, 3)
+    total_profile_length = (
+        vert_profiles * (real_height - 40) + horiz_profiles * (real_width - 60)
+    ) / 1000
+    fasteners_m6 = horiz_profiles * vert_profiles
+    num_m6 = fasteners_m6 + _ceil_int(fasteners_m6 * 0.03)
+
+    def to_usd(rub):
+        return rub / rate if rate else rub * 0.0
+
+    if monolith:
+        sticks = np.where(total_profile_length > 0, _ceil_int(total_profile_length / PROFILE_40X20_STICK_M), 0)
+        profile_purchased_m = sticks * PROFILE_40X20_STICK_M
+        buy_profile_usd = to_usd(profile_purchased_m * inputs.profile_40x20_rub_m)
+        buy_screws_usd = to_usd(num_screws_4x16_order * inputs.screw_4x16_rub_each)
+        buy_m6_usd = to_usd(num_m6 * inputs.rivet_m6_rub_each + num_m6 * inputs.bolt_m6_rub_each)
+        buy_plates_usd = to_usd(num_psu_reserve * METAL_PLATE_RUB_EACH)
+    else:
+        profile_purchased_m = np.zeros(total_modules.shape)
+        buy_profile_usd = buy_screws_usd = buy_m6_usd = buy_plates_usd = profile_purchased_m
+
+    buy_magnets = num_magnets * (magnet_unit_usd(magnet) if magnet else 0.0)
+    buy_frame_usd = buy_profile_usd + buy_screws_usd + buy_m6_usd + buy_plates_usd + buy_magnets
+    # Порядок сложения как в compute_quote — суммы совпадают бит в бит
+    total_buy_usd = (
+        total_modules_order * module_price
+        + num_cards_reserve * card["price_usd"]
+        + num_psu_reserve * psu["price_usd"]
+        + num_hubs * (hub["price_usd"] if hub else 0.0)
+        + rows["proc"]["price_usd"]
+        + buy_magnets
+        + patch_cords * rows["patch_cord"]["price_usd"]
+        + num_card_power_cables_order * rows["card_power_cable"]["price_usd"]
+        + (num_power_jumpers * power_jumper["price_usd"] if power_jumper else 0.0)
+        + buy_profile_usd
+        + buy_screws_usd
+        + buy_m6_usd
+        + buy_plates_usd
+    )
+
+    margin = 1 + (inputs.margin_percent / 100)
+    sale_components_usd = (total_buy_usd - buy_frame_usd) * margin
+    sale_frame_usd = buy_frame_usd * margin
+    sale_hardware_usd = sale_components_usd + sale_frame_usd
+    sale_hardware_rub = sale_components_usd * rate + sale_frame_usd * rate
+    extras_rub = float(inputs.logistics_rub) + float(inputs.installation_rub)
+    vat_rate = 0.22 if inputs.vat_mode == VAT_ON else 0.0
+    subtotal_usd = sale_hardware_usd + to_usd(extras_rub)
+    subtotal_rub = sale_hardware_rub + extras_rub
+
+    shape = (w.shape[0], len(modules))
+
+    def full(a) -> np.ndarray:
+        return np.broadcast_to(a, shape).copy()
+
+    return BatchQuote(
+        widths_mm=w.ravel(),
+        heights_mm=h.ravel(),
+        module_names=tuple(m["name"] for m in modules),
+        real_width=full(real_width),
+        real_height=full(real_height),
+        pixels=full(pixels),
+        brightness=full(brightness),
+        total_modules=full(total_modules),
+        total_modules_order=full(total_modules_order),
+        num_cards_by_mod=full(num_cards_by_mod),
+        num_cards_by_pix=full(num_cards_by_pix),
+        num_cards_reserve=full(num_cards_reserve),
+        num_psu_reserve=full(num_psu_reserve),
+        required_ports=full(required_ports),
+        ports_ok=full(required_ports <= available_ports),
+        peak_power_kw=full(peak_power_kw),
+        profile_purchased_m=full(profile_purchased_m),
+        total_buy_usd=full(total_buy_usd),
+        total_buy_rub=full(total_buy_usd * rate),
+        sale_total_usd=full(subtotal_usd + subtotal_usd * vat_rate),
+        sale_total_rub=full(subtotal_rub + subtotal_rub * vat_rate),
+    )
+
+
+def _parse_range(spec: str, cast=int) -> list:
+    """«a:b:step» или «a,b,c»."""
+    if ":" in spec:
+        parts = [cast(p) for p in spec.split(":")]
+        start, stop = parts[0], parts[1]
+        step = parts[2] if len(parts) > 2 else 1
+        return list(np.arange(start, stop + step / 2, step).astype(type(start)))
+    return [cast(p) for p in spec.split(",") if p]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Пакетный расчёт сетки размеров × модулей (CSV в stdout)")
+    ap.add_argument("--widths", default="1920:9600:320", help="мм: a:b:step или список через запятую")
+    ap.add_argument("--heights", default="960:5760:160", help="мм: a:b:step или список через запятую")
+    ap.add_argument("--env", choices=("Indoor", "Outdoor"), default=None)
+    ap.add_argument("--pitch", default=None, help="диапазон шага, напр. 2.5:4")
+    ap.add_argument("--exchange-rate", type=float, default=QuoteInputs.exchange_rate)
+    ap.add_argument("--margin", type=float, default=QuoteInputs.margin_percent)
+    args = ap.parse_args(argv)
+
+    cat = get_catalog()
+    modules = list(cat.modules if args.env is None else cat.modules_by_env.get(args.env, ()))
+    if args.pitch:
+        lo, hi = (float(p) for p in args.pitch.split(":"))
+        modules = [m for m in modules if lo <= m["pitch"] <= hi]
+    widths, heights = size_grid(_parse_range(args.widths), _parse_range(args.heights))
+    batch = quote_batch(
+        widths,
+        heights,
+        modules,
+        QuoteInputs(exchange_rate=args.exchange_rate, margin_percent=args.margin),
+    )
+    records = batch.to_records()
+    if records:
+        writer = csv.DictWriter(sys.stdout, fieldnames=list(records[0]))
+        writer.writeheader()
+        writer.writerows(records)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Бенчмарки калькулятора с сохранёнными базовыми замерами.
+
+(a) Полный прогон app.py через streamlit.testing AppTest для типовых конфигураций;
+(b) по отдельности: чистый расчёт compute_quote, build_led_report_pdf,
+    build_led_kp_mvp_pdf и сериализация JSON для Figma.
+
+    python benchmarks/bench_quote.py                 # замер и сравнение с baseline.json
+    python benchmarks/bench_quote.py --save          # записать замер как новый baseline
+    python benchmarks/bench_quote.py --only calc,pdf --repeat 50
+
+Код возврата 1, если минимум какого-либо замера (min_ms — он почти не зависит от фонового
+шума машины) вырос больше чем на --max-regression % или какой-либо замер упал с ошибкой;
+baseline с ошибками не записывается.
+Сеть по умолчанию отключена (--online — с живыми ценами), кэш цен и журнал заявок —
+во временном каталоге.
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+# До импорта модулей приложения: без фонового планировщика, общего кэша цен и настоящего
+# incoming_requests/ (прогоны app.py иначе создают там журнал и переносят старые заявки)
+_TMP = Path(tempfile.mkdtemp(prefix="medialive-bench-"))
+os.environ.setdefault("MEDIALIVE_PRICE_REFRESHER", "0")
+os.environ.setdefault("MEDIALIVE_PRICE_DB", str(_TMP / "prices.sqlite3"))
+os.environ.setdefault("MEDIALIVE_INCOMING_DIR", str(_TMP / "incoming_requests"))
+
+import http_client  # noqa: E402
+from catalog import get_catalog  # noqa: E402
+from quote_engine import (  # noqa: E402
+    CTRL_ASYNC,
+    MOUNT_CABINET,
+    QuoteInputs,
+    QuoteResult,
+    compute_quote,
+)
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+SUITES = ("app", "calc", "pdf", "figma")
+
+
+@dataclasses.dataclass(frozen=True)
+class BenchConfig:
+    session_state: dict  # ключи st.session_state для AppTest
+    inputs: Callable[[], QuoteInputs]  # те же параметры для чистого расчёта
+
+
+def _outdoor_module() -> str:
+    return get_catalog().modules_by_env["Outdoor"][0]["name"]
+
+
+def _async_processor() -> str:
+    return get_catalog().async_controllers[0]["name"]
+
+
+CONFIGS: dict[str, BenchConfig] = {
+    "small_indoor_monolith": BenchConfig(
+        {"calc_quick_size_label": "Свой размер (вручную)", "width_input": 1280, "height_mm": 640},
+        lambda: QuoteInputs(width_mm=1280, height_mm=640),
+    ),
+    "preset_7680x4320": BenchConfig(
+        {"calc_quick_size_label": "7680 × 4320 мм (24×27 шт) | Идеально 16:9"},
+        lambda: QuoteInputs(width_mm=7680, height_mm=4320),
+    ),
+    "outdoor_cabinet_wall": BenchConfig(
+        {
+            "calc_quick_size_label": "Свой размер (вручную)",
+            "calc_env_key": "Outdoor",
+            "calc_mount_type": "В кабинетах",
+            "width_input": 12800,
+            "height_mm": 7200,
+        },
+        lambda: QuoteInputs(
+            width_mm=12800, height_mm=7200, module_name=_outdoor_module(), mount_type=MOUNT_CABINET
+        ),
+    ),
+    "hot_backup_async": BenchConfig(
+        {"sys_type_radio": "Асинхронная", "hot_backup_gige": True},
+        lambda: QuoteInputs(
+            controller_category=CTRL_ASYNC, processor_name=_async_processor(), hot_backup=True
+        ),
+    ),
+}
+
+
+def _offline(*args, **kwargs):
+    raise OSError("benchmark: сеть отключена")
+
+
+def _timings(fn: Callable[[], object], repeat: int) -> dict:
+    fn()  # прогрев: ленивые импорты, шрифты PDF и кэши не попадают в замер
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return {"median_ms": statistics.median(samples), "min_ms": min(samples), "n": repeat}
+
+
+def _guarded(fn: Callable[[], dict]) -> dict:
+    try:
+        return fn()
+    except Exception as e:  # остальные замеры доводятся до конца; код возврата — 1
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+# --- (a) Полный прогон app.py ---
+def bench_app(name: str, cfg: BenchConfig, repeat: int) -> dict[str, dict]:
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=120)
+    for key, value in cfg.session_state.items():
+        at.session_state[key] = value
+    t0 = time.perf_counter()
+    at.run()
+    first_ms = (time.perf_counter() - t0) * 1000
+    if at.exception:
+        error = {"error": "; ".join(e.message for e in at.exception)}
+        return {f"app/{name}/first_run": error, f"app/{name}/rerun": error}
+    return {
+        f"app/{name}/first_run": {"median_ms": first_ms, "min_ms": first_ms, "n": 1},
+        f"app/{name}/rerun": _timings(at.run, repeat),
+    }
+
+
+# --- (b) Отдельные этапы ---
+def bench_calc(name: str, cfg: BenchConfig, repeat: int) -> dict[str, dict]:
+    inputs = cfg.inputs()
+    return {f"calc/{name}/compute_quote": _timings(lambda: compute_quote(inputs), repeat)}
+
+
+def _pdf_contexts(inputs: QuoteInputs, q: QuoteResult) -> tuple[dict, dict]:
+    """Контексты PDF в том же составе, что собирает app.py."""
+    catalog = get_catalog()
+    module = catalog.module(inputs.module_name)
+    pitch = module["pitch"]
+    now = datetime.datetime(2025, 1, 1, 12, 0)
+    resolution = f"{int(q.real_width / pitch)} × {int(q.real_height / pitch)} px"
+    report = {
+        "project_name": "Benchmark",
+        "client_name": "ООО Бенчмарк",
+        "date_str": now.strftime("%d.%m.%Y %H:%M"),
+        "module_name": inputs.module_name,
+        "mount_type": inputs.mount_type,
+        "pixel_pitch": pitch,
+        "screen_mm": f"{int(q.real_width)} × {int(q.real_height)}",
+        "resolution": resolution,
+        "area_m2": q.area_m2,
+        "total_modules": q.total_modules_order,
+        "processor": inputs.processor_name,
+        "receiving_card": inputs.card_name,
+        "num_cards": q.num_cards_reserve,
+        "psu_name": inputs.psu_name or catalog.psus[0]["name"],
+        "num_psu": q.num_psu_reserve,
+        "peak_kw": q.peak_power_screen_kw,
+        "avg_kw": q.avg_power_screen_kw,
+        "total_buy_usd": q.total_buy_usd,
+        "total_buy_rub": q.total_buy_rub,
+        "sale_rub": q.sale_total_rub,
+        "sale_usd": q.sale_total_usd,
+        "vat_mode": inputs.vat_mode,
+        "vat_pct": int(q.vat_rate * 100),
+        "vat_amount_rub": q.vat_amount_rub,
+        "vat_amount_usd": q.vat_amount_usd,
+        "logistics_rub": q.logistics_rub,
+        "installation_rub": q.installation_rub,
+        "margin_pct": int(inputs.margin_percent),
+        "exchange_rate": inputs.exchange_rate,
+        "spec_rows": [
+            ("Модули", f"{q.total_modules_order} шт."),
+            ("Приёмные карты", f"{q.num_cards_reserve} шт."),
+            ("Блоки питания", f"{q.num_psu_reserve} шт."),
+        ],
+    }
+    kp = {
+        "offer_no": now.strftime("%m%d"),
+        "project_name": "Benchmark",
+        "client_name": "ООО Бенчмарк",
+        "date_str": now.strftime("%d.%m.%Y"),
+        "screen_mm": f"{int(q.real_width)} × {int(q.real_height)} мм",
+        "module_name": inputs.module_name,
+        "mount_type": inputs.mount_type,
+        "resolution": resolution,
+        "area_m2": f"{q.area_m2:.2f}",
+        "processor": inputs.processor_name,
+        "buy_components_rub": q.buy_components_rub,
+        "buy_frame_rub": q.buy_frame_rub,
+        "sale_components_rub": q.sale_components_rub,
+        "sale_frame_rub": q.sale_frame_rub,
+        "installation_rub": q.installation_rub,
+        "logistics_rub": q.logistics_rub,
+        "cost_rows": [
+            ("Экран (комплектующие)", "1 шт", float(q.sale_components_rub), float(q.sale_components_rub)),
+            ("Каркас и крепеж", "1 шт", float(q.sale_frame_rub), float(q.sale_frame_rub)),
+        ],
+        "subtotal_rub": q.commercial_subtotal_rub,
+        "vat_pct": int(q.vat_rate * 100),
+        "vat_amount_rub": q.vat_amount_rub,
+        "total_rub": q.sale_total_rub,
+        "profit_hardware_rub": q.profit_hardware_rub,
+        "note_terms": "100% предоплата по счёту.",
+        "note_lead_time": "21 рабочий день после поступления аванса.",
+        "note_warranty": "Гарантия 3 года.",
+    }
+    return report, kp
+
+
+def bench_pdf(name: str, cfg: BenchConfig, repeat: int) -> dict[str, dict]:
+    from pdf_report import build_led_kp_mvp_pdf, build_led_report_pdf
+
+    inputs = cfg.inputs()
+    report_ctx, kp_ctx = _pdf_contexts(inputs, compute_quote(inputs))
+    return {
+        f"pdf/{name}/build_led_report_pdf": _guarded(
+            lambda: _timings(lambda: build_led_report_pdf(report_ctx), repeat)
+        ),
+        f"pdf/{name}/build_led_kp_mvp_pdf": _guarded(
+            lambda: _timings(lambda: build_led_kp_mvp_pdf(kp_ctx), repeat)
+        ),
+    }
+
+
+def bench_figma(name: str, cfg: BenchConfig, repeat: int) -> dict[str, dict]:
+    inputs = cfg.inputs()
+    data = {
+        "project_name": "Benchmark",
+        "inputs": dataclasses.asdict(inputs),
+        "quote": dataclasses.asdict(compute_quote(inputs)),
+    }
+    return {
+        f"figma/{name}/json_dumps": _timings(
+            lambda: json.dumps(data, indent=4, ensure_ascii=False), repeat
+        )
+    }
+
+
+# --- Запуск, baseline и сравнение ---
+def run(suites: tuple[str, ...], repeat: int, app_repeat: int) -> dict:
+    results: dict[str, dict] = {}
+    for name, cfg in CONFIGS.items():
+        if "calc" in suites:
+            results.update(bench_calc(name, cfg, repeat))
+        if "figma" in suites:
+            results.update(bench_figma(name, cfg, repeat))
+        if "pdf" in suites:
+            results.update(bench_pdf(name, cfg, max(5, repeat // 3)))
+        if "app" in suites:
+            results.update(bench_app(name, cfg, app_repeat))
+    try:
+        import streamlit
+
+        streamlit_version = streamlit.__version__
+    except ImportError:
+        streamlit_version = None
+    return {
+        "meta": {
+            "recorded_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "streamlit": streamlit_version,
+            "catalog": get_catalog().fingerprint[:12],
+        },
+        "results": dict(sorted(results.items())),
+    }
+
+
+def errors_of(result: dict) -> list[str]:
+    return [key for key, value in result["results"].items() if "error" in value]
+
+
+def compare(current: dict, baseline: dict, max_regression_pct: float) -> int:
+    """Печатает таблицу дельт минимумов (и медиан); возвращает число регрессий сверх порога."""
+    regressions = 0
+    base_results = baseline.get("results", {})
+    print(f"{'замер':<58} {'база min':>10} {'сейчас min':>11} {'Δ, %':>8} {'медиана':>10}")
+    for key, cur in current["results"].items():
+        base = base_results.get(key)
+        if "error" in cur:
+            print(f"{key:<58} {'':>10} {'ошибка':>11}   {cur['error'][:60]}")
+            continue
+        if base is None or "error" in base:
+            print(f"{key:<58} {'—':>10} {cur['min_ms']:>11.2f} {'нов.':>8} {cur['median_ms']:>10.2f}")
+            continue
+        delta = 100 * (cur["min_ms"] - base["min_ms"]) / base["min_ms"]
+        flag = ""
+        if delta > max_regression_pct:
+            regressions += 1
+            flag = "  ← регрессия"
+        print(
+            f"{key:<58} {base['min_ms']:>10.2f} {cur['min_ms']:>11.2f} {delta:>+8.1f}"
+            f" {cur['median_ms']:>10.2f}{flag}"
+        )
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="записать результат как baseline")
+    parser.add_argument("--only", default=",".join(SUITES), help=f"наборы через запятую: {', '.join(SUITES)}")
+    parser.add_argument("--repeat", type=int, default=30, help="повторов для calc/figma (pdf — /3, не меньше 5)")
+    parser.add_argument("--app-repeat", type=int, default=5, help="повторных прогонов app.py")
+    parser.add_argument("--max-regression", type=float, default=25.0, help="порог регрессии, %%")
+    parser.add_argument("--online", action="store_true", help="не отключать сеть (живые цены)")
+    parser.add_argument("--output", type=Path, help="дополнительно сохранить результат в файл")
+    args = parser.parse_args(argv)
+
+    suites = tuple(s for s in args.only.split(",") if s)
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"неизвестные наборы: {', '.join(sorted(unknown))}")
+    if not args.online:
+        http_client.default_client.fetch = _offline
+
+    current = run(suites, args.repeat, args.app_repeat)
+    errors = errors_of(current)
+    if args.output:
+        args.output.write_text(json.dumps(current, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.save and not errors:
+        args.baseline.write_text(json.dumps(current, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"baseline записан: {args.baseline}")
+    regressions = 0
+    if args.baseline.exists() and not args.save:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(current, baseline, args.max_regression)
+    else:
+        compare(current, {}, args.max_regression)
+    if errors:
+        print(f"замеры с ошибкой ({len(errors)}): {', '.join(errors)}", file=sys.stderr)
+        if args.save:
+            print("baseline не записан", file=sys.stderr)
+    return 1 if regressions or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
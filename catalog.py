@@ -0,0 +1,361 @@
+"""
+Справочники калькулятора: прайс модулей, контроллеров, карт, БП, коммутации и крепежа.
+Сами таблицы лежат в catalog_data/*.json (.csv) и перечитываются при изменении файлов.
+Модуль без зависимостей от Streamlit — используется UI, расчётным ядром и webhook.
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Optional, Sequence
+
+
+# Профиль 40×20×1,5: в продаже только хлыст 6 м; в смете — ₽/п.м × (число хлыстов × 6).
+PROFILE_40X20_STICK_M = 6.0
+PROFILE_40X20_RUB_M_FALLBACK = 189.0
+
+# Саморез 4,2×16 с прессшайбой (к профилю); в магазине обычно упаковка — ориентир ₽/шт.
+SCREW_4X16_PRESS_RUB_EACH_FALLBACK = 1.5
+
+# Заклёпка резьбовая Sormat M6 + винт M6×16 DIN 912 оцинк. (каркас монолита, 1+1 на узел).
+RIVET_M6_SORMAT_RUB_EACH_FALLBACK = 12.0
+BOLT_M6_6x16_DIN912_RUB_EACH_FALLBACK = 8.5
+
+# Металлические пластины под БП (1 шт. на БП с ЗИП); фикс. 150 ₽/шт, только в смете «Каркас».
+METAL_PLATE_RUB_EACH = 150.0
+
+
+def magnet_unit_usd(m):
+    return m["pack_price_usd"] / m["pack_qty"]
+
+
+# Правило расчёта нагрузки GigE → приёмные карты (как в расчёте required_ports).
+PROCESSOR_LOAD_PX_PER_PORT = 650_000
+
+
+# --- ИНДЕКСИРОВАННЫЙ КАТАЛОГ (неизменяемый снимок: таблицы — кортежи, индексы — read-only) ---
+CTRL_CATEGORY_SYNC = "Синхронная"
+CTRL_CATEGORY_ASYNC = "Асинхронная"
+CARD_MAX_PIXELS_DEFAULT = (512, 384)
+
+
+@dataclass(frozen=True)
+class ControllerSpec:
+    """Строка прайса контроллера, объединённая с PROCESSOR_PORTS и PROCESSOR_RESOLUTION_NOTE."""
+
+    name: str
+    category: str
+    price_usd: float
+    ports: int
+    ports_known: bool
+    resolution_note: Optional[str]
+    row: dict
+
+
+class Catalog:
+    """
+    Все справочники с индексами: name → строка и позиция в таблице, (env, tech) → модули,
+    env → технологии (SMD первой), модули по шагу пикселя, объединённая таблица контроллеров.
+    Поиск по имени — O(1); порядок строк в таблицах совпадает с прайсом (как в selectbox).
+    """
+
+    TABLES = (
+        "modules",
+        "sync_controllers",
+        "async_controllers",
+        "cards",
+        "psus",
+        "hubs",
+        "patch_cords",
+        "card_power_cables",
+        "power_jumpers",
+        "magnets",
+    )
+
+    def __init__(
+        self,
+        modules: Sequence[dict],
+        sync_controllers: Sequence[dict],
+        async_controllers: Sequence[dict],
+        cards: Sequence[dict],
+        psus: Sequence[dict],
+        hubs: Sequence[dict],
+        patch_cords: Sequence[dict],
+        card_power_cables: Sequence[dict],
+        power_jumpers: Sequence[dict],
+        magnets: Sequence[dict],
+        processor_ports: Mapping[str, int],
+        resolution_notes: Mapping[str, str],
+        card_max_pixels: Mapping[str, tuple[int, int]],
+    ):
+        self.modules = tuple(modules)
+        self.sync_controllers = tuple(sync_controllers)
+        self.async_controllers = tuple(async_controllers)
+        self.cards = tuple(cards)
+        self.psus = tuple(psus)
+        self.hubs = tuple(hubs)
+        self.patch_cords = tuple(patch_cords)
+        self.card_power_cables = tuple(card_power_cables)
+        self.power_jumpers = tuple(power_jumpers)
+        self.magnets = tuple(magnets)
+        self.processor_ports_map = MappingProxyType(dict(processor_ports))
+        self.resolution_notes = MappingProxyType(dict(resolution_notes))
+        self.card_max_pixels_map = MappingProxyType(
+            {k: tuple(v) for k, v in card_max_pixels.items()}
+        )
+
+        by_name: dict[str, Mapping[str, dict]] = {}
+        index_of: dict[str, Mapping[str, int]] = {}
+        for table in self.TABLES:
+            rows = getattr(self, table)
+            names: dict[str, dict] = {}
+            positions: dict[str, int] = {}
+            for i, r in enumerate(rows):
+                # Первое вхождение имени выигрывает — как при линейном поиске
+                names.setdefault(r["name"], r)
+                positions.setdefault(r["name"], i)
+            by_name[table] = MappingProxyType(names)
+            index_of[table] = MappingProxyType(positions)
+        self._by_name = MappingProxyType(by_name)
+        self._index_of = MappingProxyType(index_of)
+
+        env_tech: dict[tuple[str, str], list[dict]] = {}
+        env_pitch: dict[str, list[dict]] = {}
+        for m in self.modules:
+            env_tech.setdefault((m["env"], m["tech"]), []).append(m)
+            env_pitch.setdefault(m["env"], []).append(m)
+        self.modules_by_env_tech = MappingProxyType({k: tuple(v) for k, v in env_tech.items()})
+        self.modules_by_env = MappingProxyType(
+            {env: tuple(m for m in self.modules if m["env"] == env) for env in env_pitch}
+        )
+        self.modules_by_env_pitch = MappingProxyType(
+            {env: tuple(sorted(v, key=lambda m: m["pitch"])) for env, v in env_pitch.items()}
+        )
+        self.modules_by_pitch = tuple(sorted(self.modules, key=lambda m: m["pitch"]))
+        self.techs_by_env = MappingProxyType(
+            {
+                env: tuple(
+                    sorted(
+                        {t for (e, t) in env_tech if e == env},
+                        key=lambda t: (0 if t == "SMD" else 1, t),
+                    )
+                )
+                for env in env_pitch
+            }
+        )
+
+        controllers: dict[str, ControllerSpec] = {}
+        for category, rows in (
+            (CTRL_CATEGORY_SYNC, self.sync_controllers),
+            (CTRL_CATEGORY_ASYNC, self.async_controllers),
+        ):
+            for r in rows:
+                ports, known = self.processor_ports(r["name"])
+                controllers.setdefault(
+                    r["name"],
+                    ControllerSpec(
+                        name=r["name"],
+                        category=category,
+                        price_usd=r["price_usd"],
+                        ports=ports,
+                        ports_known=known,
+                        resolution_note=self.resolution_notes.get(r["name"]),
+                        row=r,
+                    ),
+                )
+        self.controllers = MappingProxyType(controllers)
+
+    @classmethod
+    def from_tables(cls, tables: Mapping[str, Sequence[dict]]) -> "Catalog":
+        """Каталог из строк файлов catalog_data (ключи — CATALOG_FILES)."""
+        processors = tables["processors"]
+        return cls(
+            modules=tables["modules"],
+            sync_controllers=tables["sync_controllers"],
+            async_controllers=tables["async_controllers"],
+            cards=tables["cards"],
+            psus=tables["psus"],
+            hubs=tables["hubs"],
+            patch_cords=tables["patch_cords"],
+            card_power_cables=tables["card_power_cables"],
+            power_jumpers=tables["power_jumpers"],
+            magnets=tables["magnets"],
+            processor_ports={r["name"]: int(r["ports"]) for r in processors},
+            resolution_notes={
+                r["name"]: r["resolution_note"] for r in processors if r.get("resolution_note")
+            },
+            card_max_pixels={
+                r["name"]: (int(r["width"]), int(r["height"])) for r in tables["card_max_pixels"]
+            },
+        )
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """Хэш содержимого всех таблиц: одинаков у одинаковых каталогов в любых процессах."""
+        payload = {table: getattr(self, table) for table in self.TABLES}
+        payload["processor_ports"] = dict(self.processor_ports_map)
+        payload["resolution_notes"] = dict(self.resolution_notes)
+        payload["card_max_pixels"] = {k: list(v) for k, v in self.card_max_pixels_map.items()}
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def row(self, table: str, name: Optional[str]) -> Optional[dict]:
+        if not name:
+            return None
+        return self._by_name[table].get(name)
+
+    def pick(self, table: str, name: Optional[str], fallback_index: int = 0) -> Optional[dict]:
+        """Как pick_row_by_name: строка по имени или строка fallback_index (с ограничением)."""
+        rows = getattr(self, table)
+        if not rows:
+            return None
+        found = self.row(table, name)
+        if found is not None:
+            return found
+        return rows[max(0, min(fallback_index, len(rows) - 1))]
+
+    def index_of(self, table: str, name: str, default: int = 0) -> int:
+        return self._index_of[table].get(name, default)
+
+    def module(self, name: str) -> Optional[dict]:
+        return self._by_name["modules"].get(name)
+
+    def controllers_for(self, category: str) -> tuple[dict, ...]:
+        return self.sync_controllers if category == CTRL_CATEGORY_SYNC else self.async_controllers
+
+    def controller_table(self, category: str) -> str:
+        return "sync_controllers" if category == CTRL_CATEGORY_SYNC else "async_controllers"
+
+    def processor_ports(self, name: str) -> tuple[int, bool]:
+        """Возвращает (число портов, найдено ли имя в справочнике)."""
+        ports = self.processor_ports_map.get(name)
+        if ports is None:
+            return 1, False
+        return ports, True
+
+    def card_max_pixels(self, name: str) -> tuple[int, int]:
+        return self.card_max_pixels_map.get(name, CARD_MAX_PIXELS_DEFAULT)
+
+
+# --- ФАЙЛЫ КАТАЛОГА (горячая перезагрузка по mtime) ---
+# Прайс живёт в catalog_data/<имя>.json (или .csv) — обновление цен не требует правки кода
+# и перезапуска Streamlit. JSON: список строк или {"source": "...", "rows": [...]}.
+CATALOG_DIR = Path(
+    os.environ.get("MEDIALIVE_CATALOG_DIR") or Path(__file__).resolve().parent / "catalog_data"
+)
+# Таблица каталога → имя файла без расширения
+CATALOG_FILES = {
+    "modules": "modules",
+    "sync_controllers": "sync_controllers",
+    "async_controllers": "async_controllers",
+    "cards": "receiving_cards",
+    "psus": "psu",
+    "hubs": "hubs",
+    "patch_cords": "patch_cords",
+    "card_power_cables": "card_power_cables",
+    "power_jumpers": "power_jumpers",
+    "magnets": "magnets",
+    "processors": "processors",
+    "card_max_pixels": "card_max_pixels",
+}
+# Не чаще одной проверки mtime в секунду: между проверками get_catalog() не трогает диск
+CATALOG_CHECK_INTERVAL_S = 1.0
+
+_catalog_lock = threading.Lock()
+_CATALOG: Optional[Catalog] = None
+_catalog_signature: Optional[tuple] = None
+_catalog_checked_at = 0.0
+_catalog_error: Optional[str] = None
+
+
+def _catalog_file(stem: str) -> Path:
+    path = CATALOG_DIR / f"{stem}.json"
+    if path.exists():
+        return path
+    csv_path = CATALOG_DIR / f"{stem}.csv"
+    return csv_path if csv_path.exists() else path
+
+
+def _csv_value(raw: str):
+    raw = raw.strip()
+    if raw == "":
+        return None
+    for conv in (int, float):
+        try:
+            return conv(raw)
+        except ValueError:
+            pass
+    return raw
+
+
+def _read_rows(path: Path) -> list[dict]:
+    if path.suffix == ".csv":
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            return [
+                {k: (v.strip() if k == "name" else _csv_value(v)) for k, v in row.items()}
+                for row in csv.DictReader(f)
+            ]
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    rows = data["rows"] if isinstance(data, dict) else data
+    if not isinstance(rows, list) or not all(isinstance(r, dict) and "name" in r for r in rows):
+        raise ValueError(f"{path.name}: ожидается список строк с полем name")
+    return rows
+
+
+def _files_signature() -> tuple:
+    sig = []
+    for stem in CATALOG_FILES.values():
+        path = _catalog_file(stem)
+        st_ = path.stat()
+        sig.append((path.name, st_.st_mtime_ns, st_.st_size))
+    return tuple(sig)
+
+
+def load_catalog() -> Catalog:
+    """Читает все файлы каталога и строит индексы (без кеша)."""
+    return Catalog.from_tables(
+        {table: _read_rows(_catalog_file(stem)) for table, stem in CATALOG_FILES.items()}
+    )
+
+
+def get_catalog() -> Catalog:
+    """
+    Текущий каталог. Раз в CATALOG_CHECK_INTERVAL_S сверяет mtime/размер файлов и, если они
+    изменились, собирает новый Catalog целиком и подменяет ссылку. Битый файл не роняет
+    приложение: остаётся предыдущий каталог, текст ошибки — в catalog_error().
+    """
+    global _CATALOG, _catalog_signature, _catalog_checked_at, _catalog_error
+    now = time.monotonic()
+    if _CATALOG is not None and now - _catalog_checked_at < CATALOG_CHECK_INTERVAL_S:
+        return _CATALOG
+    with _catalog_lock:
+        if _CATALOG is not None and now - _catalog_checked_at < CATALOG_CHECK_INTERVAL_S:
+            return _CATALOG
+        _catalog_checked_at = now
+        try:
+            sig = _files_signature()
+            if sig != _catalog_signature:
+                _CATALOG = load_catalog()
+                _catalog_signature = sig
+                _catalog_error = None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if _CATALOG is None:
+                raise
+            _catalog_error = f"{type(e).__name__}: {e}"
+        return _CATALOG
+
+
+def catalog_error() -> Optional[str]:
+    """Ошибка последней попытки перечитать файлы каталога (None — всё в порядке)."""
+    return _catalog_error
+
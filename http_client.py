@@ -0,0 +1,343 @@
+"""
+Общий HTTP-клиент для исходящих запросов (курс ЦБ, Петрович, Lemana, paste.rs).
+Keep-alive: соединения на хост переиспользуются между запросами и потоками;
+gzip: тело запрашивается сжатым и распаковывается потоково;
+условные запросы: ETag / Last-Modified запоминаются вместе с результатом разбора,
+и ответ 304 отдаёт его без повторной загрузки и разбора тела;
+circuit breaker на хост: после сбоя (сеть, таймаут, 5xx/429) хост не опрашивается
+до конца окна с экспоненциальной задержкой, затем пропускается один пробный запрос.
+Только стандартная библиотека; прокси берутся из окружения, как у urllib.
+"""
+
+from __future__ import annotations
+
+import gzip
+import http.client
+import ssl
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import IO, Any, Callable, Mapping, Optional
+from urllib.parse import urljoin, urlsplit
+
+DEFAULT_USER_AGENT = "MediaLive-LED-Calc/1.0"
+DEFAULT_TIMEOUT_S = 10.0
+MAX_REDIRECTS = 5
+MAX_IDLE_PER_HOST = 4
+VALIDATOR_CACHE_SIZE = 64
+# Circuit breaker: сколько сбоев подряд открывают цепь и окна ожидания (удваиваются до максимума)
+BREAKER_FAILURE_THRESHOLD = 1
+BREAKER_BASE_BACKOFF_S = 60.0
+BREAKER_MAX_BACKOFF_S = 3600.0
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+_REDIRECT_CODES = frozenset({301, 302, 303, 307, 308})
+# Повтор на свежем соединении, если сервер уже закрыл простаивавшее keep-alive
+_STALE_CONN_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class HttpError(OSError):
+    def __init__(self, status: int, url: str):
+        super().__init__(f"HTTP {status}: {url}")
+        self.status = status
+        self.url = url
+
+
+class CircuitOpenError(OSError):
+    def __init__(self, host: str, retry_in_s: float):
+        super().__init__(f"{host}: недоступен, повтор через {retry_in_s:.0f} с")
+        self.host = host
+        self.retry_in_s = retry_in_s
+
+
+@dataclass(frozen=True)
+class BreakerStatus:
+    state: str  # BREAKER_CLOSED / BREAKER_OPEN / BREAKER_HALF_OPEN
+    failures: int  # сбоев подряд
+    retry_in_s: float  # через сколько пропустим пробный запрос (0 — уже можно)
+
+
+class CircuitBreaker:
+    """
+    closed → (BREAKER_FAILURE_THRESHOLD сбоев) → open на backoff → half_open: один пробный
+    запрос; удача закрывает цепь, сбой снова открывает её с удвоенным окном.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._backoff_s = 0.0
+        self._open_until = 0.0
+        self._probing = False
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._failures < BREAKER_FAILURE_THRESHOLD:
+                return True
+            if now < self._open_until or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._backoff_s = 0.0
+            self._probing = False
+
+    def record_failure(self, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            probe = self._probing
+            self._failures += 1
+            self._probing = False
+            if self._failures < BREAKER_FAILURE_THRESHOLD:
+                return
+            if probe:
+                # Не удался пробный запрос — окно удваивается
+                self._backoff_s = min(BREAKER_MAX_BACKOFF_S, self._backoff_s * 2 or BREAKER_BASE_BACKOFF_S)
+            elif not self._backoff_s:
+                self._backoff_s = BREAKER_BASE_BACKOFF_S
+            # Одновременные сбои запросов, начатых ещё при закрытой цепи, окно не удваивают
+            self._open_until = max(self._open_until, now + self._backoff_s)
+
+    def release_probe(self) -> None:
+        """Пробный запрос прерван не сбоем хоста (ошибка в коде вызова) — пробу можно повторить."""
+        with self._lock:
+            self._probing = False
+
+    def status(self, now: Optional[float] = None) -> BreakerStatus:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._failures < BREAKER_FAILURE_THRESHOLD:
+                return BreakerStatus(BREAKER_CLOSED, self._failures, 0.0)
+            if self._probing or now >= self._open_until:
+                return BreakerStatus(BREAKER_HALF_OPEN, self._failures, 0.0)
+            return BreakerStatus(BREAKER_OPEN, self._failures, self._open_until - now)
+
+
+@dataclass(frozen=True)
+class _Validators:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    result: Any
+
+
+def read_all(stream: IO[bytes]) -> bytes:
+    return stream.read()
+
+
+class HttpClient:
+    """
+    fetch(url, parse) → parse(поток тела). parse читает сколько нужно: если тело дочитано,
+    соединение возвращается в пул, иначе закрывается. Для GET результат parse кэшируется
+    по URL вместе с валидаторами, поэтому один URL всегда разбирается одной функцией.
+    """
+
+    def __init__(self, validator_cache_size: int = VALIDATOR_CACHE_SIZE):
+        self._lock = threading.Lock()
+        self._idle: dict[tuple, list[http.client.HTTPConnection]] = {}
+        self._validators: OrderedDict[str, _Validators] = OrderedDict()
+        self._validator_cache_size = validator_cache_size
+        self._ssl = ssl.create_default_context()
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    # --- пул соединений ---
+    def _route(self, scheme: str, host: str, port: Optional[int]) -> tuple:
+        port = port or (443 if scheme == "https" else 80)
+        proxy = urllib.request.getproxies().get(scheme)
+        if proxy and not urllib.request.proxy_bypass(host):
+            p = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+            return (scheme, host, port, p.hostname, p.port or 80)
+        return (scheme, host, port, None, None)
+
+    def _connect(self, route: tuple, timeout: float) -> http.client.HTTPConnection:
+        scheme, host, port, proxy_host, proxy_port = route
+        if proxy_host is None:
+            if scheme == "https":
+                return http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl)
+            return http.client.HTTPConnection(host, port, timeout=timeout)
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(
+                proxy_host, proxy_port, timeout=timeout, context=self._ssl
+            )
+            conn.set_tunnel(host, port)
+            return conn
+        return http.client.HTTPConnection(proxy_host, proxy_port, timeout=timeout)
+
+    def _acquire(self, route: tuple, timeout: float) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(route)
+            conn = idle.pop() if idle else None
+        if conn is None:
+            return self._connect(route, timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, route: tuple, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(route, [])
+            if len(idle) < MAX_IDLE_PER_HOST:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    # --- circuit breaker по хостам ---
+    def _breaker(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker()
+            return breaker
+
+    def breaker_status(self) -> dict[str, BreakerStatus]:
+        """Хост → состояние цепи, для всех хостов, к которым уже ходили."""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {host: b.status() for host, b in breakers.items()}
+
+    # --- кэш валидаторов ---
+    def _cached(self, url: str) -> Optional[_Validators]:
+        with self._lock:
+            v = self._validators.get(url)
+            if v is not None:
+                self._validators.move_to_end(url)
+            return v
+
+    def _remember(self, url: str, headers: Mapping[str, str], result: Any) -> None:
+        etag = headers.get("etag")
+        last_modified = headers.get("last-modified")
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            self._validators[url] = _Validators(etag, last_modified, result)
+            self._validators.move_to_end(url)
+            while len(self._validators) > self._validator_cache_size:
+                self._validators.popitem(last=False)
+
+    # --- запрос ---
+    def _send(
+        self, method: str, url: str, headers: dict, data: Optional[bytes], timeout: float
+    ) -> tuple[tuple, http.client.HTTPConnection, http.client.HTTPResponse]:
+        parts = urlsplit(url)
+        route = self._route(parts.scheme, parts.hostname or "", parts.port)
+        path = url if (route[3] is not None and parts.scheme == "http") else (
+            (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        )
+        for attempt in range(2):
+            conn, reused = self._acquire(route, timeout)
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                return route, conn, conn.getresponse()
+            except _STALE_CONN_ERRORS:
+                conn.close()
+                if not reused or attempt or method not in ("GET", "HEAD"):
+                    raise
+            except BaseException:
+                conn.close()
+                raise
+        raise AssertionError("unreachable")
+
+    def fetch(
+        self,
+        url: str,
+        parse: Callable[[IO[bytes]], Any] = read_all,
+        *,
+        method: str = "GET",
+        data: Optional[bytes] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        timeout: float = DEFAULT_TIMEOUT_S,
+        conditional: Optional[bool] = None,
+    ) -> Any:
+        """
+        Запрос с переходами по редиректам; parse получает распакованный поток тела ответа 2xx.
+        conditional (по умолчанию — для GET): слать If-None-Match / If-Modified-Since и на 304
+        отдавать прошлый результат parse. Коды ≥ 400 — HttpError.
+        """
+        conditional = method == "GET" if conditional is None else conditional
+        for _ in range(MAX_REDIRECTS + 1):
+            req_headers = {
+                "User-Agent": DEFAULT_USER_AGENT,
+                "Accept-Encoding": "gzip",
+                "Connection": "keep-alive",
+                **(headers or {}),
+            }
+            cached = self._cached(url) if conditional else None
+            if cached is not None:
+                if cached.etag:
+                    req_headers["If-None-Match"] = cached.etag
+                if cached.last_modified:
+                    req_headers["If-Modified-Since"] = cached.last_modified
+            host = urlsplit(url).hostname or ""
+            breaker = self._breaker(host)
+            if not breaker.allow():
+                raise CircuitOpenError(host, breaker.status().retry_in_s)
+            try:
+                route, conn, resp = self._send(method, url, req_headers, data, timeout)
+            except (OSError, http.client.HTTPException):
+                breaker.record_failure()
+                raise
+            except BaseException:
+                breaker.release_probe()
+                raise
+            if resp.status >= 500 or resp.status == 429:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            reusable = False
+            try:
+                resp_headers = {k.lower(): v for k, v in resp.getheaders()}
+                if resp.status in _REDIRECT_CODES and resp_headers.get("location"):
+                    resp.read()
+                    reusable = True
+                    url = urljoin(url, resp_headers["location"])
+                    if resp.status == 303 or (resp.status in (301, 302) and method == "POST"):
+                        method, data = "GET", None
+                    continue
+                if resp.status == 304 and cached is not None:
+                    resp.read()
+                    reusable = True
+                    return cached.result
+                if resp.status >= 400:
+                    raise HttpError(resp.status, url)
+                body: IO[bytes] = resp
+                if resp_headers.get("content-encoding", "").lower() == "gzip":
+                    body = gzip.GzipFile(fileobj=resp, mode="rb")
+                try:
+                    result = parse(body)
+                except (OSError, http.client.HTTPException):
+                    breaker.record_failure()  # обрыв / таймаут посреди тела
+                    raise
+                reusable = resp.isclosed()
+                if conditional:
+                    self._remember(url, resp_headers, result)
+                return result
+            finally:
+                if reusable and not resp.will_close:
+                    self._release(route, conn)
+                else:
+                    conn.close()
+        raise HttpError(resp.status, url)  # слишком много редиректов
+
+
+default_client = HttpClient()
+
+
+def fetch(url: str, parse: Callable[[IO[bytes]], Any] = read_all, **kwargs) -> Any:
+    """fetch() общего клиента процесса."""
+    return default_client.fetch(url, parse, **kwargs)
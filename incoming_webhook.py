@@ -1,25 +1,138 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import atexit
 import datetime
 import json
 import os
-import re
+import shutil
+import time
 import uuid
 from pathlib import Path
 from typing import Any
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
+
+import profiling
+from lead_index import dedup_key
+from lead_quote import attach_quote
+from lead_queue import BATCH_MAX_DEFAULT, QUEUE_MAX_DEFAULT, BatchWriter, QueueFull, RecentKeys
+from lead_store import INCOMING_DIR, new_lead_id
+from lead_store import default_store as lead_store
+from webhook_metrics import (
+    BATCH_SIZE_BUCKETS,
+    LATENCY_BUCKETS_S,
+    PROMETHEUS_CONTENT_TYPE,
+    SIZE_BUCKETS_BYTES,
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+)
 
 APP = Flask(__name__)
 BASE_DIR = Path(__file__).resolve().parent
-INCOMING_DIR = BASE_DIR / "incoming_requests"
 
 
-def _safe_part(value: str) -> str:
-    sanitized = re.sub(r"[^\w\-.()\s\u0400-\u04FF]", "_", (value or "").strip(), flags=re.UNICODE)
-    sanitized = re.sub(r"\s+", "_", sanitized).strip("_")
-    return sanitized[:80] or "request"
+def _disk_free_bytes() -> float:
+    return shutil.disk_usage(INCOMING_DIR if INCOMING_DIR.is_dir() else BASE_DIR).free
+
+
+METRICS = Registry()
+REQUESTS_TOTAL = METRICS.register(
+    Counter("webhook_requests_total", "HTTP-запросы по маршруту и коду ответа", ("endpoint", "method", "status"))
+)
+REQUEST_LATENCY = METRICS.register(
+    Histogram(
+        "webhook_request_duration_seconds", "Время обработки запроса", LATENCY_BUCKETS_S, ("endpoint",)
+    )
+)
+PAYLOAD_SIZE = METRICS.register(
+    Histogram("webhook_payload_size_bytes", "Размер тела POST /incoming", SIZE_BUCKETS_BYTES)
+)
+DISK_WRITE_LATENCY = METRICS.register(
+    Histogram("webhook_disk_write_seconds", "Запись пачки заявок в INCOMING_DIR", LATENCY_BUCKETS_S)
+)
+BATCH_SIZE = METRICS.register(
+    Histogram("webhook_write_batch_size", "Заявок в одной пачке записи", BATCH_SIZE_BUCKETS)
+)
+QUEUE_REJECTED = METRICS.register(
+    Counter("webhook_queue_rejected_total", "Заявки, отклонённые с 503 из-за полной очереди")
+)
+WRITE_ERRORS = METRICS.register(
+    Counter("webhook_write_errors_total", "Сбои записи пачки по типу ошибки", ("error",))
+)
+DEAD_LETTERS = METRICS.register(
+    Counter("webhook_dead_letters_total", "Заявки, которые не удалось записать в журнал (в dead-letter)")
+)
+QUOTE_LATENCY = METRICS.register(
+    Histogram("webhook_quote_seconds", "Расчёт заявок пачки при приёме", LATENCY_BUCKETS_S)
+)
+DUPLICATES = METRICS.register(
+    Counter("webhook_duplicates_total", "Повторы уже принятых заявок (ответ без записи)")
+)
+METRICS.register(Gauge("webhook_pending_requests", "Заявок в журнале (без удалённых)", lead_store.count))
+METRICS.register(Gauge("webhook_disk_free_bytes", "Свободно на диске INCOMING_DIR", _disk_free_bytes))
+
+
+def _on_batch(size: int, seconds: float) -> None:
+    # seconds — вместе с расчётом; запись на диск замеряет сам _write_batch
+    BATCH_SIZE.observe(size)
+
+
+# Заявки, которые журнал не принял не из-за диска: лежат отдельно, чтобы их можно было разобрать
+DEAD_LETTER_PATH = INCOMING_DIR / "dead-letter.ndjson"
+
+
+def _on_write_error(error: Exception) -> None:
+    WRITE_ERRORS.inc(error=type(error).__name__)
+    if isinstance(error, OSError):
+        APP.logger.error("Запись заявок в %s не удалась, повтор: %s", INCOMING_DIR, error)
+    else:
+        APP.logger.exception("Пачка заявок не записана, пишем по одной", exc_info=error)
+
+
+def _on_dead_letter(document: dict, error: Exception) -> None:
+    DEAD_LETTERS.inc()
+    # Заявки нет в журнале — повтор клиента должен приниматься заново, а не как дубль
+    RECENT_KEYS.discard(dedup_key(document.get("payload", document)))
+    line = {
+        "failed_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "error": repr(error),
+        "document": document,
+    }
+    try:
+        INCOMING_DIR.mkdir(parents=True, exist_ok=True)
+        with open(DEAD_LETTER_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+    except OSError as e:
+        APP.logger.error("Заявка %s потеряна: %r; dead-letter недоступен: %s", document.get("id"), error, e)
+        return
+    APP.logger.error("Заявка %s не записана (%r) — сохранена в %s", document.get("id"), error, DEAD_LETTER_PATH)
+
+
+def _write_batch(documents: list[dict]) -> None:
+    """Расчёт по каждой заявке пачки (для списка с ценами) и дозапись в журнал одним fsync."""
+    started = time.perf_counter()
+    documents = [attach_quote(d) for d in documents]
+    written = time.perf_counter()
+    QUOTE_LATENCY.observe(written - started)
+    lead_store.append_batch(documents)
+    DISK_WRITE_LATENCY.observe(time.perf_counter() - written)
+
+
+WRITER = BatchWriter(
+    _write_batch,
+    maxsize=int(os.environ.get("MEDIALIVE_WEBHOOK_QUEUE_SIZE", str(QUEUE_MAX_DEFAULT))),
+    batch_max=int(os.environ.get("MEDIALIVE_WEBHOOK_BATCH_MAX", str(BATCH_MAX_DEFAULT))),
+    on_batch=_on_batch,
+    on_error=_on_write_error,
+    on_dead_letter=_on_dead_letter,
+)
+RETRY_AFTER_S = 1
+RECENT_KEYS = RecentKeys()
+atexit.register(WRITER.stop)
+METRICS.register(Gauge("webhook_queue_depth", "Заявок в очереди на запись", WRITER.depth))
 
 
 def _normalize_payload(payload: Any) -> dict:
@@ -28,11 +141,41 @@ def _normalize_payload(payload: Any) -> dict:
     return {"raw_payload": payload}
 
 
+@APP.before_request
+def _start_request_profile():
+    # MEDIALIVE_PROFILE: профиль запроса с X-Request-ID (или случайным id) в имени файла
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:12]
+    g.profile = profiling.start_profile("webhook", f"{request.endpoint or 'unknown'}_{request_id}")
+    g.started = time.perf_counter()
+
+
+@APP.after_request
+def _record_request_metrics(response):
+    endpoint = request.endpoint or "unknown"
+    REQUESTS_TOTAL.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+    started = g.pop("started", None)
+    if started is not None:
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint)
+    if endpoint == "incoming":
+        PAYLOAD_SIZE.observe(request.content_length or 0)
+    return response
+
+
+@APP.teardown_request
+def _stop_request_profile(exc):
+    profiling.stop_profile(g.pop("profile", None), "error" if exc is not None else "ok")
+
+
 @APP.route("/health", methods=["GET"])
 def health():
     return jsonify({"ok": True})
 
 
+@APP.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(METRICS.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
 @APP.route("/incoming", methods=["POST"])
 def incoming():
     payload = request.get_json(silent=True)
@@ -40,50 +183,40 @@ def incoming():
         return jsonify({"ok": False, "error": "invalid_or_empty_json"}), 400
 
     normalized = _normalize_payload(payload)
-    record = {
-        "received_at": datetime.datetime.now().isoformat(timespec="seconds"),
+    # Идемпотентность: повтор (тот же request_id / id / lead_id или то же содержимое)
+    # получает ответ первой попытки и ничего не пишет
+    key = dedup_key(normalized)
+    original = RECENT_KEYS.get(key)
+    if original is None:
+        row = lead_store.find(key)
+        if row is not None:
+            original = RECENT_KEYS.reserve(key, (row.id, row.received_at)) or (row.id, row.received_at)
+    now = datetime.datetime.now()
+    received_at = now.isoformat(timespec="seconds")
+    lead_id = new_lead_id(normalized, now)
+    if original is None:
+        original = RECENT_KEYS.reserve(key, (lead_id, received_at))
+    if original is not None:
+        DUPLICATES.inc()
+        return jsonify({"ok": True, "id": original[0], "received_at": original[1], "duplicate": True})
+
+    document = {
+        "id": lead_id,
+        "received_at": received_at,
         "source_ip": request.headers.get("X-Forwarded-For", request.remote_addr),
-        "data": normalized,
+        "payload": normalized,
     }
-
-    INCOMING_DIR.mkdir(parents=True, exist_ok=True)
-    req_id = str(
-        normalized.get("request_id")
-        or normalized.get("id")
-        or normalized.get("lead_id")
-        or ""
-    )
-    project = str(
-        normalized.get("project_name")
-        or normalized.get("project")
-        or normalized.get("client")
-        or ""
-    )
-    ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = (
-        f"{ts}_{_safe_part(project)}_{_safe_part(req_id)}_{uuid.uuid4().hex[:6]}.json"
-    )
-    target_path = INCOMING_DIR / filename
-    target_path.write_text(
-        json.dumps(
-            {
-                "received_at": record["received_at"],
-                "source_ip": record["source_ip"],
-                "payload": normalized,
-            },
-            ensure_ascii=False,
-            indent=2,
-        ),
-        encoding="utf-8",
-    )
-
-    return jsonify(
-        {
-            "ok": True,
-            "saved_to": str(target_path),
-            "received_at": record["received_at"],
-        }
-    )
+    try:
+        WRITER.submit(document)
+    except QueueFull:
+        RECENT_KEYS.discard(key)
+        QUEUE_REJECTED.inc()
+        response = jsonify({"ok": False, "error": "queue_full"})
+        response.headers["Retry-After"] = str(RETRY_AFTER_S)
+        return response, 503
+
+    # 202: заявка принята в очередь, в журнале появится после записи пачки
+    return jsonify({"ok": True, "id": lead_id, "received_at": received_at}), 202
 
 
 if __name__ == "__main__":
@@ -0,0 +1,241 @@
+"""
+Таблица заявок для списка «Входящие заявки»: SQLite в режиме WAL рядом с журналом
+(incoming_requests/leads.sqlite3). Строка на заявку — id, время, проект, клиент, размер,
+статус и адрес в журнале; заполняется при записи в журнал (lead_store), поэтому страница
+списка — один запрос по первичному ключу с LIMIT, а не чтение всех заявок.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+from lead_payload import form_values
+
+LEAD_DB_NAME = "leads.sqlite3"
+LEAD_DB_BUSY_TIMEOUT_S = 5.0
+LEAD_PAGE_SIZE = 20
+
+# Ключи state калькулятора, из которых берутся поля строки списка (как в форме)
+_SUMMARY_STATE_KEYS = ("width_input", "height_mm", "calc_project_name", "calc_client_name")
+
+STATUS_NEW = "new"
+STATUS_DELETED = "deleted"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    received_at TEXT,
+    project TEXT NOT NULL DEFAULT '',
+    client TEXT NOT NULL DEFAULT '',
+    width_mm INTEGER,
+    height_mm INTEGER,
+    status TEXT NOT NULL,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS leads_status_seq ON leads (status, seq);
+CREATE INDEX IF NOT EXISTS leads_id ON leads (id)
+"""
+# Столбцы, добавленные позже: в старую таблицу добавляются при открытии, затем индексы по ним
+_ADDED_COLUMNS = (("dedup_key", "TEXT"), ("sale_rub", "REAL"), ("quote", "TEXT"))
+_ADDED_INDEXES = """
+CREATE INDEX IF NOT EXISTS leads_dedup_key ON leads (dedup_key, seq);
+CREATE INDEX IF NOT EXISTS leads_status_sale ON leads (status, sale_rub, seq)
+"""
+_COLUMNS = (
+    "seq, id, received_at, project, client, width_mm, height_mm, status, segment, offset, length, "
+    "sale_rub, quote"
+)
+ORDER_NEW = "new"  # новые сверху
+ORDER_VALUE = "value"  # по сумме продажи, дорогие сверху
+
+
+@dataclass(frozen=True)
+class LeadRow:
+    seq: int  # адрес записи в журнале (номер в leads.idx)
+    id: str
+    received_at: Optional[str]
+    project: str
+    client: str
+    width_mm: Optional[int]
+    height_mm: Optional[int]
+    status: str
+    segment: int
+    offset: int
+    length: int
+    sale_rub: Optional[float]  # сумма продажи расчёта при приёме (lead_quote)
+    quote: Optional[str]  # JSON ключевых цифр расчёта
+
+    @property
+    def quote_summary(self) -> Optional[dict]:
+        if not self.quote:
+            return None
+        try:
+            return json.loads(self.quote)
+        except ValueError:
+            return None
+
+    @property
+    def size_label(self) -> str:
+        if self.width_mm and self.height_mm:
+            return f"{self.width_mm}×{self.height_mm}"
+        return "—"
+
+
+def request_key(payload: dict) -> str:
+    return str(payload.get("request_id") or payload.get("id") or payload.get("lead_id") or "")
+
+
+def dedup_key(payload) -> str:
+    """
+    Ключ идемпотентности заявки: id запроса (request_id / id / lead_id), а без него —
+    хэш содержимого. Повтор Make после таймаута даёт тот же ключ, что и первая попытка.
+    """
+    if isinstance(payload, dict) and request_key(payload):
+        return "id:" + request_key(payload)
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return "sha256:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _int_or_none(value) -> Optional[int]:
+    """Целое для столбца INTEGER; нечисло, inf/NaN и то, что не помещается в 64 бита, — None."""
+    try:
+        v = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if not math.isfinite(v) or abs(v) >= 2**63:
+        return None
+    return int(v)
+
+
+def lead_summary(document: dict) -> dict:
+    """Поля строки списка из записи журнала {"id", "received_at", "payload"}."""
+    payload = document.get("payload", document)
+    quote = document.get("quote")
+    values = form_values(payload, _SUMMARY_STATE_KEYS)[0] if isinstance(payload, dict) else {}
+    return {
+        "id": str(document.get("id") or ""),
+        "received_at": document.get("received_at"),
+        "project": str(values.get("calc_project_name") or ""),
+        "client": str(values.get("calc_client_name") or ""),
+        "width_mm": _int_or_none(values.get("width_input")),
+        "height_mm": _int_or_none(values.get("height_mm")),
+        "dedup_key": dedup_key(payload) if "payload" in document else None,
+        "sale_rub": quote.get("sale_total_rub") if isinstance(quote, dict) else None,
+        "quote": json.dumps(quote, ensure_ascii=False) if isinstance(quote, dict) else None,
+    }
+
+
+class LeadIndex:
+    """Соединение своё у каждого потока; пишет только lead_store под своей блокировкой."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=LEAD_DB_BUSY_TIMEOUT_S, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(leads)")}
+            for name, sql_type in _ADDED_COLUMNS:
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE leads ADD COLUMN {name} {sql_type}")
+            conn.executescript(_ADDED_INDEXES)
+            self._local.conn = conn
+        return conn
+
+    def max_seq(self) -> int:
+        """Последний проиндексированный адрес журнала; -1 — таблица пуста."""
+        row = self._conn().execute("SELECT MAX(seq) FROM leads").fetchone()
+        return -1 if row[0] is None else row[0]
+
+    def add(self, rows: Iterable[tuple[int, int, int, int, dict, str]]) -> None:
+        """rows: (seq, segment, offset, length, запись журнала, статус)."""
+        values = [
+            (
+                seq,
+                s["id"],
+                s["received_at"],
+                s["project"],
+                s["client"],
+                s["width_mm"],
+                s["height_mm"],
+                status,
+                segment,
+                offset,
+                length,
+                s["sale_rub"],
+                s["quote"],
+                s["dedup_key"],
+            )
+            for seq, segment, offset, length, document, status in rows
+            for s in (lead_summary(document),)
+        ]
+        if not values:
+            return
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                f"INSERT OR REPLACE INTO leads ({_COLUMNS}, dedup_key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                values,
+            )
+
+    def set_status(self, seq: int, status: str) -> None:
+        self._conn().execute("UPDATE leads SET status = ? WHERE seq = ?", (status, seq))
+
+    def page(
+        self,
+        query: str = "",
+        page: int = 0,
+        page_size: int = LEAD_PAGE_SIZE,
+        status: str = STATUS_NEW,
+        order: str = ORDER_NEW,
+    ) -> tuple[list[LeadRow], bool]:
+        """Страница (новые сверху или по сумме) и признак, что есть следующая (берём page_size + 1 строку)."""
+        sql = f"SELECT {_COLUMNS} FROM leads WHERE status = ?"
+        params: list = [status]
+        query = (query or "").strip()
+        if query:
+            like = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            sql += " AND (project LIKE ? ESCAPE '\\' OR client LIKE ? ESCAPE '\\' OR id LIKE ? ESCAPE '\\')"
+            params += [like, like, like]
+        if order == ORDER_VALUE:
+            # NULL в SQLite меньше любого числа: заявки без расчёта — в конце
+            sql += " ORDER BY sale_rub DESC, seq DESC LIMIT ? OFFSET ?"
+        else:
+            sql += " ORDER BY seq DESC LIMIT ? OFFSET ?"
+        params += [page_size + 1, max(0, page) * page_size]
+        rows = [LeadRow(*r) for r in self._conn().execute(sql, params).fetchall()]
+        return rows[:page_size], len(rows) > page_size
+
+    def find_key(self, key: str) -> Optional[LeadRow]:
+        """Первая заявка с этим ключом идемпотентности (в том числе удалённая) — поиск по индексу."""
+        row = self._conn().execute(
+            f"SELECT {_COLUMNS} FROM leads WHERE dedup_key = ? ORDER BY seq LIMIT 1", (key,)
+        ).fetchone()
+        return LeadRow(*row) if row is not None else None
+
+    def find_id(self, lead_id: str) -> Optional[LeadRow]:
+        row = self._conn().execute(
+            f"SELECT {_COLUMNS} FROM leads WHERE id = ? ORDER BY seq LIMIT 1", (lead_id,)
+        ).fetchone()
+        return LeadRow(*row) if row is not None else None
+
+    def count(self, status: str = STATUS_NEW) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM leads WHERE status = ?", (status,)).fetchone()[0]
@@ -0,0 +1,145 @@
+"""
+Поля входящей заявки → значения формы калькулятора (ключи session_state). Одно правило
+и для подстановки заявки в форму (app.py), и для расчёта при приёме (lead_quote): цена
+в списке заявок совпадает с той, что покажет форма, открытая по этой заявке. Без Streamlit.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Iterable
+
+from quote_engine import MOUNT_CABINET, MOUNT_MONOLITH, VAT_OFF, VAT_ON
+
+WIDTH_STEP_MM = 320
+HEIGHT_STEP_MM = 160
+DEFAULT_WIDTH_MM = 3840
+DEFAULT_HEIGHT_MM = 2240
+DEFAULT_MARGIN_PCT = 30
+MIN_EXCHANGE_RATE = 50.0  # нижняя граница поля «Курс USD» в форме
+
+
+def extract_state(payload: dict) -> dict:
+    """Возвращает плоский словарь state из разных форматов входящего JSON."""
+    if isinstance(payload.get("data"), dict):
+        payload = payload["data"]
+    if isinstance(payload.get("state"), dict):
+        return payload["state"]
+    if isinstance(payload.get("calc_state"), dict):
+        return payload["calc_state"]
+    return payload
+
+
+def to_float(value, default):
+    """Конечное число; нечисло, inf и NaN из заявки — default."""
+    try:
+        v = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return default
+    return v if math.isfinite(v) else default
+
+
+def to_int(value, default):
+    v = to_float(value, None)
+    return default if v is None else int(v)
+
+
+def round_to_step(value, step: int, minimum: int, default: int) -> int:
+    """К ближайшему кратному шагу модуля, не меньше minimum."""
+    value = max(minimum, to_int(value, default))
+    lower = max(minimum, (value // step) * step)
+    upper = max(minimum, ((value + step - 1) // step) * step)
+    return lower if abs(value - lower) <= abs(upper - value) else upper
+
+
+def form_values(payload: dict, state_keys: Iterable[str] = ()) -> tuple[dict, list[str]]:
+    """
+    Значения ключей session_state из заявки и список применённых полей заявки.
+    state_keys — ключи state калькулятора, которые заявка может передать как есть
+    (полноценный state из сохранённой сессии); поля заявки применяются поверх них.
+    """
+    payload = extract_state(payload)
+    values: dict = {}
+    applied: list[str] = []
+
+    for key in state_keys:
+        if key in payload:
+            values[key] = payload[key]
+            applied.append(key)
+    if "width_input" in values:
+        values["width_input"] = round_to_step(values["width_input"], WIDTH_STEP_MM, WIDTH_STEP_MM, DEFAULT_WIDTH_MM)
+    if "height_mm" in values:
+        values["height_mm"] = round_to_step(values["height_mm"], HEIGHT_STEP_MM, HEIGHT_STEP_MM, DEFAULT_HEIGHT_MM)
+
+    project_name = payload.get("project_name") or payload.get("project")
+    if project_name:
+        values["calc_project_name"] = str(project_name)
+        applied.append("project_name")
+
+    client = payload.get("client") or payload.get("client_name")
+    if client:
+        values["calc_client_name"] = str(client)
+        applied.append("client")
+
+    width = payload.get("width_mm")
+    if width is None:
+        width = payload.get("width")
+    if width is not None:
+        values["width_input"] = round_to_step(width, WIDTH_STEP_MM, WIDTH_STEP_MM, DEFAULT_WIDTH_MM)
+        applied.append("width_mm")
+    height = payload.get("height_mm")
+    if height is None:
+        height = payload.get("height")
+    if height is not None:
+        values["height_mm"] = round_to_step(height, HEIGHT_STEP_MM, HEIGHT_STEP_MM, DEFAULT_HEIGHT_MM)
+        applied.append("height_mm")
+
+    env = payload.get("env") or payload.get("environment")
+    if env in ("Indoor", "Outdoor"):
+        values["calc_env_key"] = env
+        applied.append("env")
+
+    mount = payload.get("mount_type")
+    if mount in (MOUNT_MONOLITH, MOUNT_CABINET):
+        values["calc_mount_type"] = mount
+        applied.append("mount_type")
+
+    logistics = payload.get("logistics_rub")
+    if logistics is not None:
+        values["calc_logistics_rub"] = max(0.0, to_float(logistics, 0.0))
+        applied.append("logistics_rub")
+    installation = payload.get("installation_rub")
+    if installation is not None:
+        values["calc_installation_rub"] = max(0.0, to_float(installation, 0.0))
+        applied.append("installation_rub")
+
+    margin = payload.get("margin_percent")
+    if margin is not None:
+        values["calc_margin_pct"] = max(0, to_int(margin, DEFAULT_MARGIN_PCT))
+        applied.append("margin_percent")
+
+    currency = payload.get("display_currency")
+    if currency in ("RUB", "USD"):
+        values["calc_display_currency"] = currency
+        applied.append("display_currency")
+
+    vat_enabled = payload.get("vat_enabled")
+    vat_mode = payload.get("vat_mode")
+    if isinstance(vat_enabled, bool):
+        values["calc_vat_mode"] = VAT_ON if vat_enabled else VAT_OFF
+        applied.append("vat_enabled")
+    elif vat_mode in (VAT_OFF, VAT_ON):
+        values["calc_vat_mode"] = vat_mode
+        applied.append("vat_mode")
+
+    exchange = to_float(payload.get("exchange_rate"), None)
+    if exchange is not None:
+        values["calc_exchange_rate"] = max(MIN_EXCHANGE_RATE, exchange)
+        applied.append("exchange_rate")
+
+    module_name = payload.get("module_name")
+    if module_name:
+        values["calc_module_name"] = str(module_name)
+        applied.append("module_name")
+
+    return values, applied
@@ -0,0 +1,182 @@
+"""
+Очередь приёма заявок: обработчик вебхука кладёт запись в ограниченную очередь и сразу
+отвечает, а фоновый поток забирает накопившиеся записи пачками и пишет их одним вызовом
+write_batch. Так задержка ответа не зависит от диска, а всплеск заявок пишется пачкой.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+QUEUE_MAX_DEFAULT = 1000
+BATCH_MAX_DEFAULT = 100
+WRITE_RETRY_S = 1.0
+RECENT_KEYS_MAX = 10000
+
+
+class QueueFull(Exception):
+    """Очередь заполнена — клиенту отвечаем 503 с Retry-After."""
+
+
+class BatchWriter:
+    """
+    submit(record) — неблокирующая постановка в очередь (QueueFull, если места нет).
+    Поток-писатель ждёт первую запись, добирает всё, что уже лежит в очереди (до batch_max),
+    и вызывает write_batch(records). Сбой записи (OSError) повторяется с той же пачкой,
+    пока не получится или не будет вызван stop(): принятые заявки не теряются.
+    Любая другая ошибка повтором не лечится (её даёт сама запись, а не диск): пачка пишется
+    по одной записи, и только запись, которая не пишется и одна, уходит в on_dead_letter.
+    Поток-писатель при этом не останавливается.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[list], None],
+        maxsize: int = QUEUE_MAX_DEFAULT,
+        batch_max: int = BATCH_MAX_DEFAULT,
+        on_batch: Optional[Callable[[int, float], None]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+        on_dead_letter: Optional[Callable[[Any, Exception], None]] = None,
+    ):
+        self.write_batch = write_batch
+        self.batch_max = batch_max
+        self.on_batch = on_batch  # (размер пачки, секунд на запись) — для метрик
+        self.on_error = on_error
+        self.on_dead_letter = on_dead_letter  # (запись, ошибка) — сохранить отдельно от журнала
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def maxsize(self) -> int:
+        return self._queue.maxsize
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="lead-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, record) -> None:
+        self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            raise QueueFull() from None
+
+    def _take_batch(self, timeout: float) -> list:
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_max:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _notify(self, callback: Optional[Callable], *args) -> None:
+        if callback is None:
+            logging.getLogger(__name__).error("lead-writer: %s", args[-1])
+            return
+        try:
+            callback(*args)
+        except Exception:  # сбой обработчика не должен останавливать поток записи
+            logging.getLogger(__name__).exception("lead-writer: сбой обработчика %r", callback)
+
+    def _write(self, batch: list) -> None:
+        """Записать пачку (task_done по каждой записи); выходит без записи только по stop()."""
+        while True:
+            started = time.perf_counter()
+            try:
+                self.write_batch(batch)
+            except OSError as e:
+                self._notify(self.on_error, e)
+                if self._stop.wait(WRITE_RETRY_S):
+                    return
+                continue
+            except Exception as e:
+                self._notify(self.on_error, e)
+                if len(batch) > 1:
+                    for record in batch:
+                        self._write([record])
+                    return
+                self._notify(self.on_dead_letter, batch[0], e)
+                self._queue.task_done()
+                return
+            if self.on_batch is not None:
+                self._notify(self.on_batch, len(batch), time.perf_counter() - started)
+            for _ in batch:
+                self._queue.task_done()
+            return
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._take_batch(timeout=0.5)
+            if batch:
+                self._write(batch)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Дождаться записи всего, что уже в очереди; False — не успели за timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Дописать очередь (не дольше timeout) и остановить поток."""
+        if self._thread is not None and self._thread.is_alive():
+            self.flush(timeout)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+class RecentKeys:
+    """
+    Ключи идемпотентности последних принятых заявок → ответ первой попытки (LRU в памяти).
+    Закрывает окно, пока заявка ещё в очереди и не видна в журнале, и отвечает на частые
+    повторы без обращения к диску.
+    """
+
+    def __init__(self, maxsize: int = RECENT_KEYS_MAX):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._items: OrderedDict[str, Any] = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def reserve(self, key: str, value: Any) -> Any:
+        """Запомнить value, если ключа ещё нет (None); иначе вернуть уже запомненное."""
+        with self._lock:
+            existing = self._items.get(key)
+            if existing is not None:
+                self._items.move_to_end(key)
+                return existing
+            self._items[key] = value
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+            return None
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
@@ -0,0 +1,145 @@
+"""
+Расчёт при приёме заявки: из полей заявки и значений каталога по умолчанию собирается
+QuoteInputs, считается (через общий кэш расчётов) и в запись журнала кладутся ключевые
+цифры — модули, карты, БП, мощность, закупка и продажа. Список «Входящие заявки» показывает
+готовую цену сразу и сортирует заявки по сумме, не открывая каждую.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from typing import Optional
+
+from catalog import get_catalog
+from lead_payload import MIN_EXCHANGE_RATE, form_values, to_float
+from price_store import PriceStore
+from quote_cache import cached_quote
+from quote_engine import MOUNT_CABINET, MOUNT_MONOLITH, VAT_OFF, VAT_ON, QuoteInputs, QuoteResult
+
+# Цены из общего кэша (price_store), которые подставляются в расчёт, если заявка их не задала
+_STORED_PRICE_FIELDS = {
+    "cbr_usd_rate": "exchange_rate",
+    "profile_40x20_rub_m": "profile_40x20_rub_m",
+    "screw_4x16_rub_each": "screw_4x16_rub_each",
+    "rivet_m6_rub_each": "rivet_m6_rub_each",
+    "bolt_m6_rub_each": "bolt_m6_rub_each",
+}
+HEADLINE_FIELDS = (
+    "real_width",
+    "real_height",
+    "area_m2",
+    "total_modules_order",
+    "num_cards_reserve",
+    "num_psu_reserve",
+    "peak_power_screen_kw",
+    "total_buy_usd",
+    "total_buy_rub",
+    "sale_total_usd",
+    "sale_total_rub",
+)
+
+# Ключи state калькулятора (сохранённая сессия в заявке), которые влияют на расчёт
+QUOTE_STATE_KEYS = (
+    "width_input",
+    "height_mm",
+    "calc_env_key",
+    "calc_module_name",
+    "calc_mount_type",
+    "calc_vat_mode",
+    "calc_margin_pct",
+    "calc_logistics_rub",
+    "calc_installation_rub",
+    "calc_exchange_rate",
+)
+
+_price_store: Optional[PriceStore] = None
+
+
+def _stored_prices() -> dict:
+    global _price_store
+    if _price_store is None:
+        _price_store = PriceStore()
+    try:
+        stored = _price_store.read_all()
+    except (OSError, sqlite3.Error):  # кэш цен недоступен — считаем по значениям по умолчанию
+        return {}
+    return {
+        field: stored[key].value
+        for key, field in _STORED_PRICE_FIELDS.items()
+        if key in stored and stored[key].value is not None
+    }
+
+
+def _number(values: dict, key: str, minimum: float) -> Optional[float]:
+    value = to_float(values.get(key), None)
+    return None if value is None else max(minimum, value)
+
+
+def inputs_from_payload(payload: dict) -> QuoteInputs:
+    """
+    QuoteInputs заявки: значения формы, которые подставит в калькулятор «Открыть заявку»
+    (lead_payload), поверх значений по умолчанию калькулятора и кэша цен.
+    """
+    values, _ = form_values(payload, QUOTE_STATE_KEYS)
+    catalog = get_catalog()
+    fields: dict = dict(_stored_prices())
+
+    for key, field in (("width_input", "width_mm"), ("height_mm", "height_mm")):
+        if key in values:
+            fields[field] = values[key]
+
+    module_name = values.get("calc_module_name")
+    env = values.get("calc_env_key")
+    if module_name and catalog.module(str(module_name)) is not None:
+        fields["module_name"] = str(module_name)
+    elif env in catalog.modules_by_env and catalog.modules_by_env[env]:
+        fields["module_name"] = catalog.modules_by_env[env][0]["name"]
+
+    if values.get("calc_mount_type") in (MOUNT_MONOLITH, MOUNT_CABINET):
+        fields["mount_type"] = values["calc_mount_type"]
+    if values.get("calc_vat_mode") in (VAT_ON, VAT_OFF):
+        fields["vat_mode"] = values["calc_vat_mode"]
+
+    for key, field, minimum in (
+        ("calc_margin_pct", "margin_percent", 0.0),
+        ("calc_logistics_rub", "logistics_rub", 0.0),
+        ("calc_installation_rub", "installation_rub", 0.0),
+        ("calc_exchange_rate", "exchange_rate", MIN_EXCHANGE_RATE),
+    ):
+        value = _number(values, key, minimum)
+        if value is not None:
+            fields[field] = value
+    return QuoteInputs(**fields)
+
+
+def headline(result: QuoteResult) -> dict:
+    return {name: getattr(result, name) for name in HEADLINE_FIELDS}
+
+
+def quote_lead(payload) -> dict:
+    """Ключевые цифры расчёта заявки либо {"error": …}, если по ней посчитать нельзя."""
+    if not isinstance(payload, dict):
+        return {"error": "Некорректный формат заявки"}
+    try:
+        inputs = inputs_from_payload(payload)
+        out = headline(cached_quote(inputs))
+    except (ValueError, KeyError, TypeError, ArithmeticError) as e:
+        return {"error": str(e)}
+    out["module_name"] = inputs.module_name
+    out["mount_type"] = inputs.mount_type
+    out["exchange_rate"] = inputs.exchange_rate
+    return out
+
+
+def attach_quote(document: dict) -> dict:
+    """
+    Запись журнала с полем "quote" (если его ещё нет) — перед записью в lead_store.
+    Не бросает исключений: расчёт не должен мешать сохранению заявки.
+    """
+    if "quote" in document:
+        return document
+    try:
+        quote = quote_lead(document.get("payload", document))
+    except Exception as e:  # непредусмотренный сбой расчёта — заявка пишется без цены
+        quote = {"error": f"{type(e).__name__}: {e}"}
+    return {**document, "quote": quote}
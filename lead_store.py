@@ -0,0 +1,485 @@
+"""
+Журнал входящих заявок: вместо файла на заявку — сегменты NDJSON, в которые только
+дописывают (incoming_requests/leads-000001.ndjson, …), и компактный индекс leads.idx
+с записями фиксированной длины: сегмент, смещение, длина, флаги. Номер записи в индексе
+(seq) — адрес заявки: чтение — один seek, добавление — дозапись в конец.
+
+Удаление не трогает сегменты: в журнал дописывается надгробие {"deleted_seq": n},
+а у записи n в индексе ставится флаг. Индекс восстанавливается из сегментов: при каждой
+записи хвост журнала, не попавший в индекс (обрыв процесса между fsync сегмента
+и записью индекса), доиндексируется, недописанная строка отрезается.
+
+Для списка в приложении рядом ведётся SQLite-таблица заявок (lead_index): строка
+добавляется вместе с записью в журнал и догоняется из журнала, если отстала.
+
+Пишут вебхук и приложение; запись сериализуется файловой блокировкой (fcntl; где её нет —
+только блокировкой внутри процесса). Старые файлы incoming_requests/*.json при первом открытии
+журнала переносятся в него, а сами файлы — в incoming_requests/legacy/.
+"""
+
+from __future__ import annotations
+
+import datetime
+import io
+import json
+import os
+import re
+import sqlite3
+import struct
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from lead_index import (
+    LEAD_DB_NAME,
+    LEAD_PAGE_SIZE,
+    ORDER_NEW,
+    STATUS_DELETED,
+    STATUS_NEW,
+    LeadIndex,
+    LeadRow,
+    dedup_key,
+    request_key,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+INCOMING_DIR = Path(
+    os.environ.get("MEDIALIVE_INCOMING_DIR") or Path(__file__).resolve().parent / "incoming_requests"
+)
+SEGMENT_MAX_BYTES = 8 * 1024 * 1024
+SEGMENT_PREFIX = "leads-"
+SEGMENT_SUFFIX = ".ndjson"
+INDEX_NAME = "leads.idx"
+LOCK_NAME = ".leads.lock"
+LEGACY_DIR_NAME = "legacy"  # сюда уходят файлы старого формата после переноса в журнал
+
+# Запись индекса: номер сегмента, смещение, длина строки, флаги (+3 байта выравнивания)
+_ENTRY = struct.Struct("<IQIB3x")
+FLAG_DELETED = 1  # заявка удалена
+FLAG_TOMBSTONE = 2  # строка-надгробие, не заявка
+
+
+@dataclass(frozen=True)
+class LeadRef:
+    seq: int  # номер записи в индексе
+    segment: int
+    offset: int
+    length: int
+    flags: int
+
+    @property
+    def deleted(self) -> bool:
+        return bool(self.flags & FLAG_DELETED)
+
+    @property
+    def is_lead(self) -> bool:
+        return not self.flags & FLAG_TOMBSTONE
+
+
+def safe_part(value: str) -> str:
+    sanitized = re.sub(r"[^\w\-.()\s\u0400-\u04FF]", "_", (value or "").strip(), flags=re.UNICODE)
+    sanitized = re.sub(r"\s+", "_", sanitized).strip("_")
+    return sanitized[:80] or "request"
+
+
+def project_label(payload: dict) -> str:
+    return str(payload.get("project_name") or payload.get("project") or payload.get("client") or "")
+
+
+def new_lead_id(payload: dict, now: Optional[datetime.datetime] = None) -> str:
+    """Id заявки в прежнем формате имени файла: время_проект_id-запроса_случайный суффикс."""
+    ts = (now or datetime.datetime.now()).strftime("%Y%m%d_%H%M%S")
+    return f"{ts}_{safe_part(project_label(payload))}_{safe_part(request_key(payload))}_{uuid.uuid4().hex[:6]}"
+
+
+def _row_ref(row: LeadRow) -> LeadRef:
+    return LeadRef(row.seq, row.segment, row.offset, row.length, 0)
+
+
+def _encode(document: dict) -> bytes:
+    return (json.dumps(document, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class LeadStore:
+    def __init__(self, root: Path = INCOMING_DIR, segment_max_bytes: int = SEGMENT_MAX_BYTES):
+        self.root = Path(root)
+        self.segment_max_bytes = segment_max_bytes
+        self._lock = threading.Lock()
+        self._ready = False
+        self.table = LeadIndex(self.root / LEAD_DB_NAME)
+
+    # --- файлы ---
+    @property
+    def index_path(self) -> Path:
+        return self.root / INDEX_NAME
+
+    def segment_path(self, segment: int) -> Path:
+        return self.root / f"{SEGMENT_PREFIX}{segment:06d}{SEGMENT_SUFFIX}"
+
+    def _segments(self) -> list[int]:
+        if not self.root.is_dir():
+            return []
+        out = []
+        for p in self.root.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"):
+            try:
+                out.append(int(p.name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)]))
+            except ValueError:
+                continue
+        return sorted(out)
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.root / LOCK_NAME, "a+b") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def recover(self) -> None:
+        """Восстановить индекс по сегментам и перенести старые *.json; один раз на процесс."""
+        with self._write_lock():
+            self._import_legacy(self._recover())
+            self._ready = True
+
+    # --- индекс ---
+    def _ensure_ready(self) -> None:
+        if not self._ready:
+            try:
+                self.recover()
+            except OSError:
+                pass  # каталог только для чтения — читаем индекс как есть
+
+    def refs(self) -> list[LeadRef]:
+        """Все записи индекса (вместе с надгробиями и удалёнными) в порядке добавления."""
+        self._ensure_ready()
+        return self._read_index()
+
+    def ref(self, seq: int) -> Optional[LeadRef]:
+        """Одна запись индекса — один seek, без чтения всего leads.idx."""
+        self._ensure_ready()
+        if seq < 0:
+            return None
+        try:
+            with open(self.index_path, "rb") as idx:
+                idx.seek(seq * _ENTRY.size)
+                data = idx.read(_ENTRY.size)
+        except FileNotFoundError:
+            return None
+        if len(data) < _ENTRY.size:
+            return None
+        return LeadRef(seq, *_ENTRY.unpack(data))
+
+    def _read_index(self) -> list[LeadRef]:
+        try:
+            data = self.index_path.read_bytes()
+        except FileNotFoundError:
+            return []
+        usable = len(data) - len(data) % _ENTRY.size
+        return [
+            LeadRef(i, *fields)
+            for i, fields in enumerate(_ENTRY.iter_unpack(memoryview(data)[:usable]))
+        ]
+
+    def page(
+        self, query: str = "", page: int = 0, page_size: int = LEAD_PAGE_SIZE, order: str = ORDER_NEW
+    ) -> tuple[list[LeadRow], bool]:
+        """Страница списка заявок из SQLite-таблицы и признак следующей страницы."""
+        self._ensure_ready()
+        return self.table.page(query, page, page_size, order=order)
+
+    def leads(self) -> list[LeadRef]:
+        """Неудалённые заявки в порядке поступления."""
+        return [r for r in self.refs() if r.is_lead and not r.deleted]
+
+    def count(self) -> int:
+        """Неудалённые заявки: COUNT по SQLite-таблице, а при её сбое — по всему индексу журнала."""
+        self._ensure_ready()
+        try:
+            return self.table.count()
+        except sqlite3.Error:
+            return len(self.leads())
+
+    # --- чтение ---
+    def read(self, ref: LeadRef) -> dict:
+        with open(self.segment_path(ref.segment), "rb") as f:
+            f.seek(ref.offset)
+            return json.loads(f.read(ref.length))
+
+    def read_row(self, row: LeadRow) -> dict:
+        return self.read(_row_ref(row))
+
+    def find(self, key: str) -> Optional[LeadRow]:
+        """Заявка с ключом идемпотентности key (dedup_key), если уже в журнале; None при сбое SQLite."""
+        self._ensure_ready()
+        try:
+            return self.table.find_key(key)
+        except sqlite3.Error:
+            return None
+
+    def get(self, seq: int) -> Optional[dict]:
+        ref = self.ref(seq)
+        if ref is None or not ref.is_lead or ref.deleted:
+            return None
+        try:
+            return self.read(ref)
+        except (OSError, ValueError):
+            return None
+
+    def scan(self, refs: Optional[Iterable[LeadRef]] = None) -> Iterator[tuple[LeadRef, dict]]:
+        """Последовательное чтение заявок (по умолчанию — всех неудалённых) с одним open на сегмент."""
+        refs = self.leads() if refs is None else refs
+        current, f = None, None
+        try:
+            for ref in refs:
+                if ref.segment != current:
+                    if f is not None:
+                        f.close()
+                    f, current = open(self.segment_path(ref.segment), "rb"), ref.segment
+                f.seek(ref.offset)
+                try:
+                    yield ref, json.loads(f.read(ref.length))
+                except ValueError:
+                    continue
+        finally:
+            if f is not None:
+                f.close()
+
+    # --- запись (все методы — под _write_lock) ---
+    def _entry(self, idx, seq: int) -> LeadRef:
+        idx.seek(seq * _ENTRY.size)
+        return LeadRef(seq, *_ENTRY.unpack(idx.read(_ENTRY.size)))
+
+    def _set_flag(self, seq: int, flag: int) -> bool:
+        with open(self.index_path, "r+b") as idx:
+            r = self._entry(idx, seq)
+            if r.flags & flag:
+                return False
+            idx.seek(seq * _ENTRY.size)
+            idx.write(_ENTRY.pack(r.segment, r.offset, r.length, r.flags | flag))
+            return True
+
+    def _recover(self) -> int:
+        """Привести индекс в соответствие с сегментами; вернуть число записей индекса."""
+        with open(self.index_path, "ab") as idx:
+            count = idx.tell() // _ENTRY.size
+            if idx.tell() % _ENTRY.size:
+                idx.truncate(count * _ENTRY.size)  # недописанная запись индекса
+        segments = self._segments()
+        if not segments:
+            return count
+        if count:
+            with open(self.index_path, "rb") as idx:
+                last = self._entry(idx, count - 1)
+            segment, position = last.segment, last.offset + last.length
+        else:
+            segment, position = segments[0], 0
+        new_entries: list[LeadRef] = []
+        deletes: list[int] = []
+        for seg in (s for s in segments if s >= segment):
+            path = self.segment_path(seg)
+            offset = position if seg == segment else 0
+            if path.stat().st_size == offset:
+                continue  # обычный случай: хвоста нет, читать нечего
+            with open(path, "rb") as f:
+                f.seek(offset)
+                tail = f.read()
+            for line in io.BytesIO(tail):
+                if not line.endswith(b"\n"):
+                    # Строка, недописанная при обрыве: отрезаем, следующая запись начнётся с неё
+                    os.truncate(path, offset)
+                    break
+                flags = 0
+                try:
+                    doc = json.loads(line)
+                    if isinstance(doc, dict) and "deleted_seq" in doc:
+                        flags = FLAG_TOMBSTONE
+                        deletes.append(int(doc["deleted_seq"]))
+                except ValueError:
+                    flags = FLAG_DELETED  # битая строка — в индексе, но не в списке заявок
+                new_entries.append(LeadRef(count + len(new_entries), seg, offset, len(line), flags))
+                offset += len(line)
+        if new_entries:
+            with open(self.index_path, "ab") as idx:
+                idx.write(b"".join(_ENTRY.pack(r.segment, r.offset, r.length, r.flags) for r in new_entries))
+            count += len(new_entries)
+        for seq in deletes:
+            if 0 <= seq < count:
+                self._set_flag(seq, FLAG_DELETED)
+        self._sync_table(count)
+        return count
+
+    def _sync_table(self, count: int) -> None:
+        """
+        Догнать SQLite-таблицу до журнала: строки для записей после последней известной ей
+        (обычно их нет — таблица пишется вместе с журналом; после сбоя или удаления файла
+        таблицы она заполняется из журнала заново). Сбой SQLite не мешает записи в журнал.
+        """
+        try:
+            start = self.table.max_seq() + 1
+            if start >= count:
+                return
+            with open(self.index_path, "rb") as idx:
+                entries = [self._entry(idx, seq) for seq in range(start, count)]
+            rows, deleted = [], []
+            for ref in entries:
+                try:
+                    doc = self.read(ref)
+                except (OSError, ValueError):
+                    doc = {}
+                if not ref.is_lead:
+                    deleted.append(doc.get("deleted_seq"))
+                    continue
+                status = STATUS_DELETED if ref.deleted else STATUS_NEW
+                rows.append((ref.seq, ref.segment, ref.offset, ref.length, doc, status))
+            self.table.add(rows)
+            for seq in deleted:
+                if isinstance(seq, int):
+                    self.table.set_status(seq, STATUS_DELETED)
+        except sqlite3.Error:
+            pass
+
+    def _append_lines(self, count: int, lines: list[tuple[bytes, int]]) -> list[LeadRef]:
+        """Дописать строки (с флагами индекса) в активный сегмент: один fsync на сегмент."""
+        segments = self._segments()
+        segment = segments[-1] if segments else 1
+        added: list[LeadRef] = []
+        f = open(self.segment_path(segment), "ab")
+        try:
+            for line, flags in lines:
+                if f.tell() and f.tell() + len(line) > self.segment_max_bytes:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    f.close()
+                    segment += 1
+                    f = open(self.segment_path(segment), "ab")
+                added.append(LeadRef(count + len(added), segment, f.tell(), len(line), flags))
+                f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+        # Индекс — после fsync данных; без своего fsync: при сбое он восстанавливается из сегментов
+        with open(self.index_path, "ab") as idx:
+            idx.write(b"".join(_ENTRY.pack(r.segment, r.offset, r.length, r.flags) for r in added))
+        return added
+
+    def append_batch(self, documents: list[dict]) -> list[LeadRef]:
+        """
+        Дописать заявки; результат — по адресу на каждую. Идемпотентно: заявка, ключ которой
+        (dedup_key) уже есть в журнале или раньше в этой же пачке, не пишется, вместо неё
+        возвращается адрес первой записи.
+        """
+        if not documents:
+            return []
+        with self._write_lock():
+            count = self._import_legacy(self._recover())
+            result: list[Optional[LeadRef]] = [None] * len(documents)
+            new_docs: list[tuple[int, dict]] = []
+            first_in_batch: dict[str, int] = {}
+            repeats: list[tuple[int, int]] = []  # (позиция повтора, позиция первой в пачке)
+            for i, doc in enumerate(documents):
+                key = dedup_key(doc.get("payload", doc))
+                if key in first_in_batch:
+                    repeats.append((i, first_in_batch[key]))
+                    continue
+                try:
+                    existing = self.table.find_key(key)
+                except sqlite3.Error:
+                    existing = None
+                if existing is not None:
+                    result[i] = _row_ref(existing)
+                    continue
+                first_in_batch[key] = i
+                new_docs.append((i, doc))
+            added = self._append_lines(count, [(_encode(d), 0) for _, d in new_docs]) if new_docs else []
+            for (i, _), ref in zip(new_docs, added):
+                result[i] = ref
+            for i, first in repeats:
+                result[i] = result[first]
+            try:
+                self.table.add(
+                    (r.seq, r.segment, r.offset, r.length, d, STATUS_NEW)
+                    for (_, d), r in zip(new_docs, added)
+                )
+            except sqlite3.Error:
+                pass  # догонится из журнала при следующей записи
+            return result
+
+    def append(self, document: dict) -> LeadRef:
+        return self.append_batch([document])[0]
+
+    def delete(self, seq: int) -> bool:
+        with self._write_lock():
+            count = self._recover()
+            if not 0 <= seq < count:
+                return False
+            with open(self.index_path, "rb") as idx:
+                ref = self._entry(idx, seq)
+            if not ref.is_lead or ref.deleted:
+                return False
+            self._append_lines(count, [(_encode({"deleted_seq": seq}), FLAG_TOMBSTONE)])
+            self._set_flag(seq, FLAG_DELETED)
+            try:
+                self.table.set_status(seq, STATUS_DELETED)
+            except sqlite3.Error:
+                pass
+            return True
+
+    def _import_legacy(self, count: int) -> int:
+        """
+        Перенести заявки старого формата (файл *.json на заявку) в журнал, а файлы — в legacy/.
+        Заявка, id которой уже есть в таблице (обрыв между записью и переносом файла),
+        второй раз не пишется; нечитаемые файлы тоже уходят в legacy/ и больше не читаются.
+        """
+        files = sorted(self.root.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        if not files:
+            return count
+        lines, seen = [], set()
+        for path in files:
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if not isinstance(data, dict) or path.stem in seen:
+                continue
+            try:
+                if self.table.find_id(path.stem) is not None:
+                    continue
+            except sqlite3.Error:
+                pass
+            seen.add(path.stem)
+            document = {
+                "id": path.stem,
+                "received_at": data.get("received_at"),
+                "source_ip": data.get("source_ip"),
+                "payload": data.get("payload", data),
+            }
+            lines.append((_encode(document), 0))
+        if lines:
+            count += len(self._append_lines(count, lines))
+            self._sync_table(count)
+        legacy = self.root / LEGACY_DIR_NAME
+        legacy.mkdir(exist_ok=True)
+        for path in files:
+            target, n = legacy / path.name, 1
+            while target.exists():
+                target, n = legacy / f"{path.stem}-{n}{path.suffix}", n + 1
+            try:
+                os.replace(path, target)
+            except OSError:
+                pass
+        return count
+
+default_store = LeadStore()
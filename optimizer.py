@@ -0,0 +1,181 @@
+"""
+Подбор самой дешёвой допустимой комплектации: процессор × приёмная карта × HUB × БП
+× кратность модулей на карту / на БП для заданного размера и модуля.
+
+Стоимость закупки раскладывается на независимые группы (процессор; карты с хабами,
+патч-кордами и кабелями питания; БП с пластинами, саморезами и перемычками), поэтому
+каждая группа оптимизируется отдельно методом ветвей и границ: кандидаты сортируются
+по нижней оценке стоимости, и перебор обрывается, как только оценка не лучше найденного.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import math
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from catalog import PROCESSOR_LOAD_PX_PER_PORT, get_catalog
+from quote_engine import (
+    CTRL_ASYNC,
+    CTRL_SYNC,
+    MODULE_H_MM,
+    MODULE_W_MM,
+    QuoteInputs,
+    QuoteResult,
+    compute_port_load,
+    compute_quote,
+    controllers_for,
+    find_module,
+    resolve_components,
+)
+
+# Варианты из UI (блоки 3 и 4)
+MODULES_PER_CARD_OPTIONS = (6, 8, 10, 12, 14, 16, 18)
+MODULES_PER_PSU_OPTIONS = (4, 6, 8, 10, 12, 16)
+
+
+@dataclass(frozen=True)
+class OptimizerResult:
+    inputs: QuoteInputs
+    quote: QuoteResult
+    evaluated: int  # сколько кандидатов посчитано полностью (после отсечения)
+    pruned: int  # сколько отсечено по нижней оценке
+
+
+def _reserve_extra(inputs: QuoteInputs) -> int:
+    return 1 if (inputs.reserve_enabled and inputs.reserve_psu_cards) else 0
+
+
+def _card_group_usd(q: QuoteResult) -> float:
+    return (
+        q.buy_cards_total
+        + q.buy_hubs_total
+        + q.buy_patch_cords_total
+        + q.buy_card_power_cables_total
+    )
+
+
+def _psu_group_usd(q: QuoteResult) -> float:
+    return (
+        q.buy_psu_total
+        + q.buy_metal_plates_usd
+        + q.buy_screws_4x16_usd
+        + q.buy_power_jumpers_total
+    )
+
+
+def _cheapest_processor(
+    total_px: float, hot_backup: bool, categories: Sequence[str]
+) -> Optional[tuple[str, dict]]:
+    required = math.ceil(total_px / PROCESSOR_LOAD_PX_PER_PORT) * (2 if hot_backup else 1)
+    controllers = get_catalog().controllers
+    best = None
+    for category in categories:
+        for proc in controllers_for(category):
+            spec = controllers[proc["name"]]
+            if spec.ports < required:
+                continue
+            if best is None or spec.price_usd < best[1]["price_usd"]:
+                best = (category, proc)
+    return best
+
+
+def find_cheapest_configuration(
+    base: QuoteInputs,
+    categories: Sequence[str] = (CTRL_SYNC, CTRL_ASYNC),
+    cards: Optional[Sequence[dict]] = None,
+    psus: Optional[Sequence[dict]] = None,
+    psu_headroom: float = 1.0,
+) -> Optional[OptimizerResult]:
+    """
+    Возвращает самую дешёвую по закупке (total_buy_usd) допустимую комплектацию
+    или None, если ни один процессор не тянет нужное число портов / ни один БП не тянет модули.
+    Размер, модуль, монтаж, ЗИП и цены берутся из base.
+    Ограничения: порты процессора (с учётом Backup ×2), мощность БП:
+    модулей на БП × max_power ≤ max_w × psu_headroom.
+    """
+    module = find_module(base.module_name)
+    if module is None:
+        raise ValueError(f"Модуль не найден в прайсе: {base.module_name}")
+    cat = get_catalog()
+    cards = list(cat.cards if cards is None else cards)
+    psus = list(cat.psus if psus is None else psus)
+    extra = _reserve_extra(base)
+    evaluated = 0
+    pruned = 0
+
+    ports = compute_port_load(
+        base.width_mm, base.height_mm, module["pitch"], base.processor_name, base.hot_backup
+    )
+    picked = _cheapest_processor(ports.total_px, base.hot_backup, categories)
+    if picked is None:
+        return None
+    category, proc = picked
+    current = dataclasses.replace(base, controller_category=category, processor_name=proc["name"])
+    total_modules = math.ceil(base.width_mm / MODULE_W_MM) * math.ceil(base.height_mm / MODULE_H_MM)
+
+    # --- Группа «карты»: карта × кратность × HUB (+ патч-корды и кабели питания по числу карт) ---
+    rows = resolve_components(current)
+    per_card_wiring = rows["patch_cord"]["price_usd"] + rows["card_power_cable"]["price_usd"]
+    cheapest_hub = min(cat.hubs, key=lambda h: h["price_usd"]) if cat.hubs else None
+    card_candidates = []
+    for card in cards:
+        res = cat.card_max_pixels(card["name"])
+        by_pix = math.ceil(ports.total_px / (res[0] * res[1]))
+        n_min = max(math.ceil(total_modules / max(MODULES_PER_CARD_OPTIONS)), by_pix) + extra
+        unit = card["price_usd"] + per_card_wiring
+        if card["type"] == "A" and cheapest_hub is not None:
+            unit += cheapest_hub["price_usd"]
+        card_candidates.append((n_min * unit, card))
+    card_candidates.sort(key=lambda c: c[0])
+
+    best_q: Optional[QuoteResult] = None
+    best_in = current
+    best_group = math.inf
+    for bound, card in card_candidates:
+        if bound >= best_group:
+            pruned += 1
+            continue
+        hubs = [h["name"] for h in cat.hubs] if card["type"] == "A" else [None]
+        for mpc in MODULES_PER_CARD_OPTIONS:
+            for hub_name in hubs:
+                cand = dataclasses.replace(
+                    current, card_name=card["name"], modules_per_card=mpc, hub_name=hub_name
+                )
+                q = compute_quote(cand)
+                evaluated += 1
+                if best_q is None or q.total_buy_usd < best_q.total_buy_usd:
+                    best_q, best_in = q, cand
+                    best_group = _card_group_usd(q)
+    current = best_in
+
+    # --- Группа «БП»: модель × модулей на БП (с ограничением по мощности) ---
+    psu_candidates = []
+    for psu in psus:
+        valid = [
+            m for m in MODULES_PER_PSU_OPTIONS if m * module["max_power"] <= psu["max_w"] * psu_headroom
+        ]
+        if not valid:
+            continue
+        n_min = math.ceil(total_modules / max(valid)) + extra
+        psu_candidates.append((n_min * psu["price_usd"], psu, valid))
+    if not psu_candidates:
+        return None
+    psu_candidates.sort(key=lambda c: c[0])
+
+    best_q = None
+    best_group = math.inf
+    for bound, psu, valid in psu_candidates:
+        if bound >= best_group:
+            pruned += 1
+            continue
+        for mpp in valid:
+            cand = dataclasses.replace(current, psu_name=psu["name"], modules_per_psu=mpp)
+            q = compute_quote(cand)
+            evaluated += 1
+            if best_q is None or q.total_buy_usd < best_q.total_buy_usd:
+                best_q, best_in = q, cand
+                best_group = _psu_group_usd(q)
+
+    return OptimizerResult(inputs=best_in, quote=best_q, evaluated=evaluated, pruned=pruned)
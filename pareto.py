@@ -0,0 +1,88 @@
+"""
+Парето-фронт модулей для заданного размера: закупка ↓, пиковая мощность ↓, яркость ↑, пиксели ↑.
+Квоты берутся из пакетного расчёта (batch_quote), фронт — сортировочный skyline (SFS).
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+from batch_quote import BatchQuote, quote_batch
+from catalog import get_catalog
+from quote_engine import QuoteInputs
+
+# (поле BatchQuote, направление: +1 — меньше лучше, -1 — больше лучше)
+PARETO_OBJECTIVES = (
+    ("total_buy_usd", 1),
+    ("peak_power_kw", 1),
+    ("brightness", -1),
+    ("pixels", -1),
+)
+
+
+def pareto_mask(costs: np.ndarray) -> np.ndarray:
+    """
+    costs — (m, k) или (n, m, k), все критерии на минимизацию; для 3-D фронт считается
+    отдельно по каждой из n групп. Возвращает маску недоминируемых точек формы (m,) / (n, m).
+    Лексикографическая сортировка гарантирует, что доминирующая точка идёт раньше доминируемой,
+    поэтому каждую точку достаточно сравнить только с уже найденным фронтом; проход по m
+    векторизован сразу по всем группам.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    single = costs.ndim == 2
+    if single:
+        costs = costs[np.newaxis]
+    n, m, _ = costs.shape
+    order = np.lexsort(np.moveaxis(costs, -1, 0)[::-1], axis=-1)
+    ranked = np.take_along_axis(costs, order[..., np.newaxis], axis=1)
+    front = np.zeros((n, m), dtype=bool)
+    for t in range(m):
+        p = ranked[:, t : t + 1]
+        win = ranked[:, :t]
+        dominated = np.all(win <= p, axis=-1) & np.any(win < p, axis=-1) & front[:, :t]
+        front[:, t] = ~dominated.any(axis=1)
+    mask = np.zeros_like(front)
+    np.put_along_axis(mask, order, front, axis=1)
+    return mask[0] if single else mask
+
+
+def _objective_matrix(batch: BatchQuote) -> np.ndarray:
+    return np.stack([sign * getattr(batch, name) for name, sign in PARETO_OBJECTIVES], axis=-1)
+
+
+def pareto_frontiers(
+    widths_mm: Sequence[int],
+    heights_mm: Sequence[int],
+    modules: Optional[Sequence[dict]] = None,
+    inputs: Optional[QuoteInputs] = None,
+) -> tuple[BatchQuote, np.ndarray]:
+    """Пакетный расчёт для N размеров и маска фронта (N, M) — фронт считается по каждому размеру."""
+    modules = list(get_catalog().modules if modules is None else modules)
+    batch = quote_batch(widths_mm, heights_mm, modules, inputs)
+    return batch, pareto_mask(_objective_matrix(batch))
+
+
+def module_frontier(
+    width_mm: int,
+    height_mm: int,
+    modules: Optional[Sequence[dict]] = None,
+    inputs: Optional[QuoteInputs] = None,
+) -> list[dict]:
+    """Строки фронта для одного размера, по возрастанию закупки."""
+    batch, masks = pareto_frontiers([width_mm], [height_mm], modules, inputs)
+    rows = []
+    for j in np.flatnonzero(masks[0]):
+        rows.append(
+            {
+                "module_name": batch.module_names[j],
+                "total_buy_usd": round(float(batch.total_buy_usd[0, j]), 2),
+                "sale_total_rub": round(float(batch.sale_total_rub[0, j]), 2),
+                "peak_power_kw": round(float(batch.peak_power_kw[0, j]), 2),
+                "brightness": int(batch.brightness[0, j]),
+                "pixels": int(batch.pixels[0, j]),
+            }
+        )
+    rows.sort(key=lambda r: r["total_buy_usd"])
+    return rows
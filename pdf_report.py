@@ -8,10 +8,11 @@ from __future__ import annotations
 import os
 import re
 import sys
-import urllib.request
 from pathlib import Path
 from typing import Any, List, Tuple
 
+from http_client import fetch as http_fetch
+
 FONT_FAMILY = "MLReport"  # произвольное имя семейства для add_font
 EMBEDDED_FONTS_DIR = Path(__file__).resolve().parent / "fonts"
 NOTO_REGULAR_TTF = EMBEDDED_FONTS_DIR / "NotoSans-Regular.ttf"
@@ -105,11 +106,13 @@ def _download_noto_fonts_if_missing() -> None:
     try:
         EMBEDDED_FONTS_DIR.mkdir(parents=True, exist_ok=True)
         if not NOTO_REGULAR_TTF.is_file():
-            with urllib.request.urlopen(NOTO_FONT_URLS["regular"], timeout=20) as resp:
-                NOTO_REGULAR_TTF.write_bytes(resp.read())
+            NOTO_REGULAR_TTF.write_bytes(
+                http_fetch(NOTO_FONT_URLS["regular"], timeout=20, conditional=False)
+            )
         if not NOTO_BOLD_TTF.is_file():
-            with urllib.request.urlopen(NOTO_FONT_URLS["bold"], timeout=20) as resp:
-                NOTO_BOLD_TTF.write_bytes(resp.read())
+            NOTO_BOLD_TTF.write_bytes(
+                http_fetch(NOTO_FONT_URLS["bold"], timeout=20, conditional=False)
+            )
     except Exception:
         # Если сеть недоступна — оставляем текущую логику fallback по системным шрифтам.
         return
@@ -383,9 +386,9 @@ def build_led_kp_mvp_pdf(ctx: dict[str, Any]) -> bytes:
     section("Условия")
     pdf.set_font(FONT_FAMILY, "", 9.5)
     pdf.set_text_color(31, 41, 55)
-    pdf.multi_cell(0, 5.5, f"Оплата: {ctx.get('note_terms', '100% предоплата по счёту.')}")
-    pdf.multi_cell(0, 5.5, f"Срок поставки: {ctx.get('note_lead_time', 'по договорённости.')}")
-    pdf.multi_cell(0, 5.5, f"Гарантия: {ctx.get('note_warranty', '3 года.')}")
+    pdf.multi_cell(0, 5.5, f"Оплата: {ctx.get('note_terms', '100% предоплата по счёту.')}", new_x="LMARGIN", new_y="NEXT")
+    pdf.multi_cell(0, 5.5, f"Срок поставки: {ctx.get('note_lead_time', 'по договорённости.')}", new_x="LMARGIN", new_y="NEXT")
+    pdf.multi_cell(0, 5.5, f"Гарантия: {ctx.get('note_warranty', '3 года.')}", new_x="LMARGIN", new_y="NEXT")
 
     out = pdf.output()
     if isinstance(out, (bytes, bytearray)):
@@ -0,0 +1,134 @@
+"""
+Замеры прогона скрипта для отладочной панели: время секций app.py (водопад), время
+кэшируемых функций и их попадания/промахи, скользящие p50/p95 по секциям в процессе.
+Модуль без Streamlit. Прогон привязан к потоку скрипта; если замер не начат,
+все вызовы — пустые (выключенная панель почти ничего не стоит).
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+PERF_HISTORY_RUNS = 200  # сколько последних прогонов держать для p50/p95
+RUN_TOTAL = "Весь прогон"
+
+
+@dataclass(frozen=True)
+class Span:
+    name: str
+    start_ms: float  # от начала прогона
+    duration_ms: float
+    depth: int  # 0 — секция скрипта, 1 — вызов функции внутри секции
+    cache_hit: Optional[bool] = None  # для кэшируемых функций
+
+
+class RunTimer:
+    """Секции идут подряд: mark(name) закрывает текущую и открывает следующую."""
+
+    def __init__(self) -> None:
+        self.t0 = time.perf_counter()
+        self.spans: list[Span] = []
+        self.cache_counts: dict[str, list[int]] = {}  # имя → [попадания, промахи]
+        self._section: Optional[tuple[str, float]] = None
+        self._misses: dict[str, int] = {}
+        self.finished = False
+
+    def _now_ms(self) -> float:
+        return (time.perf_counter() - self.t0) * 1000
+
+    def _close_section(self, now_ms: float) -> None:
+        if self._section is not None:
+            name, start = self._section
+            self.spans.append(Span(name, start, now_ms - start, 0))
+            self._section = None
+
+    def mark(self, name: str) -> None:
+        now_ms = self._now_ms()
+        self._close_section(now_ms)
+        self._section = (name, now_ms)
+
+    def cache_miss(self, name: str) -> None:
+        self._misses[name] = self._misses.get(name, 0) + 1
+
+    @contextlib.contextmanager
+    def timed(self, name: str, cache: bool = False) -> Iterator[None]:
+        misses_before = self._misses.get(name, 0)
+        start = self._now_ms()
+        try:
+            yield
+        finally:
+            hit = None
+            if cache:
+                hit = self._misses.get(name, 0) == misses_before
+                counts = self.cache_counts.setdefault(name, [0, 0])
+                counts[0 if hit else 1] += 1
+            self.spans.append(Span(name, start, self._now_ms() - start, 1, hit))
+
+    def finish(self) -> list[Span]:
+        now_ms = self._now_ms()
+        self._close_section(now_ms)
+        self.finished = True
+        spans = sorted(self.spans, key=lambda s: (s.start_ms, s.depth))
+        _record_history(spans, now_ms)
+        return spans
+
+
+_local = threading.local()
+_history_lock = threading.Lock()
+_history: dict[str, deque] = {}
+
+
+def _record_history(spans: list[Span], total_ms: float) -> None:
+    per_run: dict[str, float] = {RUN_TOTAL: total_ms}
+    for s in spans:
+        per_run[s.name] = per_run.get(s.name, 0.0) + s.duration_ms
+    with _history_lock:
+        for name, ms in per_run.items():
+            _history.setdefault(name, deque(maxlen=PERF_HISTORY_RUNS)).append(ms)
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    idx = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def percentiles() -> dict[str, tuple[float, float, int]]:
+    """Секция → (p50 мс, p95 мс, число прогонов) по последним PERF_HISTORY_RUNS прогонам."""
+    with _history_lock:
+        snapshot = {name: sorted(values) for name, values in _history.items()}
+    return {
+        name: (_percentile(v, 0.50), _percentile(v, 0.95), len(v)) for name, v in snapshot.items()
+    }
+
+
+def begin_run(enabled: bool) -> Optional[RunTimer]:
+    """Начало прогона скрипта в текущем потоке; enabled=False сбрасывает прежний замер."""
+    _local.run = RunTimer() if enabled else None
+    return _local.run
+
+
+def current_run() -> Optional[RunTimer]:
+    run = getattr(_local, "run", None)
+    return None if run is None or run.finished else run
+
+
+def mark(name: str) -> None:
+    run = current_run()
+    if run is not None:
+        run.mark(name)
+
+
+def cache_miss(name: str) -> None:
+    run = current_run()
+    if run is not None:
+        run.cache_miss(name)
+
+
+def timed(name: str, cache: bool = False):
+    run = current_run()
+    return run.timed(name, cache) if run is not None else contextlib.nullcontext()
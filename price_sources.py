@@ -0,0 +1,509 @@
+"""
+Автоподстановка цен: курс ЦБ РФ и крепёж/профиль с сайтов магазинов (Петрович, Lemana Pro).
+Модуль без Streamlit. fetch_* ходят в сеть синхронно; price_snapshot() отдаёт последние
+известные значения сразу, а загрузку запускает в фоновом потоке, чтобы не блокировать первый
+рендер страницы; источники опрашиваются параллельно под общим дедлайном. Удачные цены
+хранятся в общем SQLite-кэше (price_store) и переживают рестарт процесса; фоновый планировщик
+(start_price_refresher или `python price_sources.py`) прогревает кэш заранее.
+"""
+
+from __future__ import annotations
+
+import codecs
+import dataclasses
+import functools
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from catalog import (
+    BOLT_M6_6x16_DIN912_RUB_EACH_FALLBACK,
+    PROFILE_40X20_RUB_M_FALLBACK,
+    PROFILE_40X20_STICK_M,
+    RIVET_M6_SORMAT_RUB_EACH_FALLBACK,
+    SCREW_4X16_PRESS_RUB_EACH_FALLBACK,
+)
+from http_client import fetch as http_fetch
+from price_store import PriceStore, StoredPrice
+
+# --- КУРС ЦБ РФ (+1%) ---
+CBR_USD_RATE_FALLBACK = 95.0
+
+
+CBR_DAILY_URL = "http://www.cbr.ru/scripts/XML_daily.asp"
+CBR_USD_VALUTE_ID = "R01235"  # ID доллара США
+
+
+def _cbr_usd_from_xml(stream) -> Optional[float]:
+    """Курс USD из XML_daily потоково: разбор (и чтение сокета) останавливается на нужной Valute."""
+    for _, elem in ET.iterparse(stream):
+        if elem.tag != "Valute":
+            continue
+        if elem.get("ID") == CBR_USD_VALUTE_ID:
+            return float(elem.findtext("Value").replace(",", "."))
+        elem.clear()
+    return None
+
+
+def fetch_cbr_usd_rate() -> float:
+    try:
+        rate = http_fetch(
+            CBR_DAILY_URL, _cbr_usd_from_xml, headers={"User-Agent": "Mozilla/5.0"}, timeout=5
+        )
+        if rate is None:
+            return CBR_USD_RATE_FALLBACK
+        return rate * 1.01 # Возвращаем курс + 1%
+    except Exception:
+        return CBR_USD_RATE_FALLBACK # Резервный курс при ошибке сети
+
+
+LEMANA_RIVET_M6_SORMAT_URL = "https://lemanapro.ru/product/zaklepka-sormat-m6-mm-87937034/"
+LEMANA_BOLT_M6_6x16_DIN912_URL = (
+    "https://lemanapro.ru/product/vint-din-912-6x16-mm-ocinkovannyy-24-sht-89397382/"
+)
+
+PETROVICH_UA = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+PETROVICH_PRICE_PATTERNS = (
+    r'"price"\s*:\s*(\d{2,5})\s*[,}]',
+    r'data-price="(\d{3,5})"',
+    r'itemprop="price"\s+content="(\d+)"',
+)
+
+
+# --- ПОТОКОВЫЙ РАЗБОР HTML: страница читается кусками, сокет бросается, как только цена найдена ---
+HTML_SCAN_CHUNK_BYTES = 16 * 1024
+HTML_SCAN_MAX_BYTES = 1024 * 1024  # жёсткий предел на одну страницу
+HTML_PACK_WINDOW_CHARS = 120_000  # «N шт» ищется только в начале страницы
+# Хвост окна сканируется повторно: совпадение могло разрезаться границей куска
+_SCAN_OVERLAP_CHARS = 256
+# Одно объединённое выражение: цены PETROVICH_PRICE_PATTERNS, затем "finalPrice" и «N шт»
+_SCAN_RE = re.compile(
+    "|".join(
+        f"(?:{p})"
+        for p in PETROVICH_PRICE_PATTERNS + (r'"finalPrice"\s*:\s*(\d{2,6})', r"(\d+)\s*(?i:шт)")
+    )
+)
+_SCAN_FINAL_PRICE = len(PETROVICH_PRICE_PATTERNS) + 1
+_SCAN_PACK = _SCAN_FINAL_PRICE + 1
+
+
+@dataclass(frozen=True)
+class HtmlPrices:
+    price: Optional[int]  # первая цена 10..50000 по PETROVICH_PRICE_PATTERNS
+    final_price: Optional[int]  # первый "finalPrice" (запасной вариант для Lemana)
+    pack: Optional[int]  # первое «N шт» в пределах HTML_PACK_WINDOW_CHARS
+
+
+def scan_html_prices(
+    stream, want_pack: bool = False, max_bytes: int = HTML_SCAN_MAX_BYTES
+) -> HtmlPrices:
+    """
+    Один проход объединённым выражением по потоку ответа. Чтение прекращается, как только
+    найдена цена (и, при want_pack, упаковка или пройдено окно упаковки), либо на max_bytes.
+    Совпадения берутся в порядке следования на странице.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    buf = ""
+    base = 0  # смещение buf от начала страницы, в символах
+    pos = 0
+    read = 0
+    price = final_price = pack = None
+    while True:
+        chunk = stream.read(min(HTML_SCAN_CHUNK_BYTES, max_bytes - read)) if read < max_bytes else b""
+        read += len(chunk)
+        eof = not chunk
+        buf += decoder.decode(chunk, final=eof)
+        limit = len(buf) if eof else len(buf) - _SCAN_OVERLAP_CHARS
+        for m in _SCAN_RE.finditer(buf, pos):
+            if m.end() > limit:
+                break
+            pos = m.end()
+            kind = m.lastindex
+            value = int(m.group(kind))
+            if kind == _SCAN_PACK:
+                if pack is None and base + m.end() <= HTML_PACK_WINDOW_CHARS:
+                    pack = value
+            elif kind == _SCAN_FINAL_PRICE:
+                if final_price is None:
+                    final_price = value
+            elif price is None and 10 <= value <= 50000:
+                price = value
+        else:
+            pos = max(pos, limit)
+        pack_done = not want_pack or pack is not None or base + pos >= HTML_PACK_WINDOW_CHARS
+        if eof or (price is not None and pack_done):
+            return HtmlPrices(price=price, final_price=final_price, pack=pack)
+        buf = buf[pos:]
+        base += pos
+        pos = 0
+
+
+def _fetch_html_prices(url: str, want_pack: bool = False) -> HtmlPrices:
+    return http_fetch(
+        url,
+        functools.partial(scan_html_prices, want_pack=want_pack),
+        headers={"User-Agent": PETROVICH_UA},
+        timeout=12,
+    )
+
+
+def _petrovich_first_listed_price_raw(urls: tuple) -> Optional[int]:
+    """Первая похожая на цену цифра в HTML выдачи/каталога Петровича."""
+    for url in urls:
+        try:
+            raw = _fetch_html_prices(url).price
+            if raw is not None:
+                return raw
+        except Exception:
+            continue
+    return None
+
+
+def fetch_profile_40x20_rub_per_m_petrovich() -> tuple[float, str]:
+    """
+    Пытается взять цену с petrovich.ru (поиск профтрубы 40×20), кэш 24 ч.
+    Если вёрстка/сеть изменились — смотрите поле в сайдбаре и правьте URL/regex или вводите цену вручную.
+    Возвращает (₽ за п.м., короткая подпись источника).
+    """
+    src_fail = "резерв (парсер/сеть)"
+    urls = (
+        "https://www.petrovich.ru/search/?search=truba+profilnaya+40+20+1.5",
+        "https://www.petrovich.ru/search/?search=%D1%82%D1%80%D1%83%D0%B1%D0%B0+%D0%BF%D1%80%D0%BE%D1%84%D0%B8%D0%BB%D1%8C%D0%BD%D0%B0%D1%8F+40+20+1.5",
+    )
+    raw = _petrovich_first_listed_price_raw(urls)
+    if raw is not None:
+        if raw >= 400:
+            return (round(raw / PROFILE_40X20_STICK_M, 2), "petrovich.ru (из цены хлыста ÷6)")
+        return (float(raw), "petrovich.ru")
+    return (float(PROFILE_40X20_RUB_M_FALLBACK), src_fail)
+
+
+def fetch_screw_4x16_press_rub_each_petrovich() -> tuple[float, str]:
+    """
+    Цена самореза 4,2×16 с прессшайбой (сверло), кэш 24 ч.
+    В выдаче Петровича чаще цена за упаковку — делим на типичное число шт. в уп.
+    """
+    src_fail = "резерв (парсер/сеть)"
+    urls = (
+        "https://www.petrovich.ru/search/?search=samorez+4.2x16+press+shayba",
+        "https://www.petrovich.ru/search/?search=samorez+4.2+16+sv+press",
+        "https://www.petrovich.ru/search/?search=%D1%81%D0%B0%D0%BC%D0%BE%D1%80%D0%B5%D0%B7+4%D1%8516+%D0%BF%D1%80%D0%B5%D1%81%D1%81%D1%88%D0%B0%D0%B9%D0%B1%D0%B0",
+    )
+    raw = _petrovich_first_listed_price_raw(urls)
+    if raw is None:
+        return (float(SCREW_4X16_PRESS_RUB_EACH_FALLBACK), src_fail)
+    if raw >= 800:
+        return (round(raw / 1000.0, 4), "petrovich.ru (цена ÷1000 шт/уп)")
+    if raw >= 400:
+        return (round(raw / 500.0, 4), "petrovich.ru (цена ÷500 шт/уп)")
+    if raw >= 150:
+        return (round(raw / 200.0, 4), "petrovich.ru (цена ÷200 шт/уп)")
+    if raw >= 70:
+        return (round(raw / 100.0, 4), "petrovich.ru (цена ÷100 шт/уп)")
+    if raw >= 25:
+        return (round(raw / 50.0, 4), "petrovich.ru (цена ÷50 шт/уп)")
+    if raw >= 12:
+        return (round(raw / 20.0, 4), "petrovich.ru (цена ÷20 шт/уп)")
+    return (float(raw), "petrovich.ru (как за 1 шт)")
+
+
+def fetch_rivet_m6_sormat_rub_each_lemana() -> tuple[float, str]:
+    """
+    Заклёпка резьбовая Sormat M6, кэш 24 ч.
+    Карточка: lemanapro.ru (число шт. в уп. из текста страницы или 1 шт.).
+    """
+    src_fail = "резерв (Lemana/сеть)"
+    url = LEMANA_RIVET_M6_SORMAT_URL
+    pack = 1
+    m_url = re.search(r"-(\d+)-sht", url, re.I)
+    if m_url:
+        pack = max(1, int(m_url.group(1)))
+    try:
+        scan = _fetch_html_prices(url, want_pack=True)
+        if scan.pack is not None:
+            pack = max(1, scan.pack)
+        raw = scan.price if scan.price is not None else scan.final_price
+        if raw is not None and 5 <= raw <= 50000 and pack > 0:
+            return (round(raw / float(pack), 4), f"lemanapro.ru (уп. {pack} шт, Sormat M6)")
+    except Exception:
+        pass
+    return (float(RIVET_M6_SORMAT_RUB_EACH_FALLBACK), src_fail)
+
+
+def fetch_bolt_m6_6x16_din912_zinc_rub_each_lemana() -> tuple[float, str]:
+    """
+    Винт M6×16 DIN 912 оцинк., кэш 24 ч.
+    Карточка: lemanapro.ru (упаковка в URL, напр. 24 шт).
+    """
+    src_fail = "резерв (Lemana/сеть)"
+    url = LEMANA_BOLT_M6_6x16_DIN912_URL
+    pack = 24
+    m_url = re.search(r"-(\d+)-sht", url, re.I)
+    if m_url:
+        pack = max(1, int(m_url.group(1)))
+    try:
+        scan = _fetch_html_prices(url, want_pack=True)
+        if scan.pack is not None:
+            pack = max(1, scan.pack)
+        raw = scan.price if scan.price is not None else scan.final_price
+        if raw is not None and 15 <= raw <= 50000 and pack > 0:
+            return (round(raw / float(pack), 4), f"lemanapro.ru (уп. {pack} шт, DIN 912 6×16)")
+    except Exception:
+        pass
+    return (float(BOLT_M6_6x16_DIN912_RUB_EACH_FALLBACK), src_fail)
+
+
+# --- ПОСЛЕДНИЕ ИЗВЕСТНЫЕ ЦЕНЫ (SQLITE) + ФОНОВАЯ ЗАГРУЗКА ---
+def _cbr_usd_rate_with_note() -> tuple[float, str]:
+    rate = fetch_cbr_usd_rate()
+    return rate, ("ЦБ РФ + 1%" if rate != CBR_USD_RATE_FALLBACK else "резерв (ЦБ/сеть)")
+
+
+# Ключ → (функция загрузки, TTL в секундах, резервное значение (цена, подпись источника))
+PRICE_SOURCES: dict[str, tuple[Callable[[], tuple[float, str]], float, tuple[float, str]]] = {
+    "cbr_usd_rate": (
+        _cbr_usd_rate_with_note,
+        3600,
+        (CBR_USD_RATE_FALLBACK, "резерв (ЦБ/сеть)"),
+    ),
+    "profile_40x20_rub_m": (
+        fetch_profile_40x20_rub_per_m_petrovich,
+        86400,
+        (float(PROFILE_40X20_RUB_M_FALLBACK), "резерв (парсер/сеть)"),
+    ),
+    "screw_4x16_rub_each": (
+        fetch_screw_4x16_press_rub_each_petrovich,
+        86400,
+        (float(SCREW_4X16_PRESS_RUB_EACH_FALLBACK), "резерв (парсер/сеть)"),
+    ),
+    "rivet_m6_rub_each": (
+        fetch_rivet_m6_sormat_rub_each_lemana,
+        86400,
+        (float(RIVET_M6_SORMAT_RUB_EACH_FALLBACK), "резерв (Lemana/сеть)"),
+    ),
+    "bolt_m6_rub_each": (
+        fetch_bolt_m6_6x16_din912_zinc_rub_each_lemana,
+        86400,
+        (float(BOLT_M6_6x16_DIN912_RUB_EACH_FALLBACK), "резерв (Lemana/сеть)"),
+    ),
+}
+
+# Общий дедлайн фоновой загрузки: источники опрашиваются параллельно, ожидание ограничено
+# самым медленным запросом, но не дольше дедлайна; не успевшие остаются на резерве/последнем значении
+PRICE_FETCH_DEADLINE_S = float(os.environ.get("MEDIALIVE_PRICE_DEADLINE_S", "15"))
+
+# Повтор после неудачной попытки — не раньше чем через PRICE_RETRY_S (или TTL, если он короче)
+PRICE_RETRY_S = 600.0
+# Аренда ключа на время загрузки: пока она жива, тот же источник не скрейпит другой процесс
+PRICE_LEASE_S = 120.0
+
+# Фоновый планировщик: обновляет цены заранее, за долю TTL до истечения, чтобы пользователь
+# не попадал на устаревшие значения; пауза между проходами со случайным разбросом (jitter)
+PRICE_REFRESHER_ENABLED = os.environ.get("MEDIALIVE_PRICE_REFRESHER", "1") != "0"
+PRICE_REFRESH_AHEAD = 0.2
+PRICE_REFRESH_MIN_SLEEP_S = 30.0
+PRICE_REFRESH_MAX_SLEEP_S = 3600.0
+PRICE_REFRESH_JITTER = 0.1
+
+_store = PriceStore()
+_prices_lock = threading.Lock()
+# Копия кэша в памяти процесса: выручает, если файл SQLite недоступен или занят
+_prices: dict[str, StoredPrice] = {}
+# Ключи, загрузка которых ещё идёт (в т.ч. не уложившиеся в дедлайн)
+_inflight: set[str] = set()
+_fetch_thread: Optional[threading.Thread] = None
+_refresher_thread: Optional[threading.Thread] = None
+# Владелец аренды: процесс (pid + случайный хвост на случай повторного pid в контейнерах)
+_LEASE_OWNER = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def _load_prices() -> dict[str, StoredPrice]:
+    """Последние цены из SQLite, дополненные более свежими записями из памяти процесса."""
+    try:
+        stored = _store.read_all()
+    except sqlite3.Error:
+        stored = {}
+    with _prices_lock:
+        for key, mem in _prices.items():
+            disk = stored.get(key)
+            if disk is None or mem.checked_at > disk.checked_at:
+                stored[key] = mem
+    return stored
+
+
+def _due_at(p: Optional[StoredPrice], ttl: float, ahead: float) -> float:
+    """Когда ключ пора обновлять: за ahead·TTL до истечения, после неудачи — не раньше PRICE_RETRY_S."""
+    if p is None:
+        return 0.0
+    fresh_until = p.fetched_at + ttl * (1.0 - ahead) if p.fetched_at is not None else 0.0
+    return max(fresh_until, p.checked_at + min(ttl, PRICE_RETRY_S))
+
+
+def _expired(prices: dict[str, StoredPrice], now: float, ahead: float = 0.0) -> list[str]:
+    return [
+        key
+        for key, (_, ttl, _) in PRICE_SOURCES.items()
+        if now >= _due_at(prices.get(key), ttl, ahead)
+    ]
+
+
+def _fetch_one(key: str, ahead: float = 0.0) -> None:
+    fetch, ttl, fallback = PRICE_SOURCES[key]
+    lease = f"price:{key}"
+    try:
+        if not _store.try_lease(lease, _LEASE_OWNER, PRICE_LEASE_S):
+            # Этот источник уже загружает другой процесс — его результат появится в общем кэше
+            with _prices_lock:
+                _inflight.discard(key)
+            return
+        # Пока брали аренду, ключ мог обновить другой процесс
+        if time.time() < _due_at(_store.read_all().get(key), ttl, ahead):
+            _store.release(lease, _LEASE_OWNER)
+            with _prices_lock:
+                _inflight.discard(key)
+            return
+    except sqlite3.Error:
+        pass
+    try:
+        value, note = fetch()
+        ok = (value, note) != fallback
+    except Exception:
+        ok = False
+    now = time.time()
+    try:
+        if ok:
+            _store.put(key, value, note, now)
+        else:
+            _store.mark_checked(key, now)
+        _store.release(lease, _LEASE_OWNER)
+    except sqlite3.Error:
+        pass
+    with _prices_lock:
+        prev = _prices.get(key)
+        if ok:
+            _prices[key] = StoredPrice(value=value, note=note, fetched_at=now, checked_at=now)
+        elif prev is not None:
+            _prices[key] = dataclasses.replace(prev, checked_at=now)
+        else:
+            _prices[key] = StoredPrice(value=None, note="", fetched_at=None, checked_at=now)
+        _inflight.discard(key)
+
+
+def _fetch_keys(
+    keys: list[str], deadline_s: float = PRICE_FETCH_DEADLINE_S, ahead: float = 0.0
+) -> None:
+    pool = ThreadPoolExecutor(max_workers=len(keys), thread_name_prefix="price-fetch")
+    try:
+        futures = [pool.submit(_fetch_one, key, ahead) for key in keys]
+        wait_futures(futures, timeout=deadline_s)
+    finally:
+        # Не ждём зависшие запросы: их результат запишется, когда (если) они завершатся
+        pool.shutdown(wait=False)
+
+
+def refresh_prices(wait: bool = False, ahead: float = 0.0) -> bool:
+    """
+    Запускает загрузку устаревших цен в фоновом потоке (не больше одного потока на процесс),
+    источники внутри опрашиваются параллельно; между процессами загрузку одного источника
+    разводит аренда в общем кэше. wait=True — дождаться окончания, но не дольше
+    PRICE_FETCH_DEADLINE_S. ahead — доля TTL, за которую обновлять заранее.
+    Возвращает True, если загрузка идёт или была запущена.
+    """
+    global _fetch_thread
+    prices = _load_prices()
+    with _prices_lock:
+        running = _fetch_thread is not None and _fetch_thread.is_alive()
+        if not running:
+            keys = [k for k in _expired(prices, time.time(), ahead) if k not in _inflight]
+            if keys:
+                _inflight.update(keys)
+                _fetch_thread = threading.Thread(
+                    target=_fetch_keys,
+                    args=(keys,),
+                    kwargs={"ahead": ahead},
+                    name="price-fetch",
+                    daemon=True,
+                )
+                _fetch_thread.start()
+                running = True
+        thread = _fetch_thread
+        pending = running or bool(_inflight)
+    if wait and thread is not None:
+        thread.join()
+    return pending
+
+
+def price_snapshot(wait: bool = False) -> tuple[dict[str, tuple[float, str]], bool]:
+    """
+    Цены без ожидания сети (stale-while-revalidate): {ключ: (цена, подпись)} и флаг
+    «идёт обновление». Отдаётся последнее удачное значение из общего кэша, даже устаревшее,
+    а устаревшие ключи обновляются в фоне; если удачной загрузки не было — резерв.
+    """
+    pending = refresh_prices(wait=wait)
+    if wait:
+        pending = False
+    prices = _load_prices()
+    out = {}
+    for key, (_, _, fallback) in PRICE_SOURCES.items():
+        p = prices.get(key)
+        out[key] = (p.value, p.note) if p is not None and p.value is not None else fallback
+    return out, pending
+
+
+def _next_refresh_in(now: float) -> float:
+    prices = _load_prices()
+    due = min(
+        _due_at(prices.get(key), ttl, PRICE_REFRESH_AHEAD)
+        for key, (_, ttl, _) in PRICE_SOURCES.items()
+    )
+    delay = min(max(due - now, PRICE_REFRESH_MIN_SLEEP_S), PRICE_REFRESH_MAX_SLEEP_S)
+    return delay * random.uniform(1.0 - PRICE_REFRESH_JITTER, 1.0 + PRICE_REFRESH_JITTER)
+
+
+def run_price_refresher(stop: Optional[threading.Event] = None) -> None:
+    """
+    Цикл прогрева кэша: обновляет цены заранее и спит до ближайшего срока (с jitter,
+    чтобы реплики не ходили на сайты одновременно). stop — событие для остановки.
+    """
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            refresh_prices(wait=True, ahead=PRICE_REFRESH_AHEAD)
+        except Exception:
+            logging.getLogger(__name__).exception("Фоновое обновление цен не удалось")
+        stop.wait(_next_refresh_in(time.time()))
+
+
+def start_price_refresher() -> bool:
+    """
+    Фоновый поток прогрева кэша цен, один на процесс (повторные вызовы ничего не делают).
+    MEDIALIVE_PRICE_REFRESHER=0 — не запускать (например, если работает отдельный
+    `python price_sources.py`). Возвращает True, если поток работает.
+    """
+    global _refresher_thread
+    if not PRICE_REFRESHER_ENABLED:
+        return False
+    with _prices_lock:
+        if _refresher_thread is None or not _refresher_thread.is_alive():
+            _refresher_thread = threading.Thread(
+                target=run_price_refresher, name="price-refresher", daemon=True
+            )
+            _refresher_thread.start()
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_price_refresher()
@@ -0,0 +1,108 @@
+"""
+Общий кэш цен на диске: SQLite в режиме WAL в price_cache/ (рядом с led_calc_sessions/).
+Файл читают и пишут все процессы Streamlit и вебхук: читатели не блокируют писателя,
+поэтому после рестарта, деплоя или на соседней реплике сразу есть последние удачные цены.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+BASE_DIR = Path(__file__).resolve().parent
+PRICE_DB_PATH = Path(os.environ.get("MEDIALIVE_PRICE_DB") or BASE_DIR / "price_cache" / "prices.sqlite3")
+PRICE_DB_BUSY_TIMEOUT_S = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    key TEXT PRIMARY KEY,
+    value REAL,
+    note TEXT,
+    fetched_at REAL,
+    checked_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+@dataclass(frozen=True)
+class StoredPrice:
+    value: Optional[float]  # None — удачной загрузки ещё не было
+    note: str
+    fetched_at: Optional[float]  # time.time() последней удачной загрузки
+    checked_at: float  # time.time() последней попытки (удачной или нет)
+
+
+class PriceStore:
+    """
+    Ключ источника → последняя удачная цена, подпись и время загрузки.
+    Соединение своё у каждого потока; неудачная попытка обновляет только checked_at,
+    удачное значение при этом не затирается.
+    """
+
+    def __init__(self, path: Path = PRICE_DB_PATH):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=PRICE_DB_BUSY_TIMEOUT_S, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def read_all(self) -> dict[str, StoredPrice]:
+        rows = self._conn().execute(
+            "SELECT key, value, note, fetched_at, checked_at FROM prices"
+        ).fetchall()
+        return {
+            key: StoredPrice(value=value, note=note or "", fetched_at=fetched_at, checked_at=checked_at)
+            for key, value, note, fetched_at, checked_at in rows
+        }
+
+    def put(self, key: str, value: float, note: str, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        self._conn().execute(
+            "INSERT INTO prices (key, value, note, fetched_at, checked_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, note = excluded.note, "
+            "fetched_at = excluded.fetched_at, checked_at = excluded.checked_at",
+            (key, float(value), note, now, now),
+        )
+
+    def mark_checked(self, key: str, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        self._conn().execute(
+            "INSERT INTO prices (key, checked_at) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET checked_at = excluded.checked_at",
+            (key, now),
+        )
+
+    def try_lease(self, name: str, owner: str, ttl_s: float, now: Optional[float] = None) -> bool:
+        """
+        Аренда имени на ttl_s секунд для одного владельца на все процессы (single-flight).
+        True — аренда взята (или продлена тем же владельцем); чужая живая аренда не перехватывается.
+        """
+        now = time.time() if now is None else now
+        cur = self._conn().execute(
+            "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.expires_at <= ? OR leases.owner = excluded.owner",
+            (name, owner, now + ttl_s, now),
+        )
+        return cur.rowcount == 1
+
+    def release(self, name: str, owner: str) -> None:
+        self._conn().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
@@ -0,0 +1,193 @@
+"""
+Профилирование по запросу: каждый прогон app.py и каждый запрос вебхука можно обернуть
+в cProfile (.prof для snakeviz / pstats) или семплирующий профилировщик (.collapsed —
+свёрнутые стеки для flamegraph.pl / speedscope). Профилируется только
+MEDIALIVE_PROFILE_PERCENT % прогонов, поэтому режим можно держать включённым в проде.
+
+MEDIALIVE_PROFILE=cprofile|sample — режим (пусто — выключено);
+MEDIALIVE_PROFILE_PERCENT — доля прогонов, % (по умолчанию 5);
+MEDIALIVE_PROFILE_DIR — каталог (по умолчанию profiles/ рядом с app.py), хранится
+MEDIALIVE_PROFILE_KEEP последних файлов.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import collections
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+PROFILE_CPROFILE = "cprofile"
+PROFILE_SAMPLE = "sample"
+
+PROFILE_MODE = os.environ.get("MEDIALIVE_PROFILE", "").strip().lower()
+PROFILE_PERCENT = float(os.environ.get("MEDIALIVE_PROFILE_PERCENT", "5"))
+PROFILE_DIR = Path(
+    os.environ.get("MEDIALIVE_PROFILE_DIR") or Path(__file__).resolve().parent / "profiles"
+)
+PROFILE_KEEP_FILES = int(os.environ.get("MEDIALIVE_PROFILE_KEEP", "200"))
+SAMPLE_INTERVAL_S = 0.005
+
+# cProfile ставит хук трассировки на поток, но два активных Profile мешают друг другу
+# (а с Python 3.12 — просто запрещены), поэтому одновременно профилируется один прогон
+_cprofile_lock = threading.Lock()
+_cprofile_active: Optional["ActiveProfile"] = None
+_local = threading.local()
+
+
+def _safe_part(value: str) -> str:
+    return re.sub(r"[^\w\-]+", "_", value or "").strip("_")[:48] or "run"
+
+
+class _StackSampler(threading.Thread):
+    """Раз в interval снимает стек целевого потока и считает одинаковые свёрнутые стеки."""
+
+    def __init__(self, target_ident: int, interval: float = SAMPLE_INTERVAL_S):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.target_ident = target_ident
+        self.interval = interval
+        self.stacks: collections.Counter[str] = collections.Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_ident)
+            if frame is None:
+                return  # поток прогона завершился
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+@dataclass
+class ActiveProfile:
+    kind: str  # "streamlit" / "webhook"
+    run_id: str
+    mode: str
+    started_at: float
+    thread: threading.Thread
+    profiler: Optional[cProfile.Profile] = None
+    sampler: Optional[_StackSampler] = None
+
+
+def start_profile(kind: str, run_id: str) -> Optional[ActiveProfile]:
+    """Начать профиль прогона с вероятностью PROFILE_PERCENT %; None — этот прогон не профилируется."""
+    global _cprofile_active
+    if PROFILE_MODE not in (PROFILE_CPROFILE, PROFILE_SAMPLE):
+        return None
+    if random.random() * 100 >= PROFILE_PERCENT:
+        return None
+    active = ActiveProfile(
+        kind=kind,
+        run_id=run_id,
+        mode=PROFILE_MODE,
+        started_at=time.time(),
+        thread=threading.current_thread(),
+    )
+    if PROFILE_MODE == PROFILE_CPROFILE:
+        if not _cprofile_lock.acquire(blocking=False):
+            stale = _cprofile_active
+            # Поток оборванного прогона умер, не закрыв профиль, — освобождаем место
+            if stale is None or stale.thread.is_alive():
+                return None
+            stop_profile(stale, "interrupted")
+            if not _cprofile_lock.acquire(blocking=False):
+                return None
+        active.profiler = cProfile.Profile()
+        try:
+            active.profiler.enable()
+        except ValueError:
+            _cprofile_lock.release()
+            return None
+        _cprofile_active = active
+    else:
+        active.sampler = _StackSampler(threading.get_ident())
+        active.sampler.start()
+    return active
+
+
+def _rotate(directory: Path, keep: int) -> None:
+    files = sorted(
+        (p for p in directory.iterdir() if p.suffix in (".prof", ".collapsed")),
+        key=lambda p: p.stat().st_mtime,
+    )
+    for old in files[: max(0, len(files) - keep)]:
+        old.unlink(missing_ok=True)
+
+
+def stop_profile(active: Optional[ActiveProfile], status: str = "ok") -> Optional[Path]:
+    """Остановить профиль и записать файл (имя: время, вид, id прогона, статус); путь или None."""
+    global _cprofile_active
+    if active is None:
+        return None
+    if active.profiler is not None:
+        active.profiler.disable()
+        if _cprofile_active is active:
+            _cprofile_active = None
+            _cprofile_lock.release()
+    if active.sampler is not None:
+        active.sampler.stop()
+    stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(active.started_at))
+    stem = "_".join(
+        (stamp, active.kind, _safe_part(active.run_id), _safe_part(status), uuid.uuid4().hex[:6])
+    )
+    try:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        if active.profiler is not None:
+            path = PROFILE_DIR / f"{stem}.prof"
+            active.profiler.dump_stats(str(path))
+        else:
+            path = PROFILE_DIR / f"{stem}.collapsed"
+            path.write_text(
+                "".join(f"{stack} {n}\n" for stack, n in active.sampler.stacks.most_common()),
+                encoding="utf-8",
+            )
+        _rotate(PROFILE_DIR, PROFILE_KEEP_FILES)
+        return path
+    except OSError:
+        return None
+
+
+@contextmanager
+def profiled(kind: str, run_id: str) -> Iterator[Optional[ActiveProfile]]:
+    active = start_profile(kind, run_id)
+    status = "ok"
+    try:
+        yield active
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        stop_profile(active, status)
+
+
+def begin_thread_run(kind: str, run_id: str) -> Optional[ActiveProfile]:
+    """
+    Для сценариев без общего try/finally (прогон app.py): профиль привязан к потоку.
+    Если прошлый прогон в этом потоке оборвался (st.rerun / st.stop), его профиль
+    закрывается здесь со статусом interrupted.
+    """
+    stop_profile(getattr(_local, "active", None), "interrupted")
+    _local.active = start_profile(kind, run_id)
+    return _local.active
+
+
+def end_thread_run() -> Optional[Path]:
+    active, _local.active = getattr(_local, "active", None), None
+    return stop_profile(active)
@@ -0,0 +1,172 @@
+"""
+Кэш готовых расчётов: нормализованные QuoteInputs + отпечаток каталога → QuoteResult.
+Общий для UI, PDF и вебхука: LRU в памяти процесса и необязательный дисковый уровень
+(MEDIALIVE_QUOTE_CACHE_DIR), счётчики попаданий — в stats().
+Ключ включает хэш исходников quote_engine и catalog (формулы и константы вроде
+METAL_PLATE_RUB_EACH) и отпечаток таблиц catalog_data, поэтому правка любого из них
+сама сбрасывает дисковый кэш.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+import catalog
+import quote_engine
+from catalog import get_catalog
+from quote_engine import QuoteInputs, QuoteResult, compute_quote
+
+QUOTE_CACHE_SIZE = 512
+QUOTE_CACHE_DIR: Optional[Path] = (
+    Path(os.environ["MEDIALIVE_QUOTE_CACHE_DIR"]) if os.environ.get("MEDIALIVE_QUOTE_CACHE_DIR") else None
+)
+
+
+def _sources_version(*modules) -> str:
+    digest = hashlib.sha256()
+    for module in modules:
+        digest.update(Path(module.__file__).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+# Константы расчёта лежат и в catalog.py, таблицы — в catalog_data (отпечаток каталога в ключе)
+_ENGINE_VERSION = _sources_version(quote_engine, catalog)
+
+
+@dataclass(frozen=True)
+class QuoteCacheStats:
+    hits: int  # из памяти
+    disk_hits: int  # с диска (после чего запись поднимается в память)
+    misses: int  # посчитано заново
+    evictions: int  # вытеснено из памяти по LRU
+    size: int  # записей в памяти
+
+
+def normalize_inputs(inputs: QuoteInputs) -> dict:
+    """Поля QuoteInputs в каноническом виде: числа — float (30 и 30.0 дают один ключ)."""
+    out = {}
+    for name, value in dataclasses.asdict(inputs).items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+        out[name] = value
+    return out
+
+
+def quote_key(inputs: QuoteInputs, catalog_fingerprint: str) -> str:
+    raw = json.dumps(
+        {"engine": _ENGINE_VERSION, "catalog": catalog_fingerprint, "inputs": normalize_inputs(inputs)},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class QuoteCache:
+    """
+    get(inputs) → QuoteResult: память (LRU на maxsize записей) → диск (JSON на запись,
+    если задан disk_dir) → compute. Потокобезопасен; запись на диск атомарна (tmp + replace).
+    """
+
+    def __init__(self, maxsize: int = QUOTE_CACHE_SIZE, disk_dir: Optional[Path] = QUOTE_CACHE_DIR):
+        self.maxsize = maxsize
+        self.disk_dir = Path(disk_dir) if disk_dir is not None else None
+        self._lock = threading.Lock()
+        self._lru: OrderedDict[str, QuoteResult] = OrderedDict()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _disk_get(self, key: str) -> Optional[QuoteResult]:
+        if self.disk_dir is None:
+            return None
+        try:
+            data = json.loads(self._disk_path(key).read_text(encoding="utf-8"))
+            return QuoteResult(**data)
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _disk_put(self, key: str, result: QuoteResult) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(dataclasses.asdict(result), ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+
+    def _remember(self, key: str, result: QuoteResult) -> None:
+        with self._lock:
+            self._lru[key] = result
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+                self._evictions += 1
+
+    def get(
+        self,
+        inputs: QuoteInputs,
+        compute: Callable[[QuoteInputs], QuoteResult] = compute_quote,
+    ) -> QuoteResult:
+        """compute вызывается только на промахе (например, QuoteGraph.compute из session_state)."""
+        key = quote_key(inputs, get_catalog().fingerprint)
+        with self._lock:
+            result = self._lru.get(key)
+            if result is not None:
+                self._lru.move_to_end(key)
+                self._hits += 1
+                return result
+        result = self._disk_get(key)
+        if result is not None:
+            with self._lock:
+                self._disk_hits += 1
+            self._remember(key, result)
+            return result
+        result = compute(inputs)
+        with self._lock:
+            self._misses += 1
+        self._remember(key, result)
+        self._disk_put(key, result)
+        return result
+
+    def stats(self) -> QuoteCacheStats:
+        with self._lock:
+            return QuoteCacheStats(
+                hits=self._hits,
+                disk_hits=self._disk_hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                size=len(self._lru),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+
+
+default_cache = QuoteCache()
+
+
+def cached_quote(
+    inputs: QuoteInputs, compute: Callable[[QuoteInputs], QuoteResult] = compute_quote
+) -> QuoteResult:
+    """get() общего кэша процесса."""
+    return default_cache.get(inputs, compute)
+
+
+def quote_cache_stats() -> QuoteCacheStats:
+    return default_cache.stats()
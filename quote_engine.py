@@ -0,0 +1,835 @@
+"""
+Расчётное ядро калькулятора LED-экрана без Streamlit.
+compute_quote(QuoteInputs) -> QuoteResult: количество, закупка, продажа, электрика, вес, логистика.
+Расчёт собран из узлов (QUOTE_NODES); QuoteGraph пересчитывает только узлы, чьи входы изменились.
+Используется UI (app.py), webhook, PDF-отчётами и пакетными инструментами.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, fields
+from typing import Callable, Optional, Sequence
+
+from catalog import (
+    BOLT_M6_6x16_DIN912_RUB_EACH_FALLBACK,
+    Catalog,
+    METAL_PLATE_RUB_EACH,
+    PROCESSOR_LOAD_PX_PER_PORT,
+    PROFILE_40X20_RUB_M_FALLBACK,
+    PROFILE_40X20_STICK_M,
+    RIVET_M6_SORMAT_RUB_EACH_FALLBACK,
+    SCREW_4X16_PRESS_RUB_EACH_FALLBACK,
+    get_catalog,
+    magnet_unit_usd,
+)
+
+MOUNT_MONOLITH = "Монолитный (Магниты/Профиль)"
+MOUNT_CABINET = "В кабинетах"
+CTRL_SYNC = "Синхронная"
+CTRL_ASYNC = "Асинхронная"
+PHASE_SINGLE = "Одна фаза (220 В)"
+PHASE_THREE = "Три фазы (380 В)"
+VAT_ON = "С НДС 22%"
+VAT_OFF = "Без НДС"
+
+MODULE_W_MM = 320
+MODULE_H_MM = 160
+
+STANDARD_BREAKERS_A = (10, 16, 20, 25, 32, 40, 50, 63, 80, 100, 125, 160, 200, 250)
+# (предельный ток, А; сечение жилы ВВГ, мм²)
+CABLE_SECTIONS = ((15, "1.5"), (21, "2.5"), (27, "4"), (34, "6"), (50, "10"), (70, "16"), (85, "25"))
+
+
+@dataclass(frozen=True)
+class QuoteInputs:
+    """Все входные параметры расчёта; значения по умолчанию совпадают с UI."""
+
+    width_mm: int = 3840
+    height_mm: int = 2240
+    module_name: str = "Qiangli Q2.5 Indoor 3840Hz"
+    mount_type: str = MOUNT_MONOLITH
+    cabinet_width: int = 640
+    cabinet_height: int = 480
+    cabinet_weight: float = 20.0
+    magnet_name: Optional[str] = "Магнит 14×13×1,3 мм"
+    magnets_per_module: int = 4
+    controller_category: str = CTRL_SYNC
+    processor_name: str = "VC4"
+    hot_backup: bool = False
+    card_name: str = "Novastar MRV 416"
+    modules_per_card: int = 10
+    hub_name: Optional[str] = None
+    psu_name: Optional[str] = None
+    modules_per_psu: int = 10
+    power_phase: str = PHASE_SINGLE
+    reserve_enabled: bool = True
+    reserve_modules_choice: str = "5%"
+    reserve_modules_custom: int = 0
+    reserve_psu_cards: bool = True
+    power_jumper_name: Optional[str] = "Силовая перемычка 3×25 (70 см)"
+    patch_cord_name: Optional[str] = None
+    card_power_cable_name: Optional[str] = None
+    exchange_rate: float = 95.0
+    profile_40x20_rub_m: float = PROFILE_40X20_RUB_M_FALLBACK
+    screw_4x16_rub_each: float = SCREW_4X16_PRESS_RUB_EACH_FALLBACK
+    rivet_m6_rub_each: float = RIVET_M6_SORMAT_RUB_EACH_FALLBACK
+    bolt_m6_rub_each: float = BOLT_M6_6x16_DIN912_RUB_EACH_FALLBACK
+    margin_percent: float = 30
+    vat_mode: str = VAT_ON
+    logistics_rub: float = 0.0
+    installation_rub: float = 0.0
+    price_per_m2: float = 150000
+
+
+@dataclass(frozen=True)
+class PortLoad:
+    """Нагрузка на GigE-выходы процессора (нужна UI ещё до выбора БП)."""
+
+    real_width: int
+    real_height: int
+    total_px: float
+    available_ports: int
+    ports_catalog_hit: bool
+    required_ports_base: int
+    required_ports: int
+    load_per_port: float
+    ports_ok: bool
+
+
+@dataclass(frozen=True)
+class QuoteResult:
+    # Геометрия и порты
+    real_width: int
+    real_height: int
+    resolution_w: int
+    resolution_h: int
+    total_px: float
+    area_m2: float
+    available_ports: int
+    ports_catalog_hit: bool
+    required_ports_base: int
+    required_ports: int
+    load_per_port: float
+    ports_ok: bool
+    # Модули
+    modules_w: int
+    modules_h: int
+    total_modules: int
+    reserve_modules: int
+    total_modules_order: int
+    total_price_rub: float
+    peak_power_screen_kw: float
+    avg_power_screen_kw: float
+    # Карты и коммутация
+    num_cards_by_mod: int
+    num_cards_by_pix: int
+    num_cards: int
+    num_cards_reserve: int
+    num_patch_cords_zip_spare: int
+    patch_cords: int
+    buy_patch_cords_total: float
+    num_power_cables: int
+    reserve_power_cables: int
+    num_card_power_cables_order: int
+    buy_card_power_cables_total: float
+    # БП, пластины, перемычки, хабы, магниты
+    num_psu: int
+    num_psu_reserve: int
+    num_plates: int
+    vinths: int
+    reserve_vinths: int
+    num_screws_4x16_order: int
+    num_power_jumpers_for_chain: int
+    num_power_jumpers_zip_spare: int
+    num_power_jumpers: int
+    buy_power_jumpers_total: float
+    num_hubs: int
+    num_magnets: int
+    magnet_unit_price_usd: float
+    buy_magnets_total: float
+    magnet_packs_order: int
+    # Каркас (монолит)
+    vert_profiles: int
+    vert_length: int
+    horiz_profiles: int
+    horiz_length: int
+    total_profile_length: float
+    fasteners_m6: int
+    reserve_fasteners: int
+    num_m6_rivet_bolt_each: int
+    profile_cut_m: float
+    profile_sticks_6m: int
+    profile_purchased_m: float
+    profile_waste_m: float
+    buy_profile_rub: float
+    buy_profile_usd: float
+    buy_screws_4x16_rub: float
+    buy_screws_4x16_usd: float
+    buy_rivet_m6_rub: float
+    buy_bolt_m6_6x16_rub: float
+    buy_m6_frame_rub: float
+    buy_m6_frame_usd: float
+    buy_metal_plates_rub: float
+    buy_metal_plates_usd: float
+    # Финансы
+    buy_mods_total: float
+    buy_cards_total: float
+    buy_hubs_total: float
+    buy_psu_total: float
+    buy_processor_total: float
+    total_buy_usd: float
+    total_buy_rub: float
+    total_modules_cost_usd: float
+    total_modules_cost_rub: float
+    buy_frame_usd: float
+    buy_frame_rub: float
+    buy_components_usd: float
+    buy_components_rub: float
+    margin: float
+    sale_components_usd: float
+    sale_components_rub: float
+    sale_frame_usd: float
+    sale_frame_rub: float
+    sale_hardware_usd: float
+    sale_hardware_rub: float
+    profit_hardware_usd: float
+    profit_hardware_rub: float
+    logistics_rub: float
+    installation_rub: float
+    extras_rub: float
+    extras_usd: float
+    commercial_subtotal_usd: float
+    commercial_subtotal_rub: float
+    vat_rate: float
+    vat_amount_usd: float
+    vat_amount_rub: float
+    sale_total_usd: float
+    sale_total_rub: float
+    profit_usd: float
+    profit_rub: float
+    expense_total_usd: float
+    expense_total_rub: float
+    # Электрика
+    electrical_power_kw: float
+    current: float
+    cable_section: str
+    breaker: int
+    # Коммутация кабинетов
+    num_cables: int
+    nvi: int
+    reserve_nvi: int
+    # Вес и логистика
+    weight_modules: float
+    cabinets_w: int
+    cabinets_h: int
+    total_cabinets: int
+    total_cabinet_weight: float
+    weight_carcas: float
+    weight_extra: float
+    total_weight: float
+    num_boxes: int
+    box_weight: int
+    box_volume: float
+
+
+def find_module(name: str) -> Optional[dict]:
+    return get_catalog().module(name)
+
+
+def controllers_for(category: str) -> tuple[dict, ...]:
+    return get_catalog().controllers_for(category)
+
+
+def compute_port_load(
+    width_mm: int, height_mm: int, pixel_pitch: float, processor_name: str, hot_backup: bool
+) -> PortLoad:
+    real_width = math.ceil(width_mm / MODULE_W_MM) * MODULE_W_MM
+    real_height = math.ceil(height_mm / MODULE_H_MM) * MODULE_H_MM
+    total_px = (real_width / pixel_pitch) * (real_height / pixel_pitch)
+    available_ports, ports_catalog_hit = get_catalog().processor_ports(processor_name)
+    required_ports_base = math.ceil(total_px / PROCESSOR_LOAD_PX_PER_PORT)
+    required_ports = required_ports_base * 2 if hot_backup else required_ports_base
+    load_per_port = (
+        (total_px / (available_ports * PROCESSOR_LOAD_PX_PER_PORT)) * 100
+        if available_ports > 0
+        else 100.0
+    )
+    return PortLoad(
+        real_width=real_width,
+        real_height=real_height,
+        total_px=total_px,
+        available_ports=available_ports,
+        ports_catalog_hit=ports_catalog_hit,
+        required_ports_base=required_ports_base,
+        required_ports=required_ports,
+        load_per_port=load_per_port,
+        ports_ok=required_ports <= available_ports,
+    )
+
+
+def reserve_modules_count(total_modules: int, choice: str, custom: int) -> int:
+    if choice == "Свой":
+        return int(custom)
+    return math.ceil(total_modules * int(choice.replace("%", "")) / 100)
+
+
+def cable_section_for(current: float, cores: int) -> str:
+    sq = next((s for limit, s in CABLE_SECTIONS if current <= limit), "35")
+    return f"{cores}×{sq} мм²"
+
+
+def breaker_for(current: float) -> int:
+    target_breaker = current * 1.25
+    return next((b for b in STANDARD_BREAKERS_A if b >= target_breaker), math.ceil(target_breaker))
+
+
+def resolve_components(inputs: QuoteInputs, catalog: Optional[Catalog] = None) -> dict[str, Optional[dict]]:
+    """Строки справочников для выбранных комплектующих (как подставляет UI по умолчанию)."""
+    cat = catalog or get_catalog()
+    monolith = "Монолитный" in inputs.mount_type
+    card = cat.pick("cards", inputs.card_name)
+    return {
+        "proc": cat.pick(cat.controller_table(inputs.controller_category), inputs.processor_name),
+        "card": card,
+        "psu": cat.pick("psus", inputs.psu_name),
+        "patch_cord": cat.pick("patch_cords", inputs.patch_cord_name, 0 if monolith else 1),
+        "card_power_cable": cat.pick("card_power_cables", inputs.card_power_cable_name),
+        "hub": cat.pick("hubs", inputs.hub_name) if card["type"] == "A" else None,
+        "magnet": cat.pick("magnets", inputs.magnet_name, 3) if monolith else None,
+        "power_jumper": cat.pick("power_jumpers", inputs.power_jumper_name, 3) if monolith else None,
+    }
+
+
+# --- ГРАФ РАСЧЁТА ---
+# compute_quote разбит на узлы: каждый читает свои поля QuoteInputs и выходы узлов-зависимостей
+# и возвращает словарь именованных величин. Узлы объявлены в топологическом порядке.
+
+
+@dataclass(frozen=True)
+class QuoteNode:
+    name: str
+    fn: Callable[[QuoteInputs, dict], dict]
+    fields: tuple[str, ...]  # поля QuoteInputs, которые читает узел
+    deps: tuple[str, ...]  # узлы, чьи выходы нужны узлу
+    uses_catalog: bool = False
+
+
+QUOTE_NODES: dict[str, QuoteNode] = {}
+
+
+def _node(name: str, fields: Sequence[str] = (), deps: Sequence[str] = (), uses_catalog: bool = False):
+    def register(fn: Callable[[QuoteInputs, dict], dict]):
+        unknown = [d for d in deps if d not in QUOTE_NODES]
+        if unknown:
+            raise ValueError(f"Узел {name}: зависимости объявлены позже или не существуют: {unknown}")
+        QUOTE_NODES[name] = QuoteNode(name, fn, tuple(fields), tuple(deps), uses_catalog)
+        return fn
+
+    return register
+
+
+@_node("module", fields=("module_name",), uses_catalog=True)
+def _node_module(i: QuoteInputs, v: dict) -> dict:
+    module = v["catalog"].module(i.module_name)
+    if module is None:
+        raise ValueError(f"Модуль не найден в прайсе: {i.module_name}")
+    return {"module": module, "pixel_pitch": module["pitch"]}
+
+
+@_node(
+    "components",
+    fields=(
+        "mount_type",
+        "controller_category",
+        "processor_name",
+        "card_name",
+        "hub_name",
+        "psu_name",
+        "patch_cord_name",
+        "card_power_cable_name",
+        "magnet_name",
+        "power_jumper_name",
+    ),
+    uses_catalog=True,
+)
+def _node_components(i: QuoteInputs, v: dict) -> dict:
+    rows = resolve_components(i, v["catalog"])
+    return {
+        "rows": rows,
+        "card_max_pixels": v["catalog"].card_max_pixels(rows["card"]["name"]),
+    }
+
+
+@_node(
+    "grid",
+    fields=("width_mm", "height_mm", "reserve_modules_choice", "reserve_modules_custom"),
+    deps=("module",),
+)
+def _node_grid(i: QuoteInputs, v: dict) -> dict:
+    pixel_pitch = v["pixel_pitch"]
+    modules_w = math.ceil(i.width_mm / MODULE_W_MM)
+    modules_h = math.ceil(i.height_mm / MODULE_H_MM)
+    real_width = modules_w * MODULE_W_MM
+    real_height = modules_h * MODULE_H_MM
+    total_modules = modules_w * modules_h
+    reserve_modules = reserve_modules_count(
+        total_modules, i.reserve_modules_choice, i.reserve_modules_custom
+    )
+    peak_power_screen_kw = total_modules * v["module"]["max_power"] / 1000
+    return {
+        "real_width": real_width,
+        "real_height": real_height,
+        "resolution_w": int(real_width / pixel_pitch),
+        "resolution_h": int(real_height / pixel_pitch),
+        "area_m2": (real_width / 1000) * (real_height / 1000),
+        "modules_w": modules_w,
+        "modules_h": modules_h,
+        "total_modules": total_modules,
+        "reserve_modules": reserve_modules,
+        "total_modules_order": total_modules + reserve_modules,
+        "peak_power_screen_kw": peak_power_screen_kw,
+        "avg_power_screen_kw": peak_power_screen_kw * 0.35,
+    }
+
+
+@_node("ports", fields=("hot_backup",), deps=("module", "components", "grid"))
+def _node_ports(i: QuoteInputs, v: dict) -> dict:
+    # Реальные размеры кратны модулю, поэтому результат тот же, что и от width_mm/height_mm
+    ports = compute_port_load(
+        v["real_width"], v["real_height"], v["pixel_pitch"], v["rows"]["proc"]["name"], i.hot_backup
+    )
+    return {
+        "total_px": ports.total_px,
+        "available_ports": ports.available_ports,
+        "ports_catalog_hit": ports.ports_catalog_hit,
+        "required_ports_base": ports.required_ports_base,
+        "required_ports": ports.required_ports,
+        "load_per_port": ports.load_per_port,
+        "ports_ok": ports.ports_ok,
+    }
+
+
+@_node("price_per_m2", fields=("price_per_m2",), deps=("grid",))
+def _node_price_per_m2(i: QuoteInputs, v: dict) -> dict:
+    return {"total_price_rub": v["area_m2"] * i.price_per_m2}
+
+
+@_node(
+    "cards",
+    fields=("modules_per_card", "reserve_enabled", "reserve_psu_cards"),
+    deps=("grid", "ports", "components"),
+)
+def _node_cards(i: QuoteInputs, v: dict) -> dict:
+    rows = v["rows"]
+    reserve_psu_cards = i.reserve_enabled and i.reserve_psu_cards
+    num_cards_by_mod = math.ceil(v["total_modules"] / i.modules_per_card)
+    card_res_tuple = v["card_max_pixels"]
+    max_pixels_card = card_res_tuple[0] * card_res_tuple[1]
+    num_cards_by_pix = math.ceil(v["total_px"] / max_pixels_card)
+    num_cards = max(num_cards_by_mod, num_cards_by_pix)
+    num_cards_reserve = num_cards + 1 if reserve_psu_cards else num_cards
+
+    num_patch_cords_zip_spare = 1 if i.reserve_enabled else 0
+    patch_cords = num_cards_reserve + num_patch_cords_zip_spare
+
+    num_power_cables = num_cards_reserve
+    reserve_power_cables = math.ceil(num_power_cables * 0.1)
+    num_card_power_cables_order = num_power_cables + reserve_power_cables
+    return {
+        "num_cards_by_mod": num_cards_by_mod,
+        "num_cards_by_pix": num_cards_by_pix,
+        "num_cards": num_cards,
+        "num_cards_reserve": num_cards_reserve,
+        "num_patch_cords_zip_spare": num_patch_cords_zip_spare,
+        "patch_cords": patch_cords,
+        "buy_patch_cords_total": patch_cords * rows["patch_cord"]["price_usd"],
+        "num_power_cables": num_power_cables,
+        "reserve_power_cables": reserve_power_cables,
+        "num_card_power_cables_order": num_card_power_cables_order,
+        "buy_card_power_cables_total": num_card_power_cables_order * rows["card_power_cable"]["price_usd"],
+        "num_hubs": num_cards_reserve if rows["card"]["type"] == "A" else 0,
+    }
+
+
+@_node(
+    "psu",
+    fields=("mount_type", "modules_per_psu", "reserve_enabled", "reserve_psu_cards"),
+    deps=("grid", "components"),
+)
+def _node_psu(i: QuoteInputs, v: dict) -> dict:
+    power_jumper = v["rows"]["power_jumper"]
+    monolith = "Монолитный" in i.mount_type
+    reserve_psu_cards = i.reserve_enabled and i.reserve_psu_cards
+    num_psu = math.ceil(v["total_modules"] / i.modules_per_psu)
+    num_psu_reserve = num_psu + 1 if reserve_psu_cards else num_psu
+
+    num_plates = num_psu_reserve
+    vinths = num_plates * 4
+    reserve_vinths = math.ceil(vinths * 0.1)
+
+    if monolith and power_jumper is not None:
+        num_power_jumpers_for_chain = max(0, num_psu_reserve - 1)
+        num_power_jumpers_zip_spare = 1 if i.reserve_enabled else 0
+        num_power_jumpers = num_power_jumpers_for_chain + num_power_jumpers_zip_spare
+    else:
+        num_power_jumpers_for_chain = 0
+        num_power_jumpers_zip_spare = 0
+        num_power_jumpers = 0
+
+    # Коммутация кабинетов
+    num_cables = max(0, num_psu_reserve - 1)
+    nvi = num_cables * 6
+    return {
+        "num_psu": num_psu,
+        "num_psu_reserve": num_psu_reserve,
+        "num_plates": num_plates,
+        "vinths": vinths,
+        "reserve_vinths": reserve_vinths,
+        "num_screws_4x16_order": vinths + reserve_vinths,
+        "num_power_jumpers_for_chain": num_power_jumpers_for_chain,
+        "num_power_jumpers_zip_spare": num_power_jumpers_zip_spare,
+        "num_power_jumpers": num_power_jumpers,
+        "buy_power_jumpers_total": num_power_jumpers * power_jumper["price_usd"] if power_jumper else 0.0,
+        "num_cables": num_cables,
+        "nvi": nvi,
+        "reserve_nvi": math.ceil(nvi * 0.1),
+    }
+
+
+@_node("magnets", fields=("mount_type", "magnets_per_module"), deps=("grid", "components"))
+def _node_magnets(i: QuoteInputs, v: dict) -> dict:
+    magnet = v["rows"]["magnet"]
+    monolith = "Монолитный" in i.mount_type
+    magnets_per_module = i.magnets_per_module if monolith else 0
+    num_magnets = (
+        v["total_modules"] * magnets_per_module
+        if (monolith and magnet is not None and magnets_per_module > 0)
+        else 0
+    )
+    magnet_unit_price_usd = magnet_unit_usd(magnet) if magnet else 0.0
+    return {
+        "num_magnets": num_magnets,
+        "magnet_unit_price_usd": magnet_unit_price_usd,
+        "buy_magnets_total": num_magnets * magnet_unit_price_usd,
+        "magnet_packs_order": math.ceil(num_magnets / magnet["pack_qty"]) if magnet and num_magnets else 0,
+    }
+
+
+@_node("frame", fields=("mount_type",), deps=("grid",))
+def _node_frame(i: QuoteInputs, v: dict) -> dict:
+    """Профиль 40×20: суммарная длина отрезов; в продаже только хлыст 6 м."""
+    real_width, real_height = v["real_width"], v["real_height"]
+    vert_profiles = v["modules_w"] + 1
+    vert_length = real_height - 40
+    horiz_profiles = 2 if real_height <= 3000 else 3
+    horiz_length = real_width - 60
+    total_profile_length = (vert_profiles * vert_length + horiz_profiles * horiz_length) / 1000
+
+    fasteners_m6 = horiz_profiles * vert_profiles
+    reserve_fasteners = math.ceil(fasteners_m6 * 0.03)
+
+    if "Монолитный" in i.mount_type:
+        profile_cut_m = total_profile_length
+        profile_sticks_6m = math.ceil(profile_cut_m / PROFILE_40X20_STICK_M) if profile_cut_m > 0 else 0
+        profile_purchased_m = profile_sticks_6m * PROFILE_40X20_STICK_M
+        profile_waste_m = max(0.0, profile_purchased_m - profile_cut_m)
+    else:
+        profile_cut_m = 0.0
+        profile_sticks_6m = 0
+        profile_purchased_m = 0.0
+        profile_waste_m = 0.0
+    return {
+        "vert_profiles": vert_profiles,
+        "vert_length": vert_length,
+        "horiz_profiles": horiz_profiles,
+        "horiz_length": horiz_length,
+        "total_profile_length": total_profile_length,
+        "fasteners_m6": fasteners_m6,
+        "reserve_fasteners": reserve_fasteners,
+        "num_m6_rivet_bolt_each": fasteners_m6 + reserve_fasteners,
+        "profile_cut_m": profile_cut_m,
+        "profile_sticks_6m": profile_sticks_6m,
+        "profile_purchased_m": profile_purchased_m,
+        "profile_waste_m": profile_waste_m,
+    }
+
+
+def _to_usd(rub: float, rate: float) -> float:
+    return rub / rate if rate else 0.0
+
+
+@_node(
+    "frame_prices",
+    fields=(
+        "mount_type",
+        "exchange_rate",
+        "profile_40x20_rub_m",
+        "screw_4x16_rub_each",
+        "rivet_m6_rub_each",
+        "bolt_m6_rub_each",
+    ),
+    deps=("frame", "psu"),
+)
+def _node_frame_prices(i: QuoteInputs, v: dict) -> dict:
+    rate = i.exchange_rate
+    if "Монолитный" in i.mount_type:
+        buy_profile_rub = v["profile_purchased_m"] * i.profile_40x20_rub_m
+        buy_screws_4x16_rub = v["num_screws_4x16_order"] * i.screw_4x16_rub_each
+        buy_rivet_m6_rub = v["num_m6_rivet_bolt_each"] * i.rivet_m6_rub_each
+        buy_bolt_m6_6x16_rub = v["num_m6_rivet_bolt_each"] * i.bolt_m6_rub_each
+        buy_metal_plates_rub = v["num_plates"] * METAL_PLATE_RUB_EACH
+    else:
+        buy_profile_rub = 0.0
+        buy_screws_4x16_rub = 0.0
+        buy_rivet_m6_rub = 0.0
+        buy_bolt_m6_6x16_rub = 0.0
+        buy_metal_plates_rub = 0.0
+    buy_m6_frame_rub = buy_rivet_m6_rub + buy_bolt_m6_6x16_rub
+    return {
+        "buy_profile_rub": buy_profile_rub,
+        "buy_profile_usd": _to_usd(buy_profile_rub, rate),
+        "buy_screws_4x16_rub": buy_screws_4x16_rub,
+        "buy_screws_4x16_usd": _to_usd(buy_screws_4x16_rub, rate),
+        "buy_rivet_m6_rub": buy_rivet_m6_rub,
+        "buy_bolt_m6_6x16_rub": buy_bolt_m6_6x16_rub,
+        "buy_m6_frame_rub": buy_m6_frame_rub,
+        "buy_m6_frame_usd": _to_usd(buy_m6_frame_rub, rate),
+        "buy_metal_plates_rub": buy_metal_plates_rub,
+        "buy_metal_plates_usd": _to_usd(buy_metal_plates_rub, rate),
+    }
+
+
+@_node(
+    "purchase",
+    fields=("exchange_rate",),
+    deps=("module", "components", "grid", "cards", "psu", "magnets", "frame_prices"),
+)
+def _node_purchase(i: QuoteInputs, v: dict) -> dict:
+    rate = i.exchange_rate
+    rows = v["rows"]
+    hub = rows["hub"]
+    module_price_usd = v["module"]["price_usd"]
+    buy_mods_total = v["total_modules_order"] * module_price_usd
+    buy_cards_total = v["num_cards_reserve"] * rows["card"]["price_usd"]
+    buy_hubs_total = v["num_hubs"] * (hub["price_usd"] if hub else 0.0)
+    buy_psu_total = v["num_psu_reserve"] * rows["psu"]["price_usd"]
+    buy_processor_total = rows["proc"]["price_usd"]
+
+    total_buy_usd = (
+        buy_mods_total
+        + buy_cards_total
+        + buy_psu_total
+        + buy_hubs_total
+        + buy_processor_total
+        + v["buy_magnets_total"]
+        + v["buy_patch_cords_total"]
+        + v["buy_card_power_cables_total"]
+        + v["buy_power_jumpers_total"]
+        + v["buy_profile_usd"]
+        + v["buy_screws_4x16_usd"]
+        + v["buy_m6_frame_usd"]
+        + v["buy_metal_plates_usd"]
+    )
+    total_modules_cost_usd = v["total_modules"] * module_price_usd
+
+    # Закупка: электроника/коммутация vs каркас и крепёж (профиль, M6, саморезы, пластины, магниты)
+    buy_frame_usd = (
+        v["buy_profile_usd"]
+        + v["buy_screws_4x16_usd"]
+        + v["buy_m6_frame_usd"]
+        + v["buy_metal_plates_usd"]
+        + v["buy_magnets_total"]
+    )
+    buy_components_usd = total_buy_usd - buy_frame_usd
+    return {
+        "buy_mods_total": buy_mods_total,
+        "buy_cards_total": buy_cards_total,
+        "buy_hubs_total": buy_hubs_total,
+        "buy_psu_total": buy_psu_total,
+        "buy_processor_total": buy_processor_total,
+        "total_buy_usd": total_buy_usd,
+        "total_buy_rub": total_buy_usd * rate,
+        "total_modules_cost_usd": total_modules_cost_usd,
+        "total_modules_cost_rub": total_modules_cost_usd * rate,
+        "buy_frame_usd": buy_frame_usd,
+        "buy_frame_rub": buy_frame_usd * rate,
+        "buy_components_usd": buy_components_usd,
+        "buy_components_rub": buy_components_usd * rate,
+    }
+
+
+@_node(
+    "sale",
+    fields=("exchange_rate", "margin_percent", "logistics_rub", "installation_rub", "vat_mode"),
+    deps=("purchase",),
+)
+def _node_sale(i: QuoteInputs, v: dict) -> dict:
+    rate = i.exchange_rate
+    # Наценка: отдельно на комплектующие и отдельно на каркас/крепёж.
+    margin = 1 + (i.margin_percent / 100)
+    sale_components_usd = v["buy_components_usd"] * margin
+    sale_components_rub = sale_components_usd * rate
+    sale_frame_usd = v["buy_frame_usd"] * margin
+    sale_frame_rub = sale_frame_usd * rate
+    sale_hardware_usd = sale_components_usd + sale_frame_usd
+    sale_hardware_rub = sale_components_rub + sale_frame_rub
+
+    # Прибыль считаем только по железу (без логистики и монтажа).
+    profit_hardware_usd = sale_hardware_usd - v["total_buy_usd"]
+    profit_hardware_rub = profit_hardware_usd * rate
+
+    logistics_rub = float(i.logistics_rub)
+    installation_rub = float(i.installation_rub)
+    extras_rub = logistics_rub + installation_rub
+    extras_usd = _to_usd(extras_rub, rate)
+
+    commercial_subtotal_usd = sale_hardware_usd + extras_usd
+    commercial_subtotal_rub = sale_hardware_rub + extras_rub
+
+    vat_rate = 0.22 if i.vat_mode == VAT_ON else 0.0
+    vat_amount_usd = commercial_subtotal_usd * vat_rate
+    vat_amount_rub = commercial_subtotal_rub * vat_rate
+    return {
+        "margin": margin,
+        "sale_components_usd": sale_components_usd,
+        "sale_components_rub": sale_components_rub,
+        "sale_frame_usd": sale_frame_usd,
+        "sale_frame_rub": sale_frame_rub,
+        "sale_hardware_usd": sale_hardware_usd,
+        "sale_hardware_rub": sale_hardware_rub,
+        "profit_hardware_usd": profit_hardware_usd,
+        "profit_hardware_rub": profit_hardware_rub,
+        "logistics_rub": logistics_rub,
+        "installation_rub": installation_rub,
+        "extras_rub": extras_rub,
+        "extras_usd": extras_usd,
+        "commercial_subtotal_usd": commercial_subtotal_usd,
+        "commercial_subtotal_rub": commercial_subtotal_rub,
+        "vat_rate": vat_rate,
+        "vat_amount_usd": vat_amount_usd,
+        "vat_amount_rub": vat_amount_rub,
+        "sale_total_usd": commercial_subtotal_usd + vat_amount_usd,
+        "sale_total_rub": commercial_subtotal_rub + vat_amount_rub,
+        "profit_usd": profit_hardware_usd,
+        "profit_rub": profit_hardware_rub,
+        "expense_total_usd": v["total_buy_usd"] + extras_usd,
+        "expense_total_rub": v["total_buy_rub"] + extras_rub,
+    }
+
+
+@_node("electrical", fields=("power_phase",), deps=("grid",))
+def _node_electrical(i: QuoteInputs, v: dict) -> dict:
+    electrical_power_kw = v["peak_power_screen_kw"] * 1.20
+    if "Одна фаза" in i.power_phase:
+        current = (electrical_power_kw * 1000) / 220
+        cores = 3
+    else:
+        current = (electrical_power_kw * 1000) / (380 * math.sqrt(3))
+        cores = 5
+    return {
+        "electrical_power_kw": electrical_power_kw,
+        "current": current,
+        "cable_section": cable_section_for(current, cores),
+        "breaker": breaker_for(current),
+    }
+
+
+@_node(
+    "weights",
+    fields=("mount_type", "cabinet_width", "cabinet_height", "cabinet_weight"),
+    deps=("module", "grid", "frame"),
+)
+def _node_weights(i: QuoteInputs, v: dict) -> dict:
+    module_weight = 0.37 if "Indoor" in v["module"]["env"] else 0.5
+    weight_modules = v["total_modules_order"] * module_weight
+
+    total_cabinet_weight = 0
+    cabinets_w, cabinets_h, total_cabinets = 0, 0, 0
+    if "кабинетах" in i.mount_type:
+        cabinets_w = math.ceil(v["real_width"] / i.cabinet_width)
+        cabinets_h = math.ceil(v["real_height"] / i.cabinet_height)
+        total_cabinets = cabinets_w * cabinets_h
+        total_cabinet_weight = total_cabinets * i.cabinet_weight
+
+    weight_carcas = v["total_profile_length"] * 2 if "Монолитный" in i.mount_type else 0
+    weight_extra = (weight_modules + weight_carcas + total_cabinet_weight) * 0.05
+
+    # Логистика
+    num_boxes = math.ceil(v["total_modules_order"] / 40)
+    return {
+        "weight_modules": weight_modules,
+        "cabinets_w": cabinets_w,
+        "cabinets_h": cabinets_h,
+        "total_cabinets": total_cabinets,
+        "total_cabinet_weight": total_cabinet_weight,
+        "weight_carcas": weight_carcas,
+        "weight_extra": weight_extra,
+        "total_weight": weight_modules + weight_carcas + total_cabinet_weight + weight_extra,
+        "num_boxes": num_boxes,
+        "box_weight": num_boxes * 22,
+        "box_volume": num_boxes * 0.06,
+    }
+
+
+_RESULT_FIELDS = tuple(f.name for f in fields(QuoteResult))
+
+
+def _build_result(values: dict) -> QuoteResult:
+    return QuoteResult(**{name: values[name] for name in _RESULT_FIELDS})
+
+
+def compute_quote(inputs: QuoteInputs) -> QuoteResult:
+    """Полный расчёт экрана по входным параметрам (без обращения к сети и UI)."""
+    values: dict = {"catalog": get_catalog()}
+    for node in QUOTE_NODES.values():
+        values.update(node.fn(inputs, values))
+    return _build_result(values)
+
+
+class QuoteGraph:
+    """
+    Инкрементальный compute_quote для одного пользователя (хранится в session_state).
+    Каждый узел помнит последний ключ — значения своих полей QuoteInputs, снимок каталога
+    и версии узлов-зависимостей — и пересчитывается, только если ключ изменился.
+    Версия узла растёт, лишь когда его выходы действительно поменялись, поэтому пересчёт
+    останавливается на узлах, чей результат совпал с прежним (ширина, изменённая в пределах
+    одного модуля, не трогает карты, БП, закупку и продажу).
+    """
+
+    def __init__(self) -> None:
+        # имя узла → (ключ, выходы, версия)
+        self._memo: dict[str, tuple[tuple, dict, int]] = {}
+        self._result: Optional[QuoteResult] = None
+        self.recomputed: tuple[str, ...] = ()
+        self.hits = 0
+        self.misses = 0
+
+    def compute(self, inputs: QuoteInputs) -> QuoteResult:
+        catalog = get_catalog()
+        values: dict = {"catalog": catalog}
+        recomputed = []
+        for node in QUOTE_NODES.values():
+            key = (
+                tuple(getattr(inputs, f) for f in node.fields),
+                catalog if node.uses_catalog else None,
+                tuple(self._memo[d][2] for d in node.deps),
+            )
+            cached = self._memo.get(node.name)
+            if cached is not None and cached[0] == key:
+                self.hits += 1
+                out = cached[1]
+            else:
+                self.misses += 1
+                recomputed.append(node.name)
+                out = node.fn(inputs, values)
+                if cached is not None and cached[1] == out:
+                    version = cached[2]
+                else:
+                    version = (cached[2] + 1) if cached is not None else 0
+                self._memo[node.name] = (key, out, version)
+            values.update(out)
+        self.recomputed = tuple(recomputed)
+        if recomputed or self._result is None:
+            self._result = _build_result(values)
+        return self._result
@@ -0,0 +1,18 @@
+"""
+Общие настройки тестов: модули проекта лежат в корне репозитория, а их пути к данным
+(заявки, кэш цен) читаются из окружения при импорте — поэтому окружение задаётся здесь,
+до импорта, и указывает во временный каталог.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+_TMP = Path(tempfile.mkdtemp(prefix="medialive-tests-"))
+os.environ.setdefault("MEDIALIVE_INCOMING_DIR", str(_TMP / "incoming_requests"))
+os.environ.setdefault("MEDIALIVE_PRICE_DB", str(_TMP / "prices.sqlite3"))
+os.environ.setdefault("MEDIALIVE_PRICE_REFRESHER", "0")
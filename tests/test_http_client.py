@@ -0,0 +1,76 @@
+import pytest
+
+from http_client import (
+    BREAKER_BASE_BACKOFF_S,
+    BREAKER_CLOSED,
+    BREAKER_HALF_OPEN,
+    BREAKER_MAX_BACKOFF_S,
+    BREAKER_OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    HttpClient,
+)
+
+
+def test_breaker_opens_at_base_window_despite_concurrent_failures():
+    b = CircuitBreaker()
+    # Три запроса пропущены при закрытой цепи и падают одновременно
+    assert b.allow(0) and b.allow(0) and b.allow(0)
+    for _ in range(3):
+        b.record_failure(now=0)
+    status = b.status(now=0)
+    assert status.state == BREAKER_OPEN
+    assert status.retry_in_s == BREAKER_BASE_BACKOFF_S
+
+
+def test_breaker_doubles_only_on_failed_probe():
+    b = CircuitBreaker()
+    b.record_failure(now=0)
+    now = 0.0
+    expected = BREAKER_BASE_BACKOFF_S
+    for _ in range(3):
+        assert not b.allow(now + expected - 1)
+        now += expected
+        assert b.status(now).state == BREAKER_HALF_OPEN
+        assert b.allow(now)  # пробный запрос
+        assert not b.allow(now)  # второй ждёт результата пробы
+        b.record_failure(now=now)
+        expected = min(BREAKER_MAX_BACKOFF_S, expected * 2)
+        assert b.status(now).retry_in_s == expected
+
+
+def test_breaker_backoff_is_capped_and_reset_by_success():
+    b = CircuitBreaker()
+    now = 0.0
+    b.record_failure(now=now)
+    for _ in range(20):
+        now += BREAKER_MAX_BACKOFF_S
+        assert b.allow(now)
+        b.record_failure(now=now)
+    assert b.status(now).retry_in_s == BREAKER_MAX_BACKOFF_S
+    now += BREAKER_MAX_BACKOFF_S
+    assert b.allow(now)
+    b.record_success()
+    assert b.status(now).state == BREAKER_CLOSED
+    b.record_failure(now=now)
+    assert b.status(now).retry_in_s == BREAKER_BASE_BACKOFF_S
+
+
+def test_probe_released_when_request_fails_outside_io(monkeypatch):
+    client = HttpClient()
+    breaker = client._breaker("example.invalid")
+    breaker.record_failure(now=0)
+    monkeypatch.setattr(breaker, "_open_until", 0.0)
+
+    def broken_send(*args, **kwargs):
+        raise ValueError("ошибка в коде вызова")
+
+    monkeypatch.setattr(client, "_send", broken_send)
+    with pytest.raises(ValueError):
+        client.fetch("http://example.invalid/")
+    # Проба не зависла: следующий запрос снова может быть пробным
+    with pytest.raises(ValueError):
+        client.fetch("http://example.invalid/")
+    monkeypatch.setattr(breaker, "_open_until", float("inf"))
+    with pytest.raises(CircuitOpenError):
+        client.fetch("http://example.invalid/")
@@ -0,0 +1,83 @@
+import json
+import uuid
+
+import pytest
+
+import incoming_webhook
+from incoming_webhook import APP, DEAD_LETTER_PATH, WRITER
+from lead_queue import RecentKeys
+from lead_store import default_store as lead_store
+
+
+@pytest.fixture
+def client():
+    return APP.test_client()
+
+
+def _post(client, payload):
+    response = client.post("/incoming", json=payload)
+    return response.status_code, response.get_json()
+
+
+def test_unwritable_lead_goes_to_dead_letter_and_others_are_stored(client, monkeypatch):
+    good, bad = f"good-{uuid.uuid4().hex}", f"bad-{uuid.uuid4().hex}"
+    append_batch = lead_store.append_batch
+
+    def picky_append(documents):
+        if any(d["payload"]["request_id"] == bad for d in documents):
+            raise ValueError("не сериализуется")
+        return append_batch(documents)
+
+    monkeypatch.setattr(lead_store, "append_batch", picky_append)
+    assert _post(client, {"request_id": good})[0] == 202
+    assert _post(client, {"request_id": bad})[0] == 202
+    assert WRITER.flush(timeout=10)
+
+    assert lead_store.find(f"id:{good}") is not None
+    assert lead_store.find(f"id:{bad}") is None
+    dead = [json.loads(line) for line in DEAD_LETTER_PATH.read_text(encoding="utf-8").splitlines()]
+    assert any(d["document"]["payload"]["request_id"] == bad for d in dead)
+    metrics = client.get("/metrics").get_data(as_text=True)
+    assert 'webhook_write_errors_total{error="ValueError"}' in metrics
+    assert "webhook_dead_letters_total 0" not in metrics
+
+    # Заявки нет в журнале — повтор принимается заново, а не отвечается дублем
+    monkeypatch.setattr(lead_store, "append_batch", append_batch)
+    status, body = _post(client, {"request_id": bad})
+    assert status == 202 and not body.get("duplicate")
+    assert WRITER.flush(timeout=10)
+    assert lead_store.find(f"id:{bad}") is not None
+
+
+
+def test_retry_is_answered_with_the_original_id_across_restart(client, monkeypatch):
+    request_id = f"retry-{uuid.uuid4().hex}"
+    status, body = _post(client, {"request_id": request_id, "project_name": "Retry"})
+    assert status == 202
+    assert WRITER.flush(timeout=10)
+
+    status, again = _post(client, {"request_id": request_id, "project_name": "Retry"})
+    assert status == 200 and again["duplicate"] and again["id"] == body["id"]
+
+    # Перезапуск: кэш ключей в памяти пуст — ответ берётся из таблицы заявок
+    monkeypatch.setattr(incoming_webhook, "RECENT_KEYS", RecentKeys())
+    status, after_restart = _post(client, {"request_id": request_id})
+    assert status == 200 and after_restart["id"] == body["id"]
+    assert WRITER.flush(timeout=10)
+    assert lead_store.find(f"id:{request_id}").id == body["id"]
+
+
+def test_bad_size_does_not_block_the_batch(client):
+    good, bad = f"good-{uuid.uuid4().hex}", f"bad-{uuid.uuid4().hex}"
+    assert _post(client, {"request_id": good, "width_mm": 3200, "height_mm": 1920})[0] == 202
+    assert _post(client, {"request_id": bad, "width_mm": 1e999})[0] == 202
+    assert _post(client, {"request_id": f"huge-{bad}", "width_mm": 10**400, "height_mm": 1e19})[0] == 202
+    assert WRITER.flush(timeout=10)
+
+    assert lead_store.find(f"id:{good}").sale_rub > 0
+    assert lead_store.find(f"id:{bad}") is not None
+    assert lead_store.find(f"id:huge-{bad}") is not None
+    # Поток записи жив: следующие заявки тоже пишутся
+    assert _post(client, {"request_id": f"after-{bad}"})[0] == 202
+    assert WRITER.flush(timeout=10)
+    assert lead_store.find(f"id:after-{bad}") is not None
@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+import lead_queue
+from lead_queue import BatchWriter, QueueFull, RecentKeys
+
+
+@pytest.fixture(autouse=True)
+def fast_retry(monkeypatch):
+    monkeypatch.setattr(lead_queue, "WRITE_RETRY_S", 0.01)
+
+
+def test_batches_are_written_in_order():
+    written = []
+    writer = BatchWriter(written.extend)
+    for i in range(50):
+        writer.submit(i)
+    assert writer.flush(timeout=5)
+    writer.stop()
+    assert written == list(range(50))
+
+
+def test_os_error_retries_same_batch_until_written():
+    written, errors = [], []
+    attempts = iter([OSError("диск"), OSError("диск")])
+
+    def write_batch(batch):
+        error = next(attempts, None)
+        if error is not None:
+            raise error
+        written.extend(batch)
+
+    writer = BatchWriter(write_batch, on_error=errors.append)
+    writer.submit("a")
+    assert writer.flush(timeout=5)
+    writer.stop()
+    assert written == ["a"]
+    assert len(errors) == 2
+
+
+def test_non_io_error_dead_letters_only_the_bad_record_and_keeps_thread_alive():
+    written, dead = [], []
+    hold = threading.Event()
+
+    def write_batch(batch):
+        hold.wait(5)
+        if "bad" in batch:
+            raise OverflowError("cannot convert float infinity to integer")
+        written.extend(batch)
+
+    writer = BatchWriter(
+        write_batch,
+        on_error=lambda e: None,
+        on_dead_letter=lambda record, error: dead.append((record, type(error))),
+    )
+    for record in ("good1", "bad", "good2"):
+        writer.submit(record)
+    hold.set()
+    assert writer.flush(timeout=5)
+    assert sorted(written) == ["good1", "good2"]
+    assert dead == [("bad", OverflowError)]
+
+    writer.submit("later")
+    assert writer.flush(timeout=5)
+    writer.stop()
+    assert written[-1] == "later"
+
+
+def test_failing_callbacks_do_not_stop_theBatchWriter():
+    written = []
+
+    def boom(*args):
+        raise RuntimeError("сбой метрики")
+
+    writer = BatchWriter(written.extend, on_batch=boom)
+    writer.submit(1)
+    writer.submit(2)
+    assert writer.flush(timeout=5)
+    writer.stop()
+    assert written == [1, 2]
+
+
+def test_full_queue_raises():
+    hold = threading.Event()
+    writer = BatchWriter(lambda batch: hold.wait(5), maxsize=1, batch_max=1)
+    writer.submit(1)
+    with pytest.raises(QueueFull):
+        for i in range(10):
+            writer.submit(i)
+    hold.set()
+    writer.stop()
+
+
+def test_recent_keys_reserve_get_discard_and_lru():
+    keys = RecentKeys(maxsize=2)
+    assert keys.reserve("a", 1) is None
+    assert keys.reserve("a", 2) == 1  # уже занят — ответ первой попытки
+    assert keys.get("a") == 1
+    keys.reserve("b", 2)
+    keys.get("a")  # a — недавний, вытесняется b
+    keys.reserve("c", 3)
+    assert keys.get("b") is None
+    assert keys.get("a") == 1
+    keys.discard("a")
+    assert keys.get("a") is None
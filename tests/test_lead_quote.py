@@ -0,0 +1,91 @@
+import math
+from pathlib import Path
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import lead_quote
+from lead_index import ORDER_VALUE
+from lead_quote import attach_quote, quote_lead
+from lead_store import LeadStore
+from quote_engine import MOUNT_CABINET
+
+
+@pytest.mark.parametrize("size", [1e999, "inf", "1e400", "-inf", float("nan"), "nan", 1e300])
+def test_non_finite_or_huge_sizes_never_raise(size):
+    quote = quote_lead({"request_id": "x", "width_mm": size, "height_mm": size})
+    if "error" not in quote:
+        assert math.isfinite(quote["sale_total_rub"])
+
+
+def test_attach_quote_swallows_unexpected_errors(monkeypatch):
+    def broken(payload):
+        raise RuntimeError("сбой расчёта")
+
+    monkeypatch.setattr(lead_quote, "quote_lead", broken)
+    doc = attach_quote({"id": "a", "payload": {"width_mm": 3200}})
+    assert doc["quote"] == {"error": "RuntimeError: сбой расчёта"}
+
+
+def test_attach_quote_keeps_existing_quote():
+    doc = {"id": "a", "payload": {}, "quote": {"sale_total_rub": 1.0}}
+    assert attach_quote(doc) is doc
+
+
+def test_quoted_leads_sort_by_value(tmp_path):
+    store = LeadStore(tmp_path)
+    store.append_batch(
+        [
+            attach_quote({"id": "small", "payload": {"request_id": "s", "width_mm": 960, "height_mm": 480}}),
+            attach_quote({"id": "big", "payload": {"request_id": "b", "width_mm": 6400, "height_mm": 3840}}),
+            {"id": "unquoted", "payload": {"request_id": "u"}},
+        ]
+    )
+    rows = store.page(order=ORDER_VALUE)[0]
+    assert [r.id for r in rows] == ["big", "small", "unquoted"]
+    assert rows[0].quote_summary["sale_total_rub"] == rows[0].sale_rub
+
+
+_APP = Path(__file__).resolve().parent.parent / "app.py"
+# Ключ формы калькулятора → поле QuoteInputs
+_FORM_FIELDS = {
+    "width_input": "width_mm",
+    "height_mm": "height_mm",
+    "calc_margin_pct": "margin_percent",
+    "calc_exchange_rate": "exchange_rate",
+    "calc_logistics_rub": "logistics_rub",
+    "calc_installation_rub": "installation_rub",
+    "calc_vat_mode": "vat_mode",
+    "calc_mount_type": "mount_type",
+}
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        # state есть — поля верхнего уровня калькулятор не применяет
+        {"state": {"width_mm": 5000}, "height_mm": 3000, "margin_percent": "25.5", "exchange_rate": 0.5},
+        {"width": 5000, "height": 3000, "margin_percent": "25.5", "exchange_rate": 0.5, "vat_enabled": False},
+        {
+            "data": {
+                "calc_state": {
+                    "width_input": 4000,
+                    "height_mm": 1000,
+                    "calc_margin_pct": 15,
+                    "calc_mount_type": MOUNT_CABINET,
+                    "installation_rub": "-5",
+                    "logistics_rub": "12000",
+                }
+            }
+        },
+    ],
+)
+def test_ingest_quote_uses_the_same_form_values_as_the_app(payload):
+    at = AppTest.from_file(str(_APP), default_timeout=60)
+    at.session_state["_incoming_payload_to_apply"] = payload
+    at.run()
+    assert not at.exception
+
+    inputs = lead_quote.inputs_from_payload(payload)
+    for key, field in _FORM_FIELDS.items():
+        assert at.session_state[key] == getattr(inputs, field), key
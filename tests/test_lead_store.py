@@ -0,0 +1,148 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from lead_store import INDEX_NAME, LEAD_DB_NAME, LEGACY_DIR_NAME, LeadStore, _ENTRY
+
+
+def _lead(n: int) -> dict:
+    return {"id": f"lead-{n}", "received_at": "2026-01-01T00:00:00", "payload": {"request_id": f"r{n}", "n": n}}
+
+
+def _payloads(store: LeadStore) -> list[int]:
+    return [doc["payload"]["n"] for _, doc in store.scan()]
+
+
+def test_append_is_visible_to_a_new_process(tmp_path):
+    LeadStore(tmp_path).append_batch([_lead(1), _lead(2)])
+    store = LeadStore(tmp_path)
+    assert _payloads(store) == [1, 2]
+    assert store.count() == 2
+    assert [r.id for r in store.page()[0]] == ["lead-2", "lead-1"]
+
+
+def test_torn_trailing_line_is_cut_and_overwritten(tmp_path):
+    store = LeadStore(tmp_path)
+    store.append_batch([_lead(1), _lead(2)])
+    segment = store.segment_path(1)
+    size = segment.stat().st_size
+    with open(segment, "ab") as f:
+        f.write(b'{"id":"lead-3","payload":{"requ')  # обрыв процесса посреди строки
+
+    store = LeadStore(tmp_path)
+    assert _payloads(store) == [1, 2]
+    assert segment.stat().st_size == size
+    store.append(_lead(3))
+    assert _payloads(LeadStore(tmp_path)) == [1, 2, 3]
+
+
+def test_tail_missing_from_index_is_reindexed(tmp_path):
+    store = LeadStore(tmp_path)
+    store.append_batch([_lead(1), _lead(2), _lead(3)])
+    index = tmp_path / INDEX_NAME
+    # Обрыв между fsync сегмента и записью индекса: последняя запись индекса — недописана
+    with open(index, "r+b") as f:
+        f.truncate(_ENTRY.size + 5)
+
+    store = LeadStore(tmp_path)
+    assert _payloads(store) == [1, 2, 3]
+    assert index.stat().st_size == 3 * _ENTRY.size
+    assert store.count() == 3
+
+
+def test_deletes_survive_index_and_table_rebuild(tmp_path):
+    store = LeadStore(tmp_path)
+    refs = store.append_batch([_lead(1), _lead(2), _lead(3)])
+    assert store.delete(refs[1].seq)
+    assert not store.delete(refs[1].seq)
+    (tmp_path / INDEX_NAME).unlink()
+    (tmp_path / LEAD_DB_NAME).unlink()
+
+    store = LeadStore(tmp_path)
+    assert _payloads(store) == [1, 3]
+    assert store.count() == 2
+    assert store.get(refs[1].seq) is None
+    assert [r.id for r in store.page()[0]] == ["lead-3", "lead-1"]
+
+
+def test_segments_roll_over(tmp_path):
+    store = LeadStore(tmp_path, segment_max_bytes=200)
+    store.append_batch([_lead(n) for n in range(10)])
+    assert len(list(tmp_path.glob("leads-*.ndjson"))) > 1
+    assert _payloads(LeadStore(tmp_path, segment_max_bytes=200)) == list(range(10))
+
+
+def test_dedup_within_batch_and_across_restart(tmp_path):
+    first = LeadStore(tmp_path).append_batch([_lead(1), _lead(1), _lead(2)])
+    assert first[1] == first[0]
+
+    store = LeadStore(tmp_path)  # новый процесс: ключи берутся из SQLite-таблицы
+    again = store.append_batch([_lead(2), _lead(1), _lead(3)])
+    assert again[0].seq == first[2].seq
+    assert again[1].seq == first[0].seq
+    assert _payloads(store) == [1, 2, 3]
+    assert store.find("id:r1").id == "lead-1"
+
+
+def test_dedup_by_content_without_request_id(tmp_path):
+    doc = {"id": "a", "payload": {"project_name": "Холл", "width_mm": 3200}}
+    same = {"id": "b", "payload": {"width_mm": 3200, "project_name": "Холл"}}
+    other = {"id": "c", "payload": {"project_name": "Холл", "width_mm": 3840}}
+    LeadStore(tmp_path).append(doc)
+    store = LeadStore(tmp_path)
+    store.append_batch([same, other])
+    assert [r.id for r in store.page()[0]] == ["c", "a"]
+
+
+def test_dedup_key_survives_table_rebuild(tmp_path):
+    LeadStore(tmp_path).append(_lead(1))
+    (tmp_path / LEAD_DB_NAME).unlink()
+    store = LeadStore(tmp_path)
+    assert store.append(_lead(1)).seq == 0
+    assert store.count() == 1
+
+
+def test_get_reads_a_single_index_entry(tmp_path, monkeypatch):
+    store = LeadStore(tmp_path)
+    refs = store.append_batch([_lead(n) for n in range(5)])
+    store.delete(refs[3].seq)
+    monkeypatch.setattr(store, "_read_index", lambda: pytest.fail("get() прочитал весь индекс"))
+    assert store.get(refs[2].seq)["payload"]["n"] == 2
+    assert store.get(refs[3].seq) is None  # удалена
+    assert store.get(5) is None  # надгробие
+    assert store.get(100) is None and store.get(-1) is None
+
+
+def _legacy_file(root, name: str, n: int, mtime: int) -> None:
+    path = root / f"{name}.json"
+    path.write_text(json.dumps({"received_at": "2025-12-01T00:00:00", "payload": {"request_id": name, "n": n}}))
+    os.utime(path, (mtime, mtime))
+
+
+def test_legacy_files_are_imported_once_and_kept_in_legacy_dir(tmp_path):
+    _legacy_file(tmp_path, "old-1", 1, 1_000)
+    _legacy_file(tmp_path, "old-2", 2, 2_000)
+    (tmp_path / "broken.json").write_text("{not json")
+
+    store = LeadStore(tmp_path)
+    assert _payloads(store) == [1, 2]
+    assert not list(tmp_path.glob("*.json"))
+    legacy = tmp_path / LEGACY_DIR_NAME
+    assert sorted(p.name for p in legacy.iterdir()) == ["broken.json", "old-1.json", "old-2.json"]
+
+    # Перезапуск: переносить нечего, дублей нет
+    store = LeadStore(tmp_path)
+    assert _payloads(store) == [1, 2]
+    assert store.count() == 2
+
+    # Повторный импорт: новый файл — один раз; копия уже перенесённого (обрыв до переноса) — не дублируется
+    _legacy_file(tmp_path, "old-3", 3, 3_000)
+    shutil.copy(legacy / "old-1.json", tmp_path / "old-1.json")
+    store.append(_lead(4))
+    assert _payloads(LeadStore(tmp_path)) == [1, 2, 3, 4]
+    assert sorted(p.name for p in legacy.iterdir()) == [
+        "broken.json", "old-1-1.json", "old-1.json", "old-2.json", "old-3.json"
+    ]
+    assert (legacy / "broken.json").read_text() == "{not json"
@@ -0,0 +1,89 @@
+import dataclasses
+import itertools
+
+import pytest
+
+from catalog import get_catalog
+from optimizer import MODULES_PER_CARD_OPTIONS, MODULES_PER_PSU_OPTIONS, find_cheapest_configuration
+from quote_engine import CTRL_ASYNC, CTRL_SYNC, QuoteInputs, compute_quote, controllers_for, find_module
+
+CARD_NAMES = ("Novastar MRV 208", "Novastar CA50E (COEX)", "Novastar A5s Plus")
+PSU_NAMES = ("A-200-5 (Chuanglian)", "A-400JQ-4.5PH (Chuanglian)", "Mean Well LRS-350-5")
+
+
+def _rows(table, names):
+    catalog = get_catalog()
+    return [catalog.row(table, name) for name in names]
+
+
+def _brute_force(base: QuoteInputs, cards, psus, categories=(CTRL_SYNC, CTRL_ASYNC)):
+    """Полный перебор той же области поиска: минимум total_buy_usd среди допустимых."""
+    module = find_module(base.module_name)
+    hubs = [h["name"] for h in get_catalog().hubs]
+    best = None
+    for category in categories:
+        for proc in controllers_for(category):
+            for card in cards:
+                for mpc, hub in itertools.product(
+                    MODULES_PER_CARD_OPTIONS, hubs if card["type"] == "A" else [None]
+                ):
+                    for psu in psus:
+                        for mpp in MODULES_PER_PSU_OPTIONS:
+                            if mpp * module["max_power"] > psu["max_w"]:
+                                continue
+                            cand = dataclasses.replace(
+                                base,
+                                controller_category=category,
+                                processor_name=proc["name"],
+                                card_name=card["name"],
+                                modules_per_card=mpc,
+                                hub_name=hub,
+                                psu_name=psu["name"],
+                                modules_per_psu=mpp,
+                            )
+                            q = compute_quote(cand)
+                            if q.ports_ok and (best is None or q.total_buy_usd < best.total_buy_usd):
+                                best = q
+    return best
+
+
+@pytest.mark.parametrize(
+    "base",
+    [
+        QuoteInputs(width_mm=1280, height_mm=640),
+        QuoteInputs(width_mm=7680, height_mm=4320),
+        QuoteInputs(width_mm=7680, height_mm=4320, hot_backup=True),
+    ],
+    ids=["small", "large", "hot_backup"],
+)
+def test_matches_brute_force(base):
+    cards, psus = _rows("cards", CARD_NAMES), _rows("psus", PSU_NAMES)
+    found = find_cheapest_configuration(base, cards=cards, psus=psus)
+    expected = _brute_force(base, cards, psus)
+    assert found is not None and expected is not None
+    assert found.quote.ports_ok
+    assert found.quote.total_buy_usd == pytest.approx(expected.total_buy_usd)
+    assert found.pruned + found.evaluated > 0
+
+
+def test_hot_backup_needs_twice_the_ports():
+    plain = find_cheapest_configuration(QuoteInputs(width_mm=7680, height_mm=4320))
+    backup = find_cheapest_configuration(QuoteInputs(width_mm=7680, height_mm=4320, hot_backup=True))
+    assert backup.quote.required_ports == 2 * plain.quote.required_ports
+    assert backup.quote.available_ports >= backup.quote.required_ports
+    assert backup.quote.total_buy_usd >= plain.quote.total_buy_usd
+
+
+def test_infeasible_psu_returns_none():
+    base = QuoteInputs(width_mm=1280, height_mm=640)
+    weak = [dict(psu, max_w=1) for psu in _rows("psus", PSU_NAMES)]
+    assert find_cheapest_configuration(base, psus=weak) is None
+    assert _brute_force(base, _rows("cards", CARD_NAMES), weak) is None
+
+
+def test_infeasible_ports_returns_none():
+    # Синхронных процессоров нет в области поиска, асинхронным не хватает портов
+    base = QuoteInputs(width_mm=320 * 400, height_mm=160 * 400, hot_backup=True)
+    assert find_cheapest_configuration(base, categories=(CTRL_ASYNC,)) is None
+    cards, psus = _rows("cards", CARD_NAMES[:1]), _rows("psus", PSU_NAMES[:1])
+    assert _brute_force(base, cards, psus, (CTRL_ASYNC,)) is None
@@ -0,0 +1,73 @@
+import io
+
+import pytest
+
+from price_sources import HTML_PACK_WINDOW_CHARS, HTML_SCAN_CHUNK_BYTES, scan_html_prices
+
+
+class CountingStream(io.BytesIO):
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def _page_with(snippet: str, at: int) -> bytes:
+    """Страница, где snippet начинается с байта at (отступ — ASCII)."""
+    return b" " * at + snippet.encode("utf-8") + b" " * 4096
+
+
+@pytest.mark.parametrize("shift", range(1, 15))
+def test_price_split_across_chunk_boundary(shift):
+    snippet = '"price": 1234,'
+    data = _page_with(snippet, HTML_SCAN_CHUNK_BYTES - shift)
+    assert scan_html_prices(io.BytesIO(data)).price == 1234
+
+
+def test_pack_with_multibyte_text_split_across_chunk_boundary():
+    snippet = "в упаковке 24 шт"
+    # Граница куска — посреди двухбайтовой «ш»
+    at = HTML_SCAN_CHUNK_BYTES - len("в упаковке 24 ".encode("utf-8")) - 1
+    data = _page_with(snippet, at) + b'"price": 500}'
+    result = scan_html_prices(io.BytesIO(data), want_pack=True)
+    assert (result.price, result.pack) == (500, 24)
+
+
+def test_match_past_the_byte_cap_is_not_seen():
+    cap = 4 * HTML_SCAN_CHUNK_BYTES
+    stream = CountingStream(_page_with('"price": 1234,', cap + 10))
+    assert scan_html_prices(stream, max_bytes=cap).price is None
+    assert stream.bytes_read == cap
+
+
+def test_reading_stops_once_price_is_found():
+    stream = CountingStream(b'<b>"price": 990}</b>' + b" " * (10 * HTML_SCAN_CHUNK_BYTES))
+    assert scan_html_prices(stream).price == 990
+    assert stream.bytes_read == HTML_SCAN_CHUNK_BYTES
+
+
+def test_out_of_range_price_falls_through_to_next_match():
+    # 60000 вне 10..50000 — берётся следующая подходящая цена на странице, даже другого шаблона
+    page = b'{"price": 60000, "x": 1} <div data-price="1450"></div> {"price": 2000}'
+    assert scan_html_prices(io.BytesIO(page)).price == 1450
+
+
+def test_first_match_in_page_order_wins_across_patterns():
+    page = b'<div data-price="1450"></div> {"price": 2000} <i itemprop="price" content="30">'
+    assert scan_html_prices(io.BytesIO(page)).price == 1450
+
+
+def test_final_price_is_a_separate_fallback():
+    page = b'{"finalPrice": 123456, "price": 9}'
+    result = scan_html_prices(io.BytesIO(page))
+    assert (result.price, result.final_price) == (None, 123456)
+
+
+def test_pack_outside_window_is_ignored():
+    data = _page_with("12 шт", HTML_PACK_WINDOW_CHARS + 100) + b'"price": 700}'
+    result = scan_html_prices(io.BytesIO(data), want_pack=True)
+    assert (result.price, result.pack) == (700, None)
@@ -0,0 +1,39 @@
+import types
+
+import quote_cache
+from quote_cache import QuoteCache, _sources_version, quote_key
+from quote_engine import QuoteInputs
+
+
+def _module(path):
+    return types.SimpleNamespace(__file__=str(path))
+
+
+def test_version_covers_every_source(tmp_path):
+    engine, catalog = tmp_path / "quote_engine.py", tmp_path / "catalog.py"
+    engine.write_text("K = 1\n")
+    catalog.write_text("METAL_PLATE_RUB_EACH = 50\n")
+    before = _sources_version(_module(engine), _module(catalog))
+    catalog.write_text("METAL_PLATE_RUB_EACH = 60\n")
+    assert _sources_version(_module(engine), _module(catalog)) != before
+
+
+def test_key_depends_on_engine_version_and_catalog(monkeypatch):
+    inputs = QuoteInputs()
+    key = quote_key(inputs, "catalog-a")
+    assert quote_key(inputs, "catalog-b") != key
+    monkeypatch.setattr(quote_cache, "_ENGINE_VERSION", "other")
+    assert quote_key(inputs, "catalog-a") != key
+
+
+def test_disk_tier_ignores_entries_of_another_version(tmp_path, monkeypatch):
+    result = QuoteCache(disk_dir=tmp_path).get(QuoteInputs())
+    same = QuoteCache(disk_dir=tmp_path)
+    assert same.get(QuoteInputs()) == result
+    assert same.stats().disk_hits == 1
+
+    monkeypatch.setattr(quote_cache, "_ENGINE_VERSION", "other")
+    fresh = QuoteCache(disk_dir=tmp_path)
+    fresh.get(QuoteInputs())
+    assert fresh.stats().disk_hits == 0
+    assert fresh.stats().misses == 1
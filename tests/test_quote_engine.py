@@ -0,0 +1,101 @@
+"""
+Регрессия расчёта: значения сняты с прежнего inline-расчёта app.py (JSON для Figma) для тех же
+конфигураций, что в benchmarks/bench_quote.py, при ценах по умолчанию (без сети).
+"""
+
+import pytest
+
+from quote_engine import CTRL_ASYNC, MOUNT_CABINET, QuoteInputs, compute_quote
+
+CASES = {
+    "small_indoor_monolith": (
+        QuoteInputs(width_mm=1280, height_mm=640),
+        {
+            "total_modules_order": 17,
+            "num_cards_reserve": 3,
+            "num_psu_reserve": 3,
+            "required_ports": 1,
+            "num_magnets": 64,
+            "profile_purchased_m": 6.0,
+            "area_m2": 0.82,
+            "peak_power_screen_kw": 0.38,
+            "total_buy_usd": 497.76,
+            "total_buy_rub": 47286.78,
+            "vat_amount_rub": 13524.02,
+            "profit_rub": 14186.03,
+            "sale_total_usd": 789.44,
+            "sale_total_rub": 74996.83,
+        },
+    ),
+    "preset_7680x4320": (
+        QuoteInputs(width_mm=7680, height_mm=4320),
+        {
+            "total_modules_order": 681,
+            "num_cards_reserve": 66,
+            "num_psu_reserve": 66,
+            "required_ports": 9,
+            "num_magnets": 2592,
+            "profile_purchased_m": 132.0,
+            "area_m2": 33.18,
+            "peak_power_screen_kw": 15.55,
+            "total_buy_usd": 11061.53,
+            "total_buy_rub": 1050845.42,
+            "vat_amount_rub": 300541.79,
+            "profit_rub": 315253.63,
+            "sale_total_usd": 17543.59,
+            "sale_total_rub": 1666640.83,
+        },
+    ),
+    "outdoor_cabinet_wall": (
+        QuoteInputs(
+            width_mm=12800,
+            height_mm=7200,
+            module_name="Qiangli Q2.5 Outdoor 3840Hz",
+            mount_type=MOUNT_CABINET,
+        ),
+        {
+            "total_modules_order": 1890,
+            "num_cards_reserve": 181,
+            "num_psu_reserve": 181,
+            "required_ports": 23,
+            "num_magnets": 0,
+            "profile_purchased_m": 0.0,
+            "area_m2": 92.16,
+            "peak_power_screen_kw": 59.4,
+            "total_buy_usd": 50703.03,
+            "total_buy_rub": 4816787.85,
+            "vat_amount_rub": 1377601.33,
+            "profit_rub": 1445036.35,
+            "sale_total_usd": 80415.01,
+            "sale_total_rub": 7639425.53,
+        },
+    ),
+    "hot_backup_async": (
+        QuoteInputs(controller_category=CTRL_ASYNC, processor_name="T30", hot_backup=True),
+        {
+            "total_modules_order": 177,
+            "num_cards_reserve": 18,
+            "num_psu_reserve": 18,
+            "required_ports": 6,
+            "num_magnets": 672,
+            "profile_purchased_m": 42.0,
+            "area_m2": 8.6,
+            "peak_power_screen_kw": 4.03,
+            "total_buy_usd": 3075.83,
+            "total_buy_rub": 292203.68,
+            "vat_amount_rub": 83570.25,
+            "profit_rub": 87661.1,
+            "sale_total_usd": 4878.26,
+            "sale_total_rub": 463435.03,
+        },
+    ),
+}
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_quote_matches_pinned_values(name):
+    inputs, expected = CASES[name]
+    result = compute_quote(inputs)
+    # Прежний расчёт округлял площадь и мощность до сотых, суммы — до копеек
+    actual = {field: getattr(result, field) for field in expected}
+    assert actual == {field: pytest.approx(value, abs=0.006) for field, value in expected.items()}